@@ -1,22 +1,65 @@
 import os
 import re
-from dotenv import load_dotenv
+from dotenv import load_dotenv, find_dotenv
 from typing import Dict, Any, Optional, Callable, List
 import json
+import threading
+from functools import lru_cache
 from sqlalchemy import create_engine, Column, Integer, String, MetaData, Table, insert # Added for __main__
+from sqlalchemy import text
+from sqlalchemy.engine import Engine, make_url
 
 # LangChain imports
 from langchain_community.utilities import SQLDatabase
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains import create_sql_query_chain
-from langchain_community.tools.sql_database.tool import QuerySQLDataBaseTool
-from operator import itemgetter
-from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+
+from query_guard import get_query_limits, install_statement_timeout, check_query_cost
+from cancellation import CancellationToken, QuestionCancelled, bind_token, install_cancel_support
+from model_registry import invoke_stage, describe_stage, requires_google_api_key
+from result_export import export_query_results, strip_row_limit, row_limit, PREVIEW_ROW_LIMIT, DEFAULT_CHUNK_SIZE
+from result_formatter import format_rows
+from value_index import resolve_question_values, format_value_hints, database_fingerprint, DEFAULT_INDEX_PATH
+from example_store import (add_example, retrieve_examples, sync_curated_file, format_examples_block,
+                           DEFAULT_EXAMPLES_PATH, DEFAULT_TOP_K)
+from prompt_budget import fit_prompt, get_prompt_budget, sql_prompt_steps, describe_report, ANSWER_PROMPT_STEPS
+from conversation import ConversationWorkspace, is_follow_up
+from replica_router import get_replica_router
+from schema_reflection import build_schema_info
+from saved_questions import (find_snapshot, save_question, list_saved_questions, snapshot_answer, format_age,
+                             SnapshotScheduler, DEFAULT_SAVED_PATH, DEFAULT_POLL_S)
+from query_history import RunTrace, record_run
+from question_planner import (may_be_compound, get_plan_prompt, parse_plan, run_sub_questions, merge_part_results,
+                              format_plan_result, planner_enabled, planner_settings)
+from sqlite_access import get_sqlite_settings, sqlite_engine_args, describe_sqlite_settings
+from result_pages import get_result_pages, DEFAULT_PAGE_SIZE
+from usage_meter import (current_user, database_label, check_budget, record_usage, throttle_llm_call,
+                         answer_without_llm, summarize_usage, DEFAULT_USAGE_PATH)
 
 load_dotenv()
 
+_env_lock = threading.Lock()
+_env_loaded: Dict[str, tuple] = {}
+
+
+def reload_env(path: Optional[str] = None) -> bool:
+    """Recharge le .env (path, sinon VIX_ENV_FILE, sinon celui du projet) en écrasant l'environnement, s'il a changé.
+
+    Un rechargement systématique réécrivait os.environ à chaque question, pendant que les questions
+    concurrentes le lisaient, et écrasait les variables fixées par programme. Retourne True si rechargé.
+    """
+    path = path or os.getenv("VIX_ENV_FILE") or find_dotenv()
+    if not path or not os.path.exists(path):
+        return False
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _env_lock:
+        if _env_loaded.get(path) == version:
+            return False
+        load_dotenv(path, override=True)
+        _env_loaded[path] = version
+        return True
+
 class DatabaseConfig:
     DB_CONFIGS = {
         "sqlite": {"driver": "sqlite", "port": None, "required_env": ["DB_PATH"]},
@@ -51,8 +94,11 @@ class DatabaseConfig:
         db_name = os.getenv("DB_NAME")
         driver_name = config["driver"]
 
-        if db_type_lower in ["postgresql", "mysql", "mariadb"]:
+        if db_type_lower == "postgresql":
             return f"{driver_name}://{user}:{password}@{host}:{port}/{db_name}"
+        elif db_type_lower in ["mysql", "mariadb"]:
+            # Décodage UTF-8 côté driver : évite les textes mal décodés ('Ã©') dans les résultats
+            return f"{driver_name}://{user}:{password}@{host}:{port}/{db_name}?charset=utf8mb4"
         elif db_type_lower == "mssql":
             odbc_driver = os.getenv("ODBC_DRIVER", "").replace(" ", "+")
             if not odbc_driver: raise ValueError("ODBC_DRIVER not set for MSSQL.")
@@ -65,32 +111,95 @@ class DatabaseConfig:
         status_cb(f"Error: Could not construct URI for {db_type_lower}.")
         raise ValueError(f"URI construction failed for {db_type_lower}")
 
+    @staticmethod
+    def detect_db_type_from_uri(db_uri: str) -> str:
+        uri_lower = db_uri.lower()
+        for db_type in ["sqlite", "postgresql", "mariadb", "mysql", "mssql", "oracle"]:
+            if uri_lower.startswith(db_type): return db_type
+        if uri_lower.startswith("postgres"): return "postgresql"
+        return "unknown"
 
-def get_database_connection(status_cb: Callable[[str], None]) -> tuple[SQLDatabase, str]:
-    load_dotenv(override=True)
+
+def resolve_database_uri(status_cb: Callable[[str], None]) -> tuple[str, str]:
+    """Retourne l'URI de connexion et le type de BDD détecté à partir du .env"""
+    reload_env()
     db_uri = os.getenv("DATABASE_URL")
     detected_db_type = "unknown"
 
     if db_uri:
         status_cb(f"Attempting connection via DATABASE_URL...")
-        uri_lower = db_uri.lower()
-        if "sqlite" in uri_lower: detected_db_type = "sqlite"
-        elif "postgresql" in uri_lower: detected_db_type = "postgresql"
-        # (other DB types) ...
-        else: status_cb("Warning: Could not determine DB type from DATABASE_URL.")
+        detected_db_type = DatabaseConfig.detect_db_type_from_uri(db_uri)
+        if detected_db_type == "unknown": status_cb("Warning: Could not determine DB type from DATABASE_URL.")
     else:
         detected_db_type = os.getenv("DB_TYPE", "sqlite").lower()
         status_cb(f"Attempting connection via DB_TYPE: {detected_db_type.upper()}")
         db_uri = DatabaseConfig.build_uri_from_env(detected_db_type, status_cb)
         status_cb(f"Built URI: {db_uri.split('@')[0]}@***" if '@' in db_uri else db_uri)
+    return db_uri, detected_db_type
+
+
+def create_query_engine(db_uri: str, db_type: str, status_cb: Callable[[str], None],
+                        statement_timeout_ms: Optional[int] = None) -> Engine:
+    """Crée l'engine SQLAlchemy avec timeout d'instruction et support d'annulation.
+
+    statement_timeout_ms remplace le timeout configuré (0 pour le désactiver, ex. pour les exports).
+    Un fichier SQLite est ouvert en lecture seule si VIX_SQLITE_MODE le demande (voir sqlite_access).
+    """
+    engine_args = {}
+    if db_type != "sqlite":
+        engine_args["connect_args"] = {"connect_timeout": 5}
+    else:
+        sqlite_settings = get_sqlite_settings()
+        engine_args.update(sqlite_engine_args(make_url(db_uri), sqlite_settings))
+        if engine_args: status_cb(describe_sqlite_settings(sqlite_settings))
+    for arg, env_key in (("pool_size", "VIX_DB_POOL_SIZE"), ("max_overflow", "VIX_DB_MAX_OVERFLOW")):
+        if os.getenv(env_key):
+            engine_args[arg] = int(os.getenv(env_key))
+    engine = create_engine(db_uri, **engine_args)
+    if statement_timeout_ms is None:
+        statement_timeout_ms = get_query_limits(db_type, engine.url.database)["statement_timeout_ms"]
+    install_statement_timeout(engine, db_type, statement_timeout_ms)
+    if statement_timeout_ms:
+        status_cb(f"Statement timeout set to {statement_timeout_ms} ms.")
+    install_cancel_support(engine, db_type)
+    return engine
+
+
+_query_engines: Dict[str, Engine] = {}
+_query_engines_lock = threading.Lock()
+
+
+def get_query_engine(db_uri: str, db_type: str, status_cb: Callable[[str], None]) -> Engine:
+    """Engine partagé du processus pour cette URI : son pool de connexions sert toutes les questions.
+
+    Le timeout d'instruction est relu à chaque appel et mis à jour sur l'engine existant.
+    """
+    with _query_engines_lock:
+        engine = _query_engines.get(db_uri)
+        if engine is None:
+            engine = _query_engines[db_uri] = create_query_engine(db_uri, db_type, status_cb)
+            return engine
+        install_statement_timeout(engine, db_type, get_query_limits(db_type, engine.url.database)["statement_timeout_ms"])
+    return engine
+
+
+def dispose_query_engines() -> None:
+    """Ferme les engines partagés (fin de processus, changement de configuration, harnais de charge)."""
+    with _query_engines_lock:
+        engines = list(_query_engines.values())
+        _query_engines.clear()
+    for engine in engines:
+        engine.dispose()
+
+
+def get_database_connection(status_cb: Callable[[str], None]) -> tuple[SQLDatabase, str]:
+    db_uri, detected_db_type = resolve_database_uri(status_cb)
 
     status_cb(f"Creating SQLDatabase object for {detected_db_type}...")
     try:
-        engine_args = {}
-        if detected_db_type != "sqlite":
-            engine_args["connect_args"] = {"connect_timeout": 5}
-        engine = create_engine(db_uri, **engine_args)
-        db = SQLDatabase(engine=engine, view_support=True)
+        engine = get_query_engine(db_uri, detected_db_type, status_cb)
+        # Réflexion différée : le schéma du prompt vient de schema_reflection (catalogue en masse)
+        db = SQLDatabase(engine=engine, view_support=True, lazy_table_reflection=True)
         status_cb("SQLDatabase object created.")
         return db, detected_db_type
     except Exception as e:
@@ -106,24 +215,43 @@ def get_database_specific_prompt(db_type: str) -> str:
 Règles importantes:
 - Utilise uniquement les tables et colonnes qui existent dans le schéma fourni
 - La requête doit être syntaxiquement correcte pour {db_type}
-- Limite les résultats à 100 lignes maximum avec LIMIT
+- Limite les résultats à 100 lignes maximum avec la syntaxe de {db_type}
 - Pour les recherches textuelles, utilise la syntaxe appropriée à {db_type}
 - N'utilise que SELECT, pas de modification de données
+- Réponds uniquement par la requête SQL, sans explication ni balises
 """
     
     # Ajouts spécifiques par type de BDD
     db_specifics = {
-        "sqlite": "- Utilise LIKE pour les recherches textuelles (sensible à la casse)\n- Date/time avec strftime() si nécessaire",
-        "postgresql": "- Utilise ILIKE pour les recherches insensibles à la casse\n- Fonctions PostgreSQL natives disponibles",
-        "mysql": "- Utilise LIKE (insensible à la casse par défaut)\n- Fonctions MySQL disponibles",
-        "mssql": "- Utilise LIKE avec COLLATE pour contrôler la casse\n- Fonctions SQL Server disponibles",
-        "oracle": "- Utilise UPPER() avec LIKE pour recherches insensibles à la casse\n- Fonctions Oracle disponibles"
+        "sqlite": "- Utilise LIMIT 100\n- Utilise LIKE pour les recherches textuelles (sensible à la casse)\n- Date/time avec strftime() si nécessaire",
+        "postgresql": "- Utilise LIMIT 100\n- Utilise ILIKE pour les recherches insensibles à la casse\n- Fonctions PostgreSQL natives disponibles",
+        "mysql": "- Utilise LIMIT 100\n- Utilise LIKE (insensible à la casse par défaut)\n- Fonctions MySQL disponibles",
+        "mariadb": "- Utilise LIMIT 100\n- Utilise LIKE (insensible à la casse par défaut)\n- Fonctions MariaDB disponibles",
+        "mssql": "- Utilise SELECT TOP 100 (LIMIT n'existe pas)\n- Utilise LIKE avec COLLATE pour contrôler la casse\n- Fonctions SQL Server disponibles",
+        "oracle": "- Utilise FETCH FIRST 100 ROWS ONLY (LIMIT n'existe pas)\n- Utilise UPPER() avec LIKE pour recherches insensibles à la casse\n- Fonctions Oracle disponibles"
     }
     
     specific_rules = db_specifics.get(db_type, "- Utilise la syntaxe SQL standard")
     
     return base_prompt.format(db_type=db_type.upper()) + "\n" + specific_rules
 
+@lru_cache(maxsize=None)
+def get_sql_prompt_template(db_type: str) -> PromptTemplate:
+    """Prompt de génération SQL compilé une fois par dialecte (règles de get_database_specific_prompt)."""
+    rules = get_database_specific_prompt(db_type).replace("{", "{{").replace("}", "}}")
+    return PromptTemplate.from_template(rules + """
+
+Schéma de la base:
+{schema}
+
+{examples}
+
+{hints}
+
+Question: {question}
+Requête SQL: """)
+
+@lru_cache(maxsize=None)
 def get_answer_prompt_template(db_type: str) -> PromptTemplate:
     template_str = """Tu es un assistant expert en bases de données {db_type_upper}.
 Réponds à la question de l'utilisateur en français de manière claire et structurée.
@@ -154,8 +282,8 @@ def validate_sql_query(query: str, db_type: str) -> bool:
          raise ValueError("Query must be a SELECT statement.")
     return True
 
-def format_query_result(result: str, query: str) -> str:
-    """Formate le résultat de la requête en un tableau Markdown."""
+def format_query_result(result: Any, query: str, columns: Optional[List[str]] = None, style: str = "markdown") -> str:
+    """Formate le résultat de la requête en tableau (Markdown par défaut, "text" ou "html")."""
     try:
         # Si le résultat est déjà un tableau Markdown
         if isinstance(result, str) and '|' in result:
@@ -173,42 +301,355 @@ def format_query_result(result: str, query: str) -> str:
         if not result or (isinstance(result, list) and len(result) == 0):
             return "Aucun résultat trouvé."
 
-        # Si le résultat est une liste de tuples, le convertir en liste de dictionnaires
-        if isinstance(result, list) and isinstance(result[0], (tuple, list)):
-            # Créer des noms de colonnes génériques
-            columns = [f"Colonne_{i+1}" for i in range(len(result[0]))]
-            result = [dict(zip(columns, row)) for row in result]
-        elif not isinstance(result, list) or not isinstance(result[0], dict):
+        if isinstance(result, list) and isinstance(result[0], dict):
+            columns = list(result[0].keys())
+            rows = [tuple(row.get(col) for col in columns) for row in result]
+        elif isinstance(result, list) and isinstance(result[0], (tuple, list)):
+            rows = result
+            if not columns:
+                # Créer des noms de colonnes génériques
+                columns = [f"Colonne_{i+1}" for i in range(len(result[0]))]
+        else:
             return str(result)
 
-        # Obtenir les colonnes
-        columns = list(result[0].keys())
-
-        # Créer l'en-tête du tableau
-        header = "| " + " | ".join(str(col) for col in columns) + " |"
-        separator = "| " + " | ".join("-" * max(len(str(col)), 3) for col in columns) + " |"
-
-        # Créer les lignes de données
-        rows = []
-        for row in result:
-            row_values = []
-            for col in columns:
-                val = row.get(col, '')
-                if val is None:
-                    val = 'NULL'
-                elif isinstance(val, (int, float)):
-                    val = f"{val:,}".replace(',', ' ')
-                # Nettoyer l'encodage des caractères spéciaux
-                val = str(val).replace('Ã©', 'é').replace('Ã¨', 'è').replace('Ã´', 'ô').replace('Ã', 'É')
-                row_values.append(str(val))
-            rows.append("| " + " | ".join(row_values) + " |")
-
-        # Assembler le tableau
-        return "\n".join([header, separator] + rows)
+        return format_rows(columns, rows, style=style)
     except Exception as e:
         return f"Erreur de formatage: {str(e)}"
 
-def initialize_and_process_question(question_text: str, status_cb_param: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+def execute_select(engine: Engine, query: str) -> tuple[List[str], List[tuple]]:
+    """Exécute une requête validée et retourne (colonnes, lignes) sans passer par une chaîne intermédiaire."""
+    with engine.connect() as conn:
+        result = conn.execute(text(query))
+        columns = list(result.keys())
+        rows = [tuple(row) for row in result]
+    return columns, rows
+
+def _register_result_pages(engine: Engine, sql_query: str, db_type: str, row_count: int,
+                            log: Callable[[str], None]) -> Dict[str, Any]:
+    """Handle de pagination du résultat complet quand l'aperçu a été limité (LIMIT/TOP/FETCH FIRST finale).
+
+    Une limite voulue par la question (top N) n'est pas une limite d'aperçu : le résultat est déjà complet.
+    """
+    if os.getenv("VIX_RESULT_PAGES", "true").lower() == "false":
+        return {}
+    full_sql = strip_row_limit(sql_query, db_type)
+    if full_sql == sql_query.strip().rstrip(";").strip() or row_count < PREVIEW_ROW_LIMIT:
+        return {}  # Pas de limite d'aperçu atteinte : toutes les lignes sont déjà dans le résultat
+    page_size = int(os.getenv("VIX_RESULT_PAGE_SIZE", DEFAULT_PAGE_SIZE))
+    own_limit = row_limit(full_sql, db_type)
+    if own_limit is not None and own_limit <= page_size:
+        return {}
+    try:
+        validate_sql_query(full_sql, db_type)
+    except ValueError as e:
+        log(f"Result paging unavailable: {str(e)[:100]}")
+        return {}
+    handle = get_result_pages().register(engine, full_sql, page_size)
+    log(f"Result handle {handle} registered ({row_count} preview rows, pages of {page_size}).")
+    return {"result_handle": handle, "page_size": page_size}
+
+def fetch_result_page(handle: str, page: int, cancel_token: Optional[CancellationToken] = None,
+                      status_cb: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """Page d'un résultat déjà exécuté (voir result_pages.fetch_page), avec son tableau Markdown.
+
+    Ni le LLM ni la requête ne sont relancés : la page est lue sur le curseur gardé ouvert, ou
+    dans les pages déjà lues. ValueError si le handle a expiré (VIX_RESULT_PAGE_TTL_S).
+    """
+    log = status_cb or (lambda msg: None)
+    page_data = get_result_pages().fetch_page(handle, page, cancel_token)
+    total = f" of {page_data['total_rows']}" if page_data["total_rows"] is not None else ""
+    log(f"Page {page + 1} ({page_data['source']}): rows {page_data['first_row']}-{page_data['last_row']}{total}.")
+    page_data["result"] = format_query_result(page_data["rows"], "", columns=page_data["columns"])
+    return page_data
+
+def _answer_from_workspace(question_text: str, conversation: ConversationWorkspace, log: Callable[[str], None],
+                           cancel_token: Optional[CancellationToken], llm_bypass_active: bool,
+                           trace: RunTrace) -> Optional[Dict[str, Any]]:
+    """Répond à une question de suivi avec du SQL sur le workspace local ; None pour repasser par la base."""
+    budget = trace.budget
+    latest = conversation.latest()
+    prompt_tokens = {}
+    llm_stats: Dict[str, float] = {}
+    local_sql = conversation.rule_based_sql(question_text)
+    if local_sql:
+        log(f"Follow-up answered by rule on {latest['table']}: {local_sql}")
+    elif llm_bypass_active or budget["mode"] == "cache_only":
+        return None
+    else:
+        throttle_llm_call(budget, cancel_token, log)
+        sql_prompt = get_sql_prompt_template("sqlite")
+        sql_sections, sql_report = fit_prompt(
+            lambda sections: sql_prompt.format(question=question_text, **sections),
+            {"schema": conversation.table_info(), "examples": "", "hints": conversation.describe()},
+            get_prompt_budget("sql"), sql_prompt_steps(question_text))
+        log(describe_report("Workspace SQL", sql_report))
+        prompt_tokens["sql"] = sql_report["tokens"]
+        generated = invoke_stage("sql", sql_prompt, {"question": question_text, **sql_sections},
+                                 cancel_token, status_cb=log, stats=llm_stats, label="workspace SQL", usage=trace.llm_usage)
+        local_sql = re.sub(r"```(?:\w+\w*)?\s*", "", generated or "").replace("```", "").strip()
+        local_sql = ' '.join(re.sub(r"^(?:SQLQuery|SQL)\s*:\s*", "", local_sql, flags=re.IGNORECASE).split())
+    try:
+        validate_sql_query(local_sql, "sqlite")
+        columns, rows = conversation.execute(local_sql)
+    except Exception as local_exc:
+        log(f"Workspace query failed ({str(local_exc)[:100]}); falling back to the database.")
+        return None
+    log(f"Follow-up answered from the conversation workspace ({len(rows)} rows, database not queried).")
+    conversation.add_result(question_text, local_sql, columns, rows, latest["db_type"])
+    formatted_result = format_query_result(rows, local_sql, columns=columns)
+
+    if llm_bypass_active:
+        answer = f"LLM Bypass: Dummy answer for '{question_text[:50]}'.\n\n{formatted_result}"
+    elif budget["mode"] in ("no_answer_llm", "cache_only"):
+        answer = answer_without_llm(budget, formatted_result)
+    else:
+        throttle_llm_call(budget, cancel_token, log)
+        answer_prompt = get_answer_prompt_template(latest["db_type"])
+        answer_sections, answer_report = fit_prompt(
+            lambda sections: answer_prompt.format(question=question_text, query=local_sql, **sections),
+            {"result": formatted_result}, get_prompt_budget("answer"), ANSWER_PROMPT_STEPS)
+        log(describe_report("Answer", answer_report))
+        prompt_tokens["answer"] = answer_report["tokens"]
+        answer = invoke_stage("answer", answer_prompt, {
+            "question": question_text, "query": local_sql, "result": answer_sections["result"]},
+            cancel_token, status_cb=log, stats=llm_stats, usage=trace.llm_usage)
+    return {"sql_query": local_sql, "result": formatted_result, "columns": columns, "rows": rows,
+            "value_matches": [], "examples": [], "prompt_tokens": prompt_tokens, "llm_stats": llm_stats,
+            "answer": answer, "source": "workspace"}
+
+
+def _write_answer(question_text: str, sql_query: str, formatted_result: str, detected_db_type: str,
+                  log: Callable[[str], None], cancel_token: Optional[CancellationToken], trace: RunTrace,
+                  prompt_tokens: Dict[str, int], llm_stats: Dict[str, float], llm_bypass_active: bool) -> str:
+    """Réponse en langage naturel, ou résultat brut si le budget LLM est presque épuisé."""
+    budget = trace.budget
+    if llm_bypass_active:
+        log(f"LLM Bypass: Using dummy natural language answer.")
+        return f"LLM Bypass: Dummy answer for '{question_text[:50]}'.\n\n{formatted_result}"
+    if budget["mode"] in ("no_answer_llm", "cache_only"):
+        log("Answer written without the LLM to save the remaining budget.")
+        return answer_without_llm(budget, formatted_result)
+    throttle_llm_call(budget, cancel_token, log)
+    answer_prompt = get_answer_prompt_template(detected_db_type)
+    answer_sections, answer_report = fit_prompt(
+        lambda sections: answer_prompt.format(question=question_text, query=sql_query, **sections),
+        {"result": formatted_result}, get_prompt_budget("answer"), ANSWER_PROMPT_STEPS)
+    log(describe_report("Answer", answer_report))
+    prompt_tokens["answer"] = answer_report["tokens"]
+    answer = invoke_stage("answer", answer_prompt, {
+        "question": question_text,
+        "query": sql_query,
+        "result": answer_sections["result"]  # Résultat formaté, tronqué au budget
+    }, cancel_token, status_cb=log, stats=llm_stats, usage=trace.llm_usage)
+    log("Final natural language answer generated.")
+    return answer
+
+
+def _answer_with_plan(question_text: str, db: SQLDatabase, detected_db_type: str, log: Callable[[str], None],
+                      cancel_token: Optional[CancellationToken], conversation: Optional[ConversationWorkspace],
+                      trace: RunTrace) -> Optional[Dict[str, Any]]:
+    """Question composée : sous-questions indépendantes générées et exécutées en parallèle sur le pool de
+    l'engine, puis fusionnées localement avant la réponse ; None si le planificateur garde la question entière."""
+    settings = planner_settings()
+    plan = invoke_stage("plan", get_plan_prompt(), {"question": question_text, "max_parts": settings["max_parts"]},
+                        cancel_token, status_cb=log, label="Plan", usage=trace.llm_usage)
+    sub_questions = parse_plan(plan, settings["max_parts"])
+    trace.lap("planning")
+    if not sub_questions:
+        log("Planner kept the question whole.")
+        return None
+    log(f"Question split into {len(sub_questions)} independent sub-questions: " + " | ".join(sub_questions))
+    query_limits = get_query_limits(detected_db_type, db._engine.url.database)
+    router = get_replica_router(db._engine.url.render_as_string(hide_password=False),
+                                lambda replica_uri: create_query_engine(replica_uri, detected_db_type, lambda msg: None),
+                                status_cb=log)
+
+    def run_part(sub_question: str) -> Dict[str, Any]:
+        part_trace = RunTrace()
+        part_trace.llm_usage = trace.llm_usage  # Appels imputés à la question d'origine
+        generation = _generate_sql(sub_question, db, detected_db_type, log, cancel_token, part_trace, False)
+        validate_sql_query(generation["sql"], detected_db_type)
+        check_query_cost(db._engine, generation["sql"], detected_db_type, query_limits, log)
+        with bind_token(cancel_token):
+            if router is not None:
+                columns, rows, executed_on = router.execute_select(generation["sql"], db._engine, log)
+            else:
+                columns, rows = execute_select(db._engine, generation["sql"])
+                executed_on = "primary"
+        if cancel_token: cancel_token.raise_if_cancelled()
+        return {"question": sub_question, "sql": generation["sql"], "columns": columns, "rows": rows,
+                "executed_on": executed_on, "db_key": generation["db_key"], "prompt_tokens": generation["prompt_tokens"],
+                "llm_stats": generation["llm_stats"]}
+
+    parts, timing = run_sub_questions(sub_questions, run_part, settings["max_workers"], cancel_token)
+    trace.lap("sub_questions")
+    log(f"{len(parts)} sub-questions answered in {timing['wall_s']:.2f}s "
+        f"(sequential equivalent {timing['sequential_s']:.2f}s, x{timing['speedup']:.1f}).")
+    answered = [part for part in parts if part["error"] is None]
+    if not answered:
+        raise ValueError("Every sub-question failed: " + "; ".join(part["error"] for part in parts))
+
+    prompt_tokens: Dict[str, int] = {"sql": sum(part["prompt_tokens"].get("sql", 0) for part in answered)}
+    llm_stats: Dict[str, float] = {}
+    for part in answered:
+        for name, value in part["llm_stats"].items():
+            llm_stats[name] = llm_stats.get(name, 0) + value
+        if conversation is not None:
+            conversation.add_result(part["question"], part["sql"], part["columns"], part["rows"], detected_db_type)
+        if part["rows"]:
+            try:
+                add_example(part["question"], part["sql"], part["db_key"], source="run",
+                            store_path=os.getenv("VIX_EXAMPLES_PATH", DEFAULT_EXAMPLES_PATH))
+            except Exception as examples_exc:
+                log(f"Could not record example: {str(examples_exc)[:100]}")
+    columns, rows = merge_part_results(answered)
+    formatted_result = format_plan_result(parts, lambda part: format_query_result(part["rows"], part["sql"],
+                                                                                  columns=part["columns"]))
+    sql_query = "\n".join(f"-- {part['question']}\n{part['sql']}" for part in answered)
+    trace.sql = sql_query
+    trace.lap("formatting")
+    answer = _write_answer(question_text, sql_query, formatted_result, detected_db_type, log, cancel_token, trace,
+                           prompt_tokens, llm_stats, False)
+    trace.lap("answer")
+    return {"sql_query": sql_query, "result": formatted_result, "columns": columns, "rows": rows,
+            "value_matches": [], "examples": [], "prompt_tokens": prompt_tokens, "llm_stats": llm_stats,
+            "answer": answer, "source": "plan", "executed_on": ", ".join(sorted({p["executed_on"] for p in answered})),
+            "sub_questions": [{"question": part["question"], "sql": part.get("sql"), "error": part["error"],
+                               "row_count": len(part["rows"]) if part["error"] is None else None,
+                               "seconds": part["seconds"]} for part in parts],
+            "plan_timing": timing}
+
+
+def initialize_and_process_question(question_text: str, status_cb_param: Optional[Callable[[str], None]] = None,
+                                    cancel_token: Optional[CancellationToken] = None,
+                                    conversation: Optional[ConversationWorkspace] = None,
+                                    prepared_sql: Optional[Dict[str, Any]] = None,
+                                    user: Optional[str] = None) -> Dict[str, Any]:
+    """Traite une question de bout en bout.
+
+    Avec une conversation, les questions de suivi (tri, filtre du résultat précédent) sont d'abord
+    tentées sur le workspace local, sans requête sur la base ; chaque résultat y est conservé.
+    Chaque traitement (durées par étape, taille du résultat, erreur) est consigné dans l'historique.
+    prepared_sql, résultat de speculate_sql pour cette question, évite de régénérer le SQL.
+    Appelable depuis plusieurs threads à la fois (engine et schéma partagés) ; une conversation
+    ne doit pas être partagée entre des appels simultanés.
+    Les appels LLM (tokens, latence, modèle) sont retournés dans "llm_usage" et imputés à user
+    (VIX_USER ou le compte système) et à la base ; ses budgets quotidiens peuvent dégrader le traitement.
+    """
+    trace = RunTrace()
+    trace.user = user or current_user()
+    result = _process_question(question_text, status_cb_param, cancel_token, conversation, trace, prepared_sql)
+    result["llm_usage"] = list(trace.llm_usage)
+    result["llm_usage_totals"] = summarize_usage(trace.llm_usage)
+    result["budget"] = trace.budget
+    record_run(question_text, result, trace)
+    if trace.llm_usage and trace.budget is not None:
+        try:
+            record_usage(trace.user, trace.budget["database"], trace.llm_usage,
+                         os.getenv("VIX_USAGE_PATH", DEFAULT_USAGE_PATH))
+        except Exception as usage_exc:
+            if status_cb_param: status_cb_param(f"Could not record LLM usage: {str(usage_exc)[:100]}")
+    return result
+
+
+def _generate_sql(question_text: str, db: SQLDatabase, detected_db_type: str, log: Callable[[str], None],
+                  cancel_token: Optional[CancellationToken], trace: RunTrace, llm_bypass_active: bool) -> Dict[str, Any]:
+    """Ancrage des valeurs, exemples, schéma, prompt et génération du SQL (nettoyé, pas encore validé)."""
+    value_matches = []
+    try:
+        value_matches = resolve_question_values(question_text, db._engine,
+                                                index_path=os.getenv("VIX_VALUE_INDEX_PATH", DEFAULT_INDEX_PATH))
+        if value_matches:
+            log("Grounded literals: " + ", ".join(f"{m['table']}.{m['column']}='{m['value']}'" for m in value_matches))
+    except Exception as index_exc:
+        log(f"Value index lookup failed: {str(index_exc)[:100]}. Continuing without grounding.")
+    trace.lap("value_index")
+
+    examples_path = os.getenv("VIX_EXAMPLES_PATH", DEFAULT_EXAMPLES_PATH)
+    examples_key = database_fingerprint(db._engine)
+    similar_examples = []
+    try:
+        curated_file = os.getenv("VIX_EXAMPLES_FILE")
+        if curated_file and os.path.exists(curated_file):
+            imported = sync_curated_file(curated_file, examples_key, examples_path)
+            if imported: log(f"Imported {imported} curated examples from {curated_file}.")
+        retrieval = retrieve_examples(question_text, examples_key, k=int(os.getenv("VIX_EXAMPLES_TOP_K", DEFAULT_TOP_K)),
+                                      store_path=examples_path)
+        similar_examples = retrieval["examples"]
+        log(f"Few-shot retrieval: {len(similar_examples)} examples in {retrieval['retrieval_ms']:.1f} ms"
+            + (f" (best score {similar_examples[0]['score']})." if similar_examples else "."))
+    except Exception as examples_exc:
+        log(f"Example store lookup failed: {str(examples_exc)[:100]}. Continuing zero-shot.")
+    trace.lap("examples")
+
+    schema_report = None
+    try:
+        schema_info, schema_report = build_schema_info(db._engine, log)
+    except Exception as reflection_exc:
+        log(f"Bulk schema reflection failed ({str(reflection_exc)[:100]}); using per-table reflection.")
+        schema_info = db.get_table_info()
+    trace.lap("schema")
+
+    # Prompt SQL du dialecte, réduit (exemples, indices, schéma) pour tenir dans le budget
+    sql_prompt = get_sql_prompt_template(detected_db_type)
+    sql_sections, sql_report = fit_prompt(
+        lambda sections: sql_prompt.format(question=question_text, **sections),
+        {"schema": schema_info, "examples": format_examples_block(similar_examples),
+         "hints": format_value_hints(value_matches)},
+        get_prompt_budget("sql"), sql_prompt_steps(question_text))
+    log(describe_report("SQL", sql_report))
+    prompt_tokens = {"sql": sql_report["tokens"]}
+    llm_stats: Dict[str, float] = {}  # Attente en file du limiteur, reprises, appels fusionnés
+
+    generated_sql = ""
+    if llm_bypass_active:
+        safe_question_snippet = question_text[:50].replace("'", "''")
+        generated_sql = f"SELECT 'LLM Bypass: Query for: {safe_question_snippet}' AS status, 1 AS value;"
+        log(f"LLM Bypass: Using dummy SQL: {generated_sql}")
+    else:
+        generated_sql = invoke_stage("sql", sql_prompt, {"question": question_text, **sql_sections},
+                                     cancel_token, status_cb=log, stats=llm_stats, label="SQL", usage=trace.llm_usage)
+        if not generated_sql or not generated_sql.strip():
+            raise ValueError(f"Failed to generate a valid SQL query string. Output: {generated_sql!r}")
+        log(f"Raw SQL query generated: {generated_sql[:200]}...")
+
+    cleaned_sql = re.sub(r"```(?:\w+\w*)?\s*", "", generated_sql).replace("```", "").strip()
+    cleaned_sql = re.sub(r"^(?:SQLQuery|SQL)\s*:\s*", "", cleaned_sql, flags=re.IGNORECASE)
+    cleaned_sql = ' '.join(cleaned_sql.split())
+    log(f"Cleaned SQL query: {cleaned_sql[:200]}...")
+    trace.lap("sql_generation")
+    return {"sql": cleaned_sql, "db_key": examples_key, "value_matches": value_matches, "examples": similar_examples,
+            "prompt_tokens": prompt_tokens, "llm_stats": llm_stats, "schema_report": schema_report}
+
+
+def speculate_sql(question_text: str, cancel_token: Optional[CancellationToken] = None,
+                  status_cb: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """Génère le SQL d'une question en cours de saisie, pour qu'il soit repris par initialize_and_process_question."""
+    log = status_cb or (lambda msg: None)
+    db, detected_db_type = get_database_connection(log)
+    usage_path = os.getenv("VIX_USAGE_PATH", DEFAULT_USAGE_PATH)
+    trace = RunTrace()
+    trace.user = current_user()
+    budget = check_budget(trace.user, database_label(db._engine.url), usage_path)
+    if budget["mode"] != "normal":
+        raise ValueError(f"Speculation skipped: {budget['reason']}.")
+    try:
+        generation = _generate_sql(question_text, db, detected_db_type, log, cancel_token, trace,
+                                   os.getenv("VIX_TEST_MODE_NO_LLM") == "true")
+    finally:
+        # Les spéculations non reprises consomment aussi des tokens : elles sont imputées comme les autres.
+        # Un échec d'écriture ne doit pas masquer l'erreur (ou l'annulation) de la génération.
+        if trace.llm_usage:
+            try:
+                record_usage(trace.user, budget["database"], trace.llm_usage, usage_path)
+            except Exception as usage_exc:
+                log(f"Could not record LLM usage: {str(usage_exc)[:100]}")
+    return {**generation, "question": question_text}
+
+
+def _process_question(question_text: str, status_cb_param: Optional[Callable[[str], None]],
+                      cancel_token: Optional[CancellationToken], conversation: Optional[ConversationWorkspace],
+                      trace: RunTrace, prepared_sql: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     logs: List[str] = []
     log = status_cb_param if status_cb_param else lambda msg: logs.append(msg)
 
@@ -218,94 +659,247 @@ def initialize_and_process_question(question_text: str, status_cb_param: Optiona
 
     try:
         log("Initializing Vix process...")
-        load_dotenv(override=True); log("Environment variables reloaded.")
+        if reload_env(): log("Environment variables reloaded.")
+        if cancel_token: cancel_token.raise_if_cancelled()
 
         if not llm_bypass_active:
-            api_key = os.getenv("GOOGLE_API_KEY")
-            if not api_key: raise ValueError("GOOGLE_API_KEY not found in environment.")
-            log("Google API Key check: OK.")
+            log(f"Model routing: SQL -> {describe_stage('sql')}, answer -> {describe_stage('answer')}.")
+            if requires_google_api_key():
+                api_key = os.getenv("GOOGLE_API_KEY")
+                if not api_key: raise ValueError("GOOGLE_API_KEY not found in environment.")
+                log("Google API Key check: OK.")
         else:
             log("Google API Key check: SKIPPED (LLM Bypass Mode).")
+        db_uri, _ = resolve_database_uri(lambda msg: None)
+        trace.budget = budget = check_budget(trace.user or current_user(), database_label(db_uri),
+                                             os.getenv("VIX_USAGE_PATH", DEFAULT_USAGE_PATH))
+        if budget["mode"] != "normal":
+            log(f"LLM budget: {budget['reason']}; processing in {budget['mode']} mode.")
+        trace.lap("setup")
+
+        if is_follow_up(question_text, conversation):
+            log("Question classified as a follow-up of the previous result.")
+            local_result = _answer_from_workspace(question_text, conversation, log, cancel_token, llm_bypass_active, trace)
+            trace.lap("follow_up")
+            if local_result is not None:
+                return {**local_result, "logs": logs, "error": None, "cancelled": False}
 
         db, detected_db_type = get_database_connection(log)
         log(f"Database connection established for type: {detected_db_type.upper()}.")
+        trace.db_key, trace.db_type = database_fingerprint(db._engine), detected_db_type
 
         try:
             db.run("SELECT 1")
             log("DB test query (SELECT 1) successful.")
         except Exception as db_test_exc:
             log(f"DB test query failed: {str(db_test_exc)[:100]}. Attempting to proceed...")
+        trace.lap("connect")
 
-        generated_sql = ""
-        if llm_bypass_active:
-            safe_question_snippet = question_text[:50].replace("'", "''")
-            generated_sql = f"SELECT 'LLM Bypass: Query for: {safe_question_snippet}' AS status, 1 AS value;"
-            log(f"LLM Bypass: Using dummy SQL: {generated_sql}")
-        else:
-            llm_model_name = "gemini-2.0-flash"
-            llm = ChatGoogleGenerativeAI(model=llm_model_name, temperature=0.0, convert_system_message_to_human=True)
-            log(f"LLM initialized with model: {llm_model_name}.")
-            write_query_chain = create_sql_query_chain(llm, db)
-            log("SQL query generation chain created.")
-            generated_sql_output = write_query_chain.invoke({"question": question_text})
-            generated_sql = generated_sql_output if isinstance(generated_sql_output, str) else generated_sql_output.get("query", str(generated_sql_output))
-            if not generated_sql or not isinstance(generated_sql, str):
-                raise ValueError(f"Failed to generate a valid SQL query string. Output: {generated_sql_output}")
-            log(f"Raw SQL query generated: {generated_sql[:200]}...")
-
-        cleaned_sql = re.sub(r"```(?:\w+\w*)?\s*", "", generated_sql).replace("```", "").strip()
-        cleaned_sql = ' '.join(cleaned_sql.split())
-        log(f"Cleaned SQL query: {cleaned_sql[:200]}...")
+        # Question enregistrée : l'instantané rafraîchi en arrière-plan est servi tel quel
+        try:
+            snapshot = find_snapshot(question_text, database_fingerprint(db._engine),
+                                     os.getenv("VIX_SAVED_PATH", DEFAULT_SAVED_PATH))
+        except Exception as saved_exc:
+            snapshot = None
+            log(f"Saved questions lookup failed: {str(saved_exc)[:100]}.")
+        trace.lap("snapshot_lookup")
+        if snapshot is not None:
+            log(f"Saved question served from its snapshot ({len(snapshot['rows'])} rows, "
+                f"refreshed {format_age(snapshot['age_s'])} ago).")
+            if conversation is not None:
+                conversation.add_result(question_text, snapshot["sql"], snapshot["columns"], snapshot["rows"], detected_db_type)
+            formatted_result = format_query_result(snapshot["rows"], snapshot["sql"], columns=snapshot["columns"])
+            paging = _register_result_pages(db._engine, snapshot["sql"], detected_db_type, len(snapshot["rows"]), log)
+            return {"sql_query": snapshot["sql"], "result": formatted_result, "columns": snapshot["columns"],
+                    "rows": snapshot["rows"], "value_matches": [], "examples": [], "prompt_tokens": {},
+                    "llm_stats": {}, "answer": snapshot_answer(snapshot, formatted_result), "source": "snapshot",
+                    "snapshot_age_s": snapshot["age_s"], **paging, "logs": logs, "error": None, "cancelled": False}
+
+        generation = None
+        if prepared_sql is not None:
+            if prepared_sql.get("db_key") == trace.db_key:
+                generation = prepared_sql
+                log("Reusing the SQL generated speculatively while the question was typed.")
+                trace.lap("speculation_reuse")
+            else:
+                log("Speculative SQL ignored: it was generated for another database.")
+        if generation is None and budget["mode"] == "normal" and not llm_bypass_active and planner_enabled() \
+                and may_be_compound(question_text):
+            planned = _answer_with_plan(question_text, db, detected_db_type, log, cancel_token, conversation, trace)
+            if planned is not None:
+                return {**planned, "logs": logs, "error": None, "cancelled": False}
+        if generation is None:
+            if budget["mode"] == "cache_only":
+                raise ValueError(f"Daily LLM budget exhausted ({budget['reason']}): only saved questions and "
+                                 "follow-ups on previous results are answered until tomorrow.")
+            throttle_llm_call(budget, cancel_token, log)
+            generation = _generate_sql(question_text, db, detected_db_type, log, cancel_token, trace, llm_bypass_active)
+        cleaned_sql = generation["sql"]
+        trace.sql = cleaned_sql
+        if conversation is not None and generation.get("schema_report"):
+            conversation.set_schema_names(generation["schema_report"])
+        value_matches, similar_examples = generation["value_matches"], generation["examples"]
+        prompt_tokens, llm_stats = dict(generation["prompt_tokens"]), dict(generation["llm_stats"])
+        examples_path = os.getenv("VIX_EXAMPLES_PATH", DEFAULT_EXAMPLES_PATH)
+        examples_key = generation["db_key"]
 
         validate_sql_query(cleaned_sql, detected_db_type)
         log("SQL query security validation: OK.")
 
-        execute_query_tool = QuerySQLDataBaseTool(db=db)
-        log("SQL query execution tool created/referenced.")
+        query_limits = get_query_limits(detected_db_type, db._engine.url.database)
+        check_query_cost(db._engine, cleaned_sql, detected_db_type, query_limits, log)
+        trace.lap("validation")
+
         log(f"Executing SQL query on {detected_db_type.upper()}...")
-        query_result = execute_query_tool.invoke({"query": cleaned_sql})
-        log(f"Query executed. Result length: {len(str(query_result)) if query_result is not None else 'N/A'}.")
+        # Requête validée en lecture seule : un réplica sain peut la servir, le primaire sert de repli
+        router = get_replica_router(db._engine.url.render_as_string(hide_password=False),
+                                    lambda replica_uri: create_query_engine(replica_uri, detected_db_type, lambda msg: None),
+                                    status_cb=log)
+        with bind_token(cancel_token):
+            if router is not None:
+                result_columns, result_rows, executed_on = router.execute_select(cleaned_sql, db._engine, log)
+            else:
+                result_columns, result_rows = execute_select(db._engine, cleaned_sql)
+                executed_on = "primary"
+        if cancel_token: cancel_token.raise_if_cancelled()
+        log(f"Query executed on {executed_on}. Rows returned: {len(result_rows)}.")
+        # Pages suivantes lues sur le primaire, sans relancer le LLM : seul le handle est créé ici
+        paging = _register_result_pages(db._engine, cleaned_sql, detected_db_type, len(result_rows), log)
+        trace.lap("execution")
+
+        if result_rows and not llm_bypass_active:
+            # Seules les requêtes exécutées avec un résultat non vide alimentent la base d'exemples
+            try:
+                if add_example(question_text, cleaned_sql, examples_key, source="run", store_path=examples_path):
+                    log("Question/SQL pair recorded in the example store.")
+            except Exception as examples_exc:
+                log(f"Could not record example: {str(examples_exc)[:100]}")
+
+        if conversation is not None:
+            conversation.add_result(question_text, cleaned_sql, result_columns, result_rows, detected_db_type)
 
         # Formater le résultat en tableau Markdown
-        formatted_result = format_query_result(query_result, cleaned_sql)
+        formatted_result = format_query_result(result_rows, cleaned_sql, columns=result_columns)
         log("Query result formatted as Markdown table.")
+        trace.lap("formatting")
 
-        final_natural_answer = ""
-        if llm_bypass_active:
-            final_natural_answer = f"LLM Bypass: Dummy answer for '{safe_question_snippet}'.\n\n{formatted_result}"
-            log(f"LLM Bypass: Using dummy natural language answer.")
-        else:
-            if 'llm' not in locals():
-                 llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.0, convert_system_message_to_human=True)
-            answer_prompt = get_answer_prompt_template(detected_db_type)
-            log("Answer prompt template created.")
-            final_answer_chain = answer_prompt | llm | StrOutputParser()
-            final_natural_answer = final_answer_chain.invoke({
-                "question": question_text,
-                "query": cleaned_sql,
-                "result": formatted_result  # Utiliser le résultat formaté
-            })
-            log("Final natural language answer generated.")
+        final_natural_answer = _write_answer(question_text, cleaned_sql, formatted_result, detected_db_type, log,
+                                             cancel_token, trace, prompt_tokens, llm_stats, llm_bypass_active)
+        trace.lap("answer")
 
         return {
             "sql_query": cleaned_sql,
             "result": formatted_result,
+            "columns": result_columns,
+            "rows": result_rows,
+            "value_matches": value_matches,
+            "examples": similar_examples,
+            "prompt_tokens": prompt_tokens,
+            "llm_stats": llm_stats,
             "answer": final_natural_answer,
+            "source": "database",
+            "executed_on": executed_on,
+            "speculative": generation is prepared_sql,
+            **paging,
             "logs": logs,
-            "error": None
+            "error": None,
+            "cancelled": False
         }
 
     except Exception as e:
-        error_msg = f"Error: {str(e)}"
+        cancelled = isinstance(e, QuestionCancelled) or bool(cancel_token and cancel_token.is_cancelled)
+        error_msg = "Question cancelled." if cancelled else f"Error: {str(e)}"
         log(error_msg)
         return {
             "sql_query": None,
             "result": None,
+            "columns": None,
+            "rows": None,
             "answer": error_msg,
             "logs": logs,
-            "error": str(e)
+            "error": "Cancelled by user." if cancelled else str(e),
+            "cancelled": cancelled
         }
 
+def export_query_to_file(sql_query: str, path: str, fmt: Optional[str] = None, full_result: bool = True,
+                         status_cb: Optional[Callable[[str], None]] = None,
+                         cancel_token: Optional[CancellationToken] = None,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """Ré-exécute une requête validée et exporte toutes ses lignes (CSV, Parquet ou Arrow IPC).
+
+    Avec full_result=True, la limite d'aperçu (LIMIT/TOP/FETCH FIRST finale) est retirée.
+    Le timeout d'instruction est remplacé par VIX_EXPORT_STATEMENT_TIMEOUT_MS (0 = aucun).
+    """
+    log = status_cb or (lambda msg: None)
+    db_uri, detected_db_type = resolve_database_uri(log)
+    export_sql = strip_row_limit(sql_query, detected_db_type) if full_result else sql_query.strip().rstrip(";")
+    validate_sql_query(export_sql, detected_db_type)
+    engine = create_query_engine(db_uri, detected_db_type, log,
+                                 statement_timeout_ms=int(os.getenv("VIX_EXPORT_STATEMENT_TIMEOUT_MS", "0")))
+    try:
+        log(f"Exporting full result to {path}...")
+        return export_query_results(engine, export_sql, path, fmt=fmt, chunk_size=chunk_size,
+                                    status_cb=log, cancel_token=cancel_token)
+    finally:
+        engine.dispose()
+
+def _current_database(status_cb: Callable[[str], None]) -> tuple[str, str, str]:
+    """URI, type et clé (empreinte de l'URL) de la base configurée, sans ouvrir de connexion."""
+    db_uri, detected_db_type = resolve_database_uri(status_cb)
+    engine = create_engine(db_uri)
+    try:
+        return db_uri, detected_db_type, database_fingerprint(engine)
+    finally:
+        engine.dispose()
+
+
+def save_current_question(question_text: str, sql_query: str, interval_s: float, timestamp_column: Optional[str] = None,
+                          status_cb: Optional[Callable[[str], None]] = None) -> int:
+    """Enregistre une question et son SQL (revalidé) pour la base configurée ; le planificateur la rafraîchit."""
+    log = status_cb or (lambda msg: None)
+    _, detected_db_type, db_key = _current_database(log)
+    validate_sql_query(sql_query, detected_db_type)
+    saved_id = save_question(question_text, sql_query, db_key, detected_db_type, interval_s, timestamp_column,
+                             store_path=os.getenv("VIX_SAVED_PATH", DEFAULT_SAVED_PATH))
+    log(f"Saved question {saved_id} (refresh every {format_age(interval_s)}).")
+    if _snapshot_scheduler is not None and _snapshot_scheduler.db_key == db_key:
+        _snapshot_scheduler.wake()
+    return saved_id
+
+
+def list_current_saved_questions(status_cb: Optional[Callable[[str], None]] = None) -> List[Dict[str, Any]]:
+    _, _, db_key = _current_database(status_cb or (lambda msg: None))
+    return list_saved_questions(db_key, os.getenv("VIX_SAVED_PATH", DEFAULT_SAVED_PATH))
+
+
+_snapshot_scheduler: Optional[SnapshotScheduler] = None
+_snapshot_scheduler_lock = threading.Lock()
+
+
+def start_snapshot_scheduler(status_cb: Optional[Callable[[str], None]] = None) -> SnapshotScheduler:
+    """Démarre (ou réutilise) le planificateur des questions enregistrées de la base configurée.
+
+    Il garde son propre engine, avec les timeouts d'instruction habituels ; s'il tourne déjà pour
+    une autre base (configuration modifiée), il est remplacé.
+    """
+    global _snapshot_scheduler
+    log = status_cb or (lambda msg: None)
+    db_uri, detected_db_type, db_key = _current_database(log)
+    with _snapshot_scheduler_lock:
+        if _snapshot_scheduler is not None:
+            if _snapshot_scheduler.db_key == db_key:
+                return _snapshot_scheduler
+            _snapshot_scheduler.stop()
+            _snapshot_scheduler.engine.dispose()
+        engine = create_query_engine(db_uri, detected_db_type, log)
+        _snapshot_scheduler = SnapshotScheduler(
+            engine, db_key, store_path=os.getenv("VIX_SAVED_PATH", DEFAULT_SAVED_PATH),
+            poll_s=float(os.getenv("VIX_SNAPSHOT_POLL_S", DEFAULT_POLL_S)),
+            validate=lambda sql: validate_sql_query(sql, detected_db_type), status_cb=log).start()
+        log(f"Snapshot scheduler started for {detected_db_type.upper()}.")
+        return _snapshot_scheduler
+
+
 if __name__ == '__main__':
     def _cli_callback(message): print(f"[CLI_TEST_LOG] {message}")
 
@@ -0,0 +1,178 @@
+"""Jetons d'annulation pour interrompre une question en cours (appels LLM et requête SQL)."""
+import asyncio
+import concurrent.futures
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, Engine
+
+
+class QuestionCancelled(Exception):
+    """Levée quand la question en cours a été annulée par l'utilisateur."""
+
+
+class CancellationToken:
+    """Jeton partagé entre l'appelant (GUI, console) et le pipeline.
+
+    Les ressources en cours d'utilisation (appel LLM, instruction SQL) enregistrent un callback
+    exécuté immédiatement lors de l'annulation.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: Dict[int, Callable[[], None]] = {}
+        self._next_id = 0
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._event.is_set(): return
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+        for callback in callbacks:
+            try: callback()
+            except Exception: pass  # Une ressource déjà libérée ne doit pas bloquer les autres
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise QuestionCancelled("Question cancelled by user.")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+    def register(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Enregistre un callback d'annulation ; retourne la fonction de désinscription."""
+        with self._lock:
+            if not self._event.is_set():
+                callback_id = self._next_id
+                self._next_id += 1
+                self._callbacks[callback_id] = callback
+                return lambda: self._callbacks.pop(callback_id, None)
+        callback()  # Déjà annulé : on libère tout de suite
+        return lambda: None
+
+
+_local = threading.local()
+
+
+def current_token() -> Optional[CancellationToken]:
+    return getattr(_local, "token", None)
+
+
+@contextmanager
+def bind_token(token: Optional[CancellationToken]):
+    """Associe le jeton au thread courant pour les instructions SQL exécutées dans le bloc."""
+    previous = current_token()
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+
+_llm_loop: Optional[asyncio.AbstractEventLoop] = None
+_llm_loop_lock = threading.Lock()
+
+
+def _get_llm_loop() -> asyncio.AbstractEventLoop:
+    """Boucle asyncio unique du processus, dans un thread dédié, pour tous les appels ainvoke.
+
+    Les clients asynchrones des modèles (grpc.aio pour Gemini) sont créés une fois puis gardés
+    par l'instance du modèle, liés à la boucle de leur premier appel : une boucle par appel fait
+    échouer le suivant (« Future attached to a different loop »).
+    """
+    global _llm_loop
+    with _llm_loop_lock:
+        if _llm_loop is None or _llm_loop.is_closed():
+            _llm_loop = asyncio.new_event_loop()
+            threading.Thread(target=_llm_loop.run_forever, name="vix-llm-loop", daemon=True).start()
+        return _llm_loop
+
+
+def invoke_cancellable(runnable: Any, inputs: Any, token: Optional[CancellationToken] = None) -> Any:
+    """Invoque un Runnable LangChain ; l'annulation interrompt la requête HTTP en cours.
+
+    L'appel passe par ainvoke sur la boucle partagée (_get_llm_loop) afin que l'annulation de la
+    tâche ferme réellement la connexion vers le fournisseur LLM.
+    """
+    if token is None:
+        return runnable.invoke(inputs)
+    token.raise_if_cancelled()
+    future = asyncio.run_coroutine_threadsafe(runnable.ainvoke(inputs), _get_llm_loop())
+    unregister = token.register(future.cancel)
+    try:
+        return future.result()
+    except concurrent.futures.CancelledError:
+        raise QuestionCancelled("LLM call cancelled by user.")
+    finally:
+        unregister()
+
+
+def _interrupt_statement(engine: Engine, db_type: str, dbapi_conn, cursor, mysql_thread_id) -> None:
+    """Interrompt l'instruction en cours au niveau du driver."""
+    if db_type == "sqlite":
+        dbapi_conn.interrupt()
+    elif db_type in ("postgresql", "oracle"):
+        dbapi_conn.cancel()
+    elif db_type == "mssql":
+        cursor.cancel()
+    elif db_type in ("mysql", "mariadb") and mysql_thread_id is not None:
+        # pymysql n'a pas d'annulation native : KILL QUERY depuis une autre connexion
+        def _kill():
+            with engine.connect() as conn:
+                conn.execute(text(f"KILL QUERY {int(mysql_thread_id)}"))
+        threading.Thread(target=_kill, daemon=True).start()
+
+
+@contextmanager
+def interruptible_fetch(conn: Connection, cursor, token: Optional[CancellationToken]):
+    """Rend annulable la lecture d'un curseur resté ouvert (fetchmany n'émet pas before_cursor_execute)."""
+    if token is None:
+        yield
+        return
+    token.raise_if_cancelled()
+    db_type = conn.engine.dialect.name
+    dbapi_conn = conn.connection.dbapi_connection
+    mysql_thread_id = dbapi_conn.thread_id() if db_type in ("mysql", "mariadb") else None
+    unregister = token.register(lambda: _interrupt_statement(conn.engine, db_type, dbapi_conn, cursor, mysql_thread_id))
+    try:
+        yield
+    finally:
+        unregister()
+
+
+_cancel_support_engines: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+
+
+def install_cancel_support(engine: Engine, db_type: str) -> None:
+    """Rend annulables les instructions exécutées sur l'engine par un thread lié à un jeton (bind_token)."""
+    if engine in _cancel_support_engines:
+        return
+    _cancel_support_engines.add(engine)
+    db_type = db_type.lower()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _register_interrupt(conn, cursor, statement, parameters, context, executemany):
+        token = current_token()
+        if token is None:
+            return
+        token.raise_if_cancelled()
+        previous_unregister = conn.info.pop("vix_cancel_unregister", None)
+        if previous_unregister: previous_unregister()
+        dbapi_conn = conn.connection.dbapi_connection
+        mysql_thread_id = dbapi_conn.thread_id() if db_type in ("mysql", "mariadb") else None
+        conn.info["vix_cancel_unregister"] = token.register(
+            lambda: _interrupt_statement(engine, db_type, dbapi_conn, cursor, mysql_thread_id))
+
+    @event.listens_for(engine, "checkin")
+    def _release_interrupt(dbapi_conn, connection_record):
+        unregister = connection_record.info.pop("vix_cancel_unregister", None)
+        if unregister: unregister()
@@ -0,0 +1,221 @@
+"""Espace de travail d'une conversation : derniers résultats gardés en SQLite mémoire pour les questions de suivi."""
+import datetime
+import decimal
+import difflib
+import os
+import re
+import sqlite3
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from value_index import normalize_text
+
+DEFAULT_MAX_RESULTS = 5
+DEFAULT_MAX_ROWS = 50000
+
+# Référence explicite au résultat précédent. "top 10 des villes", "sans les retours" ou "les 10 meilleurs
+# clients" sont des questions autonomes : sans anaphore ni tri sur une colonne du workspace, on interroge la base.
+_ANAPHORA = r"(?:them|those|these|it|the same|ces|ceux|celles|les|la|le)"
+_REFERENCE_RE = re.compile(
+    r"\b(?:ces|ceux|celles|parmi|les m[êe]mes|ce r[ée]sultat|le r[ée]sultat|cette liste|la liste|them|those|these|"
+    r"among|the same|the results?|this list|that list)\b|-(?:les|la|le)\b",
+    re.IGNORECASE)
+_SORT_RE = re.compile(r"\b(?:(?:trie|tri|trier|ordonne|classe|sort)(?:\s+les\s+\w+)?"
+                      rf"|(?:order|range|rank)\s+{_ANAPHORA}(?:\s+\w+)?)\s+(?:par|by|selon)\s+"
+                      r"(?:le |la |les |l'|the )?([\w' ]+?)(?:\s+(d[ée]croissante?|croissante?|desc\w*|asc\w*))?\s*$",
+                      re.IGNORECASE)
+_LIMIT_RE = re.compile(r"\b(?:les|top|the|first)\s+(\d+)(?:\s+(?:premi[eè]re?s?|first))?\b", re.IGNORECASE)
+_MAX_FOLLOW_UP_WORDS = 12
+
+
+def _sqlite_value(value: Any) -> Any:
+    if value is None or isinstance(value, (int, float, str, bytes)):
+        return value
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def _column_type(values: Sequence[Any]) -> str:
+    types = {type(v) for v in values if v is not None}
+    if types and all(issubclass(t, int) for t in types):
+        return "INTEGER"
+    if types and all(issubclass(t, (int, float, decimal.Decimal)) for t in types):
+        return "REAL"
+    return "TEXT"
+
+
+def _unique_names(columns: Sequence[str]) -> List[str]:
+    names, seen = [], set()
+    for column in columns:
+        name = str(column) or "col"
+        candidate, suffix = name, 2
+        while candidate.lower() in seen:
+            candidate, suffix = f"{name}_{suffix}", suffix + 1
+        seen.add(candidate.lower())
+        names.append(candidate)
+    return names
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+class ConversationWorkspace:
+    """Garde les max_results derniers résultats d'une conversation dans une base SQLite en mémoire.
+
+    Les résultats de plus de max_rows lignes ne sont pas conservés : la mémoire reste bornée et
+    une question de suivi sur un résultat tronqué repasse par la base de production.
+    """
+
+    def __init__(self, max_results: Optional[int] = None, max_rows: Optional[int] = None):
+        self.max_results = max_results or int(os.getenv("VIX_CONVERSATION_MAX_RESULTS", DEFAULT_MAX_RESULTS))
+        self.max_rows = max_rows or int(os.getenv("VIX_CONVERSATION_MAX_ROWS", DEFAULT_MAX_ROWS))
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        self._entries: deque = deque()
+        self._next_id = 1
+        self.schema_names: set = set()  # Tables et colonnes de la base, voir set_schema_names
+
+    @property
+    def has_results(self) -> bool:
+        return bool(self._entries)
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        return self._entries[-1] if self._entries else None
+
+    def add_result(self, question: str, sql: str, columns: Sequence[str], rows: Sequence[Sequence[Any]],
+                   db_type: str) -> Optional[Dict[str, Any]]:
+        """Enregistre un résultat ; retourne son entrée, ou None s'il dépasse max_rows."""
+        if not columns or len(rows) > self.max_rows:
+            return None
+        names = _unique_names(columns)
+        column_values = list(zip(*rows)) if rows else [() for _ in names]
+        with self._lock:
+            table = f"r{self._next_id}"
+            self._next_id += 1
+            definitions = ", ".join(f"{_quote(n)} {_column_type(v)}" for n, v in zip(names, column_values))
+            self._conn.execute(f"CREATE TABLE {table} ({definitions})")
+            self._conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(names))})",
+                                   [tuple(map(_sqlite_value, row)) for row in rows])
+            entry = {"table": table, "question": question, "sql": sql, "columns": names,
+                     "row_count": len(rows), "db_type": db_type}
+            self._entries.append(entry)
+            while len(self._entries) > self.max_results:
+                self._conn.execute(f"DROP TABLE {self._entries.popleft()['table']}")
+            self._conn.commit()
+        return entry
+
+    def set_schema_names(self, report: Dict[str, Any]) -> None:
+        """Noms des tables et colonnes de la base (rapport de schema_reflection), pour repérer les
+        questions qui sortent du workspace."""
+        names = set()
+        for table in report.get("tables", []):
+            names.add(normalize_text(table["name"].split(".")[-1]))
+            names.update(normalize_text(column[0]) for column in table["columns"])
+        self.schema_names = {name for name in names if len(name) >= 3}
+
+    def names_outside_workspace(self, question: str) -> List[str]:
+        """Tables ou colonnes de la base citées par la question sans figurer dans le workspace
+        (colonnes des résultats ou noms utilisés par leur SQL)."""
+        text = normalize_text(question)
+        known = set()
+        for entry in list(self._entries):
+            known.update(normalize_text(column) for column in entry["columns"])
+            known.update(normalize_text(entry["sql"]).split())
+        return [name for name in sorted(self.schema_names - known)
+                if re.search(rf"\b(?:{re.escape(name)}|{re.escape(name.replace('_', ' '))})s?\b", text)]
+
+    def clear(self) -> None:
+        with self._lock:
+            for entry in self._entries:
+                self._conn.execute(f"DROP TABLE {entry['table']}")
+            self._entries.clear()
+            self._conn.commit()
+
+    def execute(self, sql: str) -> Tuple[List[str], List[tuple]]:
+        with self._lock:
+            cursor = self._conn.execute(sql)
+            columns = [d[0] for d in cursor.description or ()]
+            return columns, cursor.fetchall()
+
+    def table_info(self, sample_rows: int = 3) -> str:
+        """Schéma du workspace au format de SQLDatabase.get_table_info (le plus récent en dernier)."""
+        blocks = []
+        with self._lock:
+            for entry in self._entries:
+                create_sql = self._conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (entry["table"],)).fetchone()[0]
+                samples = self._conn.execute(f"SELECT * FROM {entry['table']} LIMIT {sample_rows}").fetchall()
+                sample_text = "\n".join("\t".join(str(v) for v in row) for row in samples)
+                blocks.append(f"\n{create_sql}\n\n/*\n{len(samples)} rows from {entry['table']} table:\n"
+                              f"{chr(9).join(entry['columns'])}\n{sample_text}\n*/")
+        return "\n\n".join(blocks)
+
+    def describe(self) -> str:
+        """Indice pour le prompt : provenance des tables du workspace."""
+        lines = ["Tables du workspace local (résultats précédents de la conversation) :"]
+        for entry in self._entries:
+            lines.append(f"- {entry['table']} ({entry['row_count']} lignes) : « {entry['question']} »")
+        lines.append(f"La question porte sur le dernier résultat ({self.latest()['table']}) sauf mention contraire.")
+        return "\n".join(lines)
+
+    def sort_column(self, question: str) -> Optional[Tuple[str, bool]]:
+        """(colonne, décroissant) si la question trie le dernier résultat sur l'une de ses colonnes."""
+        entry = self.latest()
+        if entry is None:
+            return None
+        normalized = question.strip().rstrip(" ?.!")
+        sort_match = _SORT_RE.search(_LIMIT_RE.sub("", normalized).strip())
+        if not sort_match:
+            return None
+        column = self._match_column(sort_match.group(1), entry["columns"])
+        if column is None:
+            return None
+        direction = sort_match.group(2) or ""
+        return column, direction.lower().startswith("d") or "plus grand" in normalized.lower()
+
+    def rule_based_sql(self, question: str) -> Optional[str]:
+        """SQL de tri (et limite) sur le dernier résultat, sans appel LLM, quand la question est assez simple.
+
+        Jamais de LIMIT sans ORDER BY : sans tri explicite, le choix des lignes revient au LLM.
+        """
+        sort = self.sort_column(question)
+        if sort is None:
+            return None
+        column, descending = sort
+        limit_match = _LIMIT_RE.search(question)
+        limit_clause = f" LIMIT {int(limit_match.group(1))}" if limit_match else ""
+        return (f"SELECT * FROM {self.latest()['table']} ORDER BY {_quote(column)} "
+                f"{'DESC' if descending else 'ASC'}{limit_clause}")
+
+    @staticmethod
+    def _match_column(phrase: str, columns: Sequence[str]) -> Optional[str]:
+        target = normalize_text(phrase).replace(" ", "_")
+        by_norm = {normalize_text(c).replace(" ", "_"): c for c in columns}
+        if target in by_norm:
+            return by_norm[target]
+        close = difflib.get_close_matches(target, list(by_norm), n=1, cutoff=0.75)
+        if close:
+            return by_norm[close[0]]
+        contained = [c for norm, c in by_norm.items() if target in norm or norm in target]
+        return contained[0] if len(contained) == 1 else None
+
+
+def is_follow_up(question: str, workspace: Optional[ConversationWorkspace]) -> bool:
+    """Classe la question : raffinement du résultat précédent (True) ou nouvelle question (False).
+
+    Il faut une référence explicite au résultat (ces, parmi, ceux-ci, them, the same...) ou un tri sur
+    l'une de ses colonnes. Une question qui cite une table ou une colonne de la base absente du
+    workspace repart vers la base.
+    """
+    if workspace is None or not workspace.has_results:
+        return False
+    stripped = question.strip()
+    if len(stripped.split()) > _MAX_FOLLOW_UP_WORDS:
+        return False
+    if not _REFERENCE_RE.search(stripped) and workspace.sort_column(stripped) is None:
+        return False
+    return not workspace.names_outside_workspace(stripped)
@@ -0,0 +1,245 @@
+"""Base locale d'exemples question -> SQL validés, retrouvés par similarité TF-IDF pour le few-shot."""
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from value_index import normalize_text
+
+DEFAULT_EXAMPLES_PATH = "vix_examples.db"
+DEFAULT_TOP_K = 3
+MIN_SIMILARITY = 0.2
+# Part d'exemples ajoutés depuis la dernière construction au-delà de laquelle l'index est reconstruit
+REINDEX_RATIO = 0.2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS examples (
+    id INTEGER PRIMARY KEY, db_key TEXT NOT NULL, question TEXT NOT NULL, question_norm TEXT NOT NULL,
+    sql TEXT NOT NULL, source TEXT NOT NULL, created_at REAL NOT NULL, uses INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (db_key, question_norm, sql));
+"""
+
+
+def _connect(store_path: str) -> sqlite3.Connection:
+    # WAL : les lectures (recherche d'exemples) ne bloquent pas l'ajout d'exemples par les questions concurrentes
+    conn = sqlite3.connect(store_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def normalize_sql(sql: str) -> str:
+    return " ".join(sql.strip().rstrip(";").split()).lower()
+
+
+def _tokens(question: str) -> List[str]:
+    words = [w[:-1] if len(w) > 4 and w.endswith("s") else w for w in normalize_text(question).split()]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+def add_example(question: str, sql: str, db_key: str, source: str = "run", store_path: str = DEFAULT_EXAMPLES_PATH) -> bool:
+    """Ajoute une paire validée ; retourne False si elle existait déjà."""
+    conn = _connect(store_path)
+    try:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO examples (db_key, question, question_norm, sql, source, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (db_key, question.strip(), normalize_text(question), sql.strip(), source, time.time()))
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+
+def load_curated_examples(file_path: str, db_key: str, store_path: str = DEFAULT_EXAMPLES_PATH) -> int:
+    """Importe un fichier JSONL de paires {"question": ..., "sql": ...} ; retourne le nombre ajouté."""
+    rows = []
+    now = time.time()
+    with open(file_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{file_path}:{line_number}: invalid JSON ({e})")
+            rows.append((db_key, item["question"].strip(), normalize_text(item["question"]), item["sql"].strip(),
+                         "curated", now))
+    conn = _connect(store_path)  # Une connexion et une transaction pour tout le fichier
+    try:
+        cursor = conn.executemany(
+            "INSERT OR IGNORE INTO examples (db_key, question, question_norm, sql, source, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            rows)
+        conn.commit()
+        return max(cursor.rowcount, 0)
+    finally:
+        conn.close()
+
+
+_synced_files: Dict[Tuple[str, str, str], float] = {}
+_synced_lock = threading.Lock()
+
+
+def sync_curated_file(file_path: str, db_key: str, store_path: str = DEFAULT_EXAMPLES_PATH) -> int:
+    """Importe le fichier curé seulement s'il a changé depuis le dernier import de ce processus."""
+    mtime = os.path.getmtime(file_path)
+    key = (os.path.abspath(file_path), db_key, store_path)
+    with _synced_lock:  # Un seul import par modification, même si plusieurs questions arrivent ensemble
+        if _synced_files.get(key) == mtime:
+            return 0
+        added = load_curated_examples(file_path, db_key, store_path)
+        _synced_files[key] = mtime
+        return added
+
+
+class ExampleIndex:
+    """Index TF-IDF en mémoire (mots et bigrammes normalisés) sur les questions d'une base.
+
+    add() indexe de nouveaux exemples sans reprendre les anciens : les poids déjà calculés gardent
+    l'IDF de leur construction, d'où une reconstruction complète au-delà de REINDEX_RATIO ajouts.
+    """
+
+    def __init__(self, examples: List[Tuple[int, str, str]]):
+        self.examples = list(examples)
+        self.built_count = len(self.examples)
+        document_tokens = [Counter(_tokens(question)) for _, question, _ in self.examples]
+        self.document_frequency = Counter(token for tokens in document_tokens for token in tokens)
+        count = len(self.examples)
+        self.idf = {token: math.log((1 + count) / (1 + df)) + 1.0 for token, df in self.document_frequency.items()}
+        self.postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        for doc_index, tokens in enumerate(document_tokens):
+            vector = self._weigh(tokens)
+            for token, weight in vector.items():
+                self.postings[token].append((doc_index, weight))
+
+    def needs_rebuild(self, new_count: int) -> bool:
+        return len(self.examples) + new_count - self.built_count > REINDEX_RATIO * max(self.built_count, 1)
+
+    def add(self, examples: List[Tuple[int, str, str]]) -> None:
+        for example in examples:
+            tokens = Counter(_tokens(example[1]))
+            self.document_frequency.update(tokens.keys())
+            count = len(self.examples) + 1
+            for token in tokens:
+                self.idf[token] = math.log((1 + count) / (1 + self.document_frequency[token])) + 1.0
+            doc_index = len(self.examples)
+            self.examples.append(example)  # Avant les postings : une recherche concurrente trouve toujours l'exemple
+            for token, weight in self._weigh(tokens).items():
+                self.postings[token].append((doc_index, weight))
+
+    def _weigh(self, tokens: Counter) -> Dict[str, float]:
+        vector = {t: (1 + math.log(c)) * self.idf[t] for t, c in tokens.items() if t in self.idf}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {t: w / norm for t, w in vector.items()}
+
+    def search(self, question: str, k: int, exclude: Optional[int] = None) -> List[Tuple[float, int]]:
+        scores: Dict[int, float] = defaultdict(float)
+        for token, weight in self._weigh(Counter(_tokens(question))).items():
+            for doc_index, doc_weight in self.postings.get(token, ()):
+                scores[doc_index] += weight * doc_weight
+        if exclude is not None:
+            scores.pop(exclude, None)
+        return sorted(((score, doc) for doc, score in scores.items()), reverse=True)[:k]
+
+
+_index_cache: Dict[Tuple[str, str], Tuple[Tuple[int, int], ExampleIndex]] = {}
+_index_lock = threading.Lock()
+
+
+def _get_index(db_key: str, store_path: str) -> Optional[ExampleIndex]:
+    """Index de la base, mis à jour avec les seuls exemples ajoutés depuis la dernière recherche.
+
+    L'index est reconstruit quand des exemples ont disparu ou quand les ajouts dépassent REINDEX_RATIO.
+    """
+    if not os.path.exists(store_path):
+        return None
+    conn = _connect(store_path)
+    try:
+        with _index_lock:  # Une seule mise à jour à la fois ; la recherche elle-même se fait hors verrou
+            version = tuple(conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM examples WHERE db_key = ?",
+                                         (db_key,)).fetchone())
+            cached = _index_cache.get((store_path, db_key))
+            if cached and cached[0] == version:
+                return cached[1]
+            if cached and version[0] > cached[0][0] and not cached[1].needs_rebuild(version[0] - cached[0][0]):
+                rows = conn.execute("SELECT id, question, sql FROM examples WHERE db_key = ? AND id > ? ORDER BY id",
+                                    (db_key, cached[0][1])).fetchall()
+                if len(rows) == version[0] - cached[0][0]:  # Ajouts seulement, aucune suppression
+                    cached[1].add(rows)
+                    _index_cache[(store_path, db_key)] = (version, cached[1])
+                    return cached[1]
+            rows = conn.execute("SELECT id, question, sql FROM examples WHERE db_key = ? ORDER BY id", (db_key,)).fetchall()
+            index = ExampleIndex(rows)
+            _index_cache[(store_path, db_key)] = (version, index)
+            return index
+    finally:
+        conn.close()
+
+
+def retrieve_examples(question: str, db_key: str, k: int = DEFAULT_TOP_K, min_score: float = MIN_SIMILARITY,
+                      store_path: str = DEFAULT_EXAMPLES_PATH) -> Dict[str, Any]:
+    """Retourne les k exemples les plus proches et la latence de recherche (ms)."""
+    started = time.perf_counter()
+    index = _get_index(db_key, store_path)
+    examples = []
+    if index is not None and index.examples:
+        for score, doc_index in index.search(question, k):
+            if score < min_score:
+                break
+            example_id, example_question, example_sql = index.examples[doc_index]
+            examples.append({"id": example_id, "question": example_question, "sql": example_sql, "score": round(score, 3)})
+    return {"examples": examples, "retrieval_ms": (time.perf_counter() - started) * 1000}
+
+
+def format_examples_block(examples: List[Dict[str, Any]]) -> str:
+    """Bloc few-shot injecté dans le prompt de génération SQL."""
+    if not examples:
+        return ""
+    lines = ["Exemples de questions similaires déjà résolues sur cette base :"]
+    for example in examples:
+        lines.append(f"Question: {example['question']}\nSQL: {example['sql']}")
+    return "\n\n".join(lines)
+
+
+def evaluate_retrieval(db_key: str, k: int = DEFAULT_TOP_K, store_path: str = DEFAULT_EXAMPLES_PATH) -> Dict[str, float]:
+    """Évaluation leave-one-out : un succès quand un voisin parmi les k premiers porte le même SQL."""
+    index = _get_index(db_key, store_path)
+    if index is None or len(index.examples) < 2:
+        return {"examples": len(index.examples) if index else 0, "hit_rate": 0.0, "mean_latency_ms": 0.0}
+    normalized = [normalize_sql(sql) for _, _, sql in index.examples]
+    evaluated, hits, elapsed = 0, 0, 0.0
+    for doc_index, (_, question, _) in enumerate(index.examples):
+        if normalized.count(normalized[doc_index]) < 2:
+            continue  # Aucun autre exemple ne peut être « juste » pour cette question
+        started = time.perf_counter()
+        neighbours = index.search(question, k, exclude=doc_index)
+        elapsed += time.perf_counter() - started
+        evaluated += 1
+        hits += any(normalized[n] == normalized[doc_index] for _, n in neighbours)
+    return {"examples": len(index.examples), "evaluated": evaluated,
+            "hit_rate": hits / evaluated if evaluated else 0.0,
+            "mean_latency_ms": elapsed / evaluated * 1000 if evaluated else 0.0}
+
+
+if __name__ == "__main__":
+    # python example_store.py import exemples.jsonl | python example_store.py eval
+    import sys
+    from sqlalchemy import create_engine
+    from app_refactored import resolve_database_uri
+    from value_index import database_fingerprint
+
+    def _cli_callback(message): print(f"[EXAMPLES] {message}")
+
+    db_uri, _ = resolve_database_uri(_cli_callback)
+    key = database_fingerprint(create_engine(db_uri))
+    path = os.getenv("VIX_EXAMPLES_PATH", DEFAULT_EXAMPLES_PATH)
+    command = sys.argv[1] if len(sys.argv) > 1 else "eval"
+    if command == "import" and len(sys.argv) > 2:
+        print(f"{load_curated_examples(sys.argv[2], key, store_path=path)} curated examples imported.")
+    elif command == "eval":
+        print(evaluate_retrieval(key, store_path=path))
+    else:
+        print("Usage: python example_store.py import <file.jsonl> | eval")
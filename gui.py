@@ -1,12 +1,43 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, filedialog, simpledialog
 import os
+import threading
+import traceback
 from dotenv import dotenv_values, set_key, load_dotenv
 
+from cancellation import CancellationToken
+from conversation import ConversationWorkspace, is_follow_up
+from result_formatter import build_column_formats, NULL_DISPLAY
+from saved_questions import format_age
+from speculation import SqlSpeculator, speculation_enabled, speculation_settings
+
 try:
-    from app_refactored import initialize_and_process_question
+    from app_refactored import (initialize_and_process_question, export_query_to_file, save_current_question,
+                                list_current_saved_questions, start_snapshot_scheduler, speculate_sql, fetch_result_page,
+                                reload_env)
 except ImportError:
-    def initialize_and_process_question(question_text: str, status_cb_param=None):
+    speculate_sql = None
+
+    def reload_env(path=None):
+        return load_dotenv(path, override=True)
+
+    def fetch_result_page(handle, page, cancel_token=None, status_cb=None):
+        raise RuntimeError("Backend module not found.")
+
+    def save_current_question(question_text, sql_query, interval_s, timestamp_column=None, status_cb=None):
+        raise RuntimeError("Backend module not found.")
+
+    def list_current_saved_questions(status_cb=None):
+        return []
+
+    def start_snapshot_scheduler(status_cb=None):
+        raise RuntimeError("Backend module not found.")
+
+    def export_query_to_file(sql_query, path, fmt=None, full_result=True, status_cb=None, cancel_token=None, chunk_size=10000):
+        raise RuntimeError("Backend module not found.")
+
+    def initialize_and_process_question(question_text: str, status_cb_param=None, cancel_token=None, conversation=None,
+                                        prepared_sql=None):
         if status_cb_param: status_cb_param("ERROR: app_refactored.py not found.")
         return {"sql_query": None, "result": None, "answer": "Backend module not found.",
                 "logs": ["app_refactored.py not found."], "error": "Backend module not found."}
@@ -145,22 +176,225 @@ class SettingsWindow(tk.Toplevel):
             db_path_val = self.vars.get("DB_PATH", tk.StringVar()).get()
             if db_path_val: set_key(ENV_FILE_PATH, "DATABASE_URL", f"sqlite:///{db_path_val}")
             else: set_key(ENV_FILE_PATH, "DATABASE_URL", "")
+        # Rechargé ici, sur le thread de l'interface : les threads de travail ne modifient jamais os.environ
+        reload_env(ENV_FILE_PATH)
         messagebox.showinfo("Settings Saved", "Settings saved.", parent=self)
 
 
+class ResultGrid(ttk.Frame):
+    """Virtualized result table: only the visible rows exist as Treeview items.
+
+    The scrollbar maps onto the whole result; scrolling re-fills the fixed pool of
+    visible items from the in-memory rows, so render time and widget memory do not
+    grow with the result size. Clicking a header sorts client-side.
+    """
+
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.columns, self.rows, self.order = [], [], []
+        self.column_formats = []
+        self.offset = 0
+        self.visible_count = 20
+        self.sort_column, self.sort_descending = None, False
+
+        self.tree = ttk.Treeview(self, show="headings", selectmode="browse")
+        self.vscroll = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.hscroll = ttk.Scrollbar(self, orient=tk.HORIZONTAL, command=self.tree.xview)
+        self.tree.configure(xscrollcommand=self.hscroll.set)
+        self.tree.grid(row=0, column=0, sticky=tk.NSEW)
+        self.vscroll.grid(row=0, column=1, sticky=tk.NS)
+        self.hscroll.grid(row=1, column=0, sticky=tk.EW)
+        self.info_var = tk.StringVar(value="No results.")
+        self.info_label = ttk.Label(self, textvariable=self.info_var)
+        self.info_label.grid(row=2, column=0, columnspan=2, sticky=tk.W)
+        self.rowconfigure(0, weight=1); self.columnconfigure(0, weight=1)
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self._scroll_to(self.offset - 3) or "break")
+        self.tree.bind("<Button-5>", lambda e: self._scroll_to(self.offset + 3) or "break")
+        self.tree.bind("<Prior>", lambda e: self._scroll_to(self.offset - self.visible_count) or "break")
+        self.tree.bind("<Next>", lambda e: self._scroll_to(self.offset + self.visible_count) or "break")
+
+    def set_data(self, columns, rows):
+        self.columns, self.rows = list(columns or []), rows or []
+        self.order = list(range(len(self.rows)))
+        self.sort_column, self.sort_descending = None, False
+        self.column_formats = build_column_formats(self.columns, list(zip(*self.rows[:200])) if self.rows else [() for _ in self.columns])
+        self.tree.delete(*self.tree.get_children())
+        self.tree.configure(columns=[str(i) for i in range(len(self.columns))])
+        for i, name in enumerate(self.columns):
+            self.tree.heading(str(i), text=str(name), command=lambda c=i: self.sort_by(c))
+            anchor = tk.E if self.column_formats[i].align_right else tk.W
+            self.tree.column(str(i), anchor=anchor, width=max(80, min(300, len(str(name)) * 9)), stretch=False)
+        self.offset = 0
+        self._render()
+
+    def clear(self):
+        self.set_data([], [])
+
+    def sort_by(self, column_index):
+        if self.sort_column == column_index:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column, self.sort_descending = column_index, False
+        values = [row[column_index] for row in self.rows]
+        try:
+            # Natural ordering of the column values, NULLs grouped together
+            self.order.sort(key=lambda i: (values[i] is None, values[i] if values[i] is not None else 0), reverse=self.sort_descending)
+        except TypeError:  # Mixed types in the column
+            self.order.sort(key=lambda i: (values[i] is None, str(values[i])), reverse=self.sort_descending)
+        for i, name in enumerate(self.columns):
+            arrow = (" ▼" if self.sort_descending else " ▲") if i == column_index else ""
+            self.tree.heading(str(i), text=f"{name}{arrow}")
+        self._scroll_to(0)
+
+    def _format_cell(self, column_index, value):
+        if value is None:
+            return NULL_DISPLAY
+        column_format = self.column_formats[column_index]
+        try:
+            text = column_format.render(value) if column_format.render else value
+        except (TypeError, ValueError):  # Type decided from the first rows only
+            return str(value)
+        return text.replace(",", " ") if column_format.kind == "number" else str(text)
+
+    def _render(self):
+        self.tree.delete(*self.tree.get_children())
+        total = len(self.order)
+        end = min(total, self.offset + self.visible_count)
+        for position in range(self.offset, end):
+            row = self.rows[self.order[position]]
+            self.tree.insert("", tk.END, values=[self._format_cell(c, v) for c, v in enumerate(row)])
+        if total:
+            self.vscroll.set(self.offset / total, end / total)
+            self.info_var.set(f"Rows {self.offset + 1}-{end} of {total}")
+        else:
+            self.vscroll.set(0, 1)
+            self.info_var.set("No results.")
+
+    def _scroll_to(self, offset):
+        max_offset = max(0, len(self.order) - self.visible_count)
+        offset = max(0, min(int(offset), max_offset))
+        if offset != self.offset:
+            self.offset = offset
+            self._render()
+
+    def _on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self._scroll_to(float(args[1]) * len(self.order))
+        elif args[0] == "scroll":
+            step = self.visible_count if args[2] == "pages" else 1
+            self._scroll_to(self.offset + int(args[1]) * step)
+
+    def _on_mousewheel(self, event):
+        self._scroll_to(self.offset - (3 if event.delta > 0 else -3))
+        return "break"
+
+    def _on_resize(self, event):
+        row_height = ttk.Style(self).lookup("Treeview", "rowheight") or 20
+        visible = max(1, int(event.height) // int(row_height) - 1)  # Minus the heading row
+        if visible != self.visible_count:
+            self.visible_count = visible
+            self._scroll_to(min(self.offset, max(0, len(self.order) - visible)))
+            self._render()
+
+
+class SavedQuestionsWindow(tk.Toplevel):
+    """Saved questions with the age of their latest snapshot; double-click (or Ask) re-asks one."""
+
+    COLUMNS = (("question", "Question", 360), ("refresh", "Refresh", 80), ("age", "Snapshot age", 100),
+               ("rows", "Rows", 60), ("status", "Status", 160))
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.parent = parent
+        self.title("Saved questions")
+        self.geometry("800x320")
+        self.transient(parent)
+        self.frame = ttk.Frame(self, padding="10")
+        self.frame.pack(expand=True, fill=tk.BOTH)
+        self.tree = ttk.Treeview(self.frame, columns=[c[0] for c in self.COLUMNS], show="headings", selectmode="browse")
+        for key, heading, width in self.COLUMNS:
+            self.tree.heading(key, text=heading)
+            self.tree.column(key, width=width, anchor=tk.W)
+        self.tree.pack(expand=True, fill=tk.BOTH)
+        self.tree.bind("<Double-1>", lambda event: self.ask_selected())
+        btn_frame = ttk.Frame(self.frame)
+        btn_frame.pack(fill=tk.X, pady=(5, 0))
+        self.ask_button = ttk.Button(btn_frame, text="Ask", command=self.ask_selected)
+        self.ask_button.pack(side=tk.LEFT, padx=2)
+        self.reload_button = ttk.Button(btn_frame, text="Reload", command=self.reload)
+        self.reload_button.pack(side=tk.LEFT, padx=2)
+        self.close_button = ttk.Button(btn_frame, text="Close", command=self.destroy)
+        self.close_button.pack(side=tk.RIGHT, padx=2)
+        self.apply_theme_settings(*parent.get_current_theme_colors())
+        self.reload()
+
+    def reload(self):
+        self.tree.delete(*self.tree.get_children())
+        try:
+            saved = list_current_saved_questions()
+        except Exception as e:
+            messagebox.showerror("Saved questions", str(e), parent=self)
+            return
+        for item in saved:
+            age = format_age(item["age_s"]) if item["age_s"] is not None else "pending"
+            status = f"Error: {item['last_error'][:60]}" if item["last_error"] else \
+                ("Incremental" if item["timestamp_column"] else "OK")
+            self.tree.insert("", tk.END, iid=str(item["id"]), values=(
+                item["question"], format_age(item["interval_s"]), age,
+                item["row_count"] if item["row_count"] is not None else "", status))
+
+    def ask_selected(self):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        question = self.tree.set(selection[0], "question")
+        self.parent.question_entry.delete(0, tk.END)
+        self.parent.question_entry.insert(0, question)
+        self.destroy()
+        self.parent.handle_question_submission()
+
+    def apply_theme_settings(self, bg, fg, entry_bg, text_fg, button_bg, is_themedtk_active):
+        self.configure(bg=bg)
+
+
 class App(ThemedTk):
     def __init__(self):
         super().__init__()
         self.llm_bypass_active = os.getenv("VIX_TEST_MODE_NO_LLM") == "true"
+        self.current_cancel_token = None
+        self.current_question = None
+        self.last_sql_query = None
+        self.last_question = None  # Question du dernier résultat lu sur la base, pour « Save question »
+        self.last_columns = None
+        # Pagination du dernier résultat : handle, lignes de l'aperçu et page affichée (None = aperçu)
+        self.page_handle = None
+        self.page_size = None
+        self.preview_rows = []
+        self.current_page = None
+        self.page_has_next = False
+        self.conversation = ConversationWorkspace()  # Derniers résultats, pour les questions de suivi
+        # SQL généré pendant la saisie (VIX_SPECULATIVE_SQL=true), repris à la soumission
+        self.speculation_config = speculation_settings()
+        self.speculator = SqlSpeculator(lambda q, token: speculate_sql(q, cancel_token=token),
+                                        self.speculation_config["min_similarity"]) \
+            if speculation_enabled() and speculate_sql is not None else None
+        self._speculation_after_id = None
         self.current_theme = "light"
         self.themedtk_active = ThemedTk != tk.Tk and hasattr(self, 'set_theme')
         self.style = ttk.Style(self)
         self.title("Vix - SQL AI Assistant")
         self.geometry("900x750") # Increased height for bypass label
         if not os.path.exists(ENV_FILE_PATH): open(ENV_FILE_PATH, "w").close()
-        load_dotenv(ENV_FILE_PATH)
+        # Le pipeline relit le même fichier ; chargé ici puis à chaque enregistrement des réglages (thread de l'interface)
+        os.environ.setdefault("VIX_ENV_FILE", os.path.abspath(ENV_FILE_PATH))
+        reload_env(ENV_FILE_PATH)
         self._create_widgets()
         self.apply_theme()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        threading.Thread(target=self._start_snapshot_scheduler, daemon=True).start()
 
     def get_current_theme_colors(self):
         if self.current_theme == "light": return ("#F0F0F0", "#000000", "#FFFFFF", "#000000", "#E1E1E1", self.themedtk_active)
@@ -173,11 +407,23 @@ class App(ThemedTk):
 
         # Top buttons (Theme, Settings)
         top_btn_frame = ttk.Frame(self.main_frame)
-        top_btn_frame.grid(row=0, column=0, columnspan=3, sticky=tk.EW, pady=(0,5))
+        top_btn_frame.grid(row=0, column=0, columnspan=4, sticky=tk.EW, pady=(0,5))
         self.theme_button = ttk.Button(top_btn_frame, text="Theme", command=self.toggle_theme)
         self.theme_button.pack(side=tk.LEFT, padx=2)
         self.settings_button = ttk.Button(top_btn_frame, text="Settings", command=self.open_settings_window)
         self.settings_button.pack(side=tk.LEFT, padx=2)
+        self.export_button = ttk.Button(top_btn_frame, text="Export...", command=self.export_last_result, state=tk.DISABLED)
+        self.export_button.pack(side=tk.LEFT, padx=2)
+        self.new_conversation_button = ttk.Button(top_btn_frame, text="New conversation", command=self.start_new_conversation)
+        self.new_conversation_button.pack(side=tk.LEFT, padx=2)
+        self.save_question_button = ttk.Button(top_btn_frame, text="Save question", command=self.save_last_question, state=tk.DISABLED)
+        self.save_question_button.pack(side=tk.LEFT, padx=2)
+        self.saved_questions_button = ttk.Button(top_btn_frame, text="Saved questions", command=self.open_saved_questions_window)
+        self.saved_questions_button.pack(side=tk.LEFT, padx=2)
+        self.next_page_button = ttk.Button(top_btn_frame, text="Next page", command=self.show_next_page, state=tk.DISABLED)
+        self.next_page_button.pack(side=tk.RIGHT, padx=2)
+        self.previous_page_button = ttk.Button(top_btn_frame, text="Previous page", command=self.show_previous_page, state=tk.DISABLED)
+        self.previous_page_button.pack(side=tk.RIGHT, padx=2)
 
         # Question Area
         self.question_label = ttk.Label(self.main_frame, text="Ask:")
@@ -185,17 +431,24 @@ class App(ThemedTk):
         self.question_entry = ttk.Entry(self.main_frame, width=70)
         self.question_entry.grid(row=1, column=1, sticky=tk.EW, pady=2, padx=2)
         self.question_entry.bind("<Return>", self.handle_question_submission)
+        self.question_entry.bind("<KeyRelease>", self._schedule_speculation)
         self.ask_button = ttk.Button(self.main_frame, text="Submit", command=self.handle_question_submission)
         self.ask_button.grid(row=1, column=2, sticky=tk.E, pady=2, padx=2)
+        self.cancel_button = ttk.Button(self.main_frame, text="Cancel", command=self.cancel_current_question, state=tk.DISABLED)
+        self.cancel_button.grid(row=1, column=3, sticky=tk.E, pady=2, padx=2)
 
         # Response Area
         self.response_label = ttk.Label(self.main_frame, text="Response:")
         self.response_label.grid(row=2, column=0, sticky=tk.NW, pady=2)
-        resp_frame = ttk.Frame(self.main_frame)
-        resp_frame.grid(row=3, column=0, columnspan=3, sticky=tk.NSEW, pady=2)
+        self.response_notebook = ttk.Notebook(self.main_frame)
+        self.response_notebook.grid(row=3, column=0, columnspan=4, sticky=tk.NSEW, pady=2)
+        resp_frame = ttk.Frame(self.response_notebook)
         resp_frame.rowconfigure(0, weight=1); resp_frame.columnconfigure(0, weight=1)
         self.response_text = scrolledtext.ScrolledText(resp_frame, wrap=tk.WORD, state=tk.DISABLED, height=10)
         self.response_text.grid(row=0, column=0, sticky=tk.NSEW)
+        self.response_notebook.add(resp_frame, text="Answer")
+        self.result_grid = ResultGrid(self.response_notebook)
+        self.response_notebook.add(self.result_grid, text="Results")
 
         # Status Label (main status)
         self.status_label_var = tk.StringVar()
@@ -203,7 +456,7 @@ class App(ThemedTk):
         if self.llm_bypass_active: initial_status += " (LLM Bypass Mode)"
         self.status_label_var.set(initial_status)
         self.status_label = ttk.Label(self.main_frame, textvariable=self.status_label_var, relief=tk.SUNKEN)
-        self.status_label.grid(row=4, column=0, columnspan=3, sticky=tk.EW, pady=(5,0), ipady=2)
+        self.status_label.grid(row=4, column=0, columnspan=4, sticky=tk.EW, pady=(5,0), ipady=2)
 
         # LLM Bypass Mode Indicator Label (placed below status_label)
         self.bypass_mode_label_var = tk.StringVar()
@@ -217,9 +470,9 @@ class App(ThemedTk):
             padding=(2,1)
         )
         if self.llm_bypass_active: # Only grid if active
-            self.bypass_mode_indicator_label.grid(row=5, column=0, columnspan=3, sticky=tk.EW, pady=(2,0), ipady=1)
+            self.bypass_mode_indicator_label.grid(row=5, column=0, columnspan=4, sticky=tk.EW, pady=(2,0), ipady=1)
 
-        self.main_frame.rowconfigure(3, weight=1) # Response text area expansion
+        self.main_frame.rowconfigure(3, weight=1) # Response notebook expansion
 
     def _update_response_text(self, message, append=False):
         self.response_text.config(state=tk.NORMAL)
@@ -229,7 +482,27 @@ class App(ThemedTk):
         self.response_text.config(state=tk.DISABLED)
         self.update_idletasks()
 
+    def _schedule_speculation(self, event=None):
+        if self.speculator is None or (event is not None and event.keysym == "Return"):
+            return
+        if self._speculation_after_id is not None:
+            self.after_cancel(self._speculation_after_id)
+        self._speculation_after_id = self.after(self.speculation_config["debounce_ms"], self._start_speculation)
+
+    def _start_speculation(self):
+        self._speculation_after_id = None
+        if self.current_cancel_token is not None:
+            return
+        question = self.question_entry.get().strip()
+        # Les questions de suivi sont répondues depuis les résultats précédents : rien à spéculer
+        if len(question.split()) < self.speculation_config["min_words"] or is_follow_up(question, self.conversation):
+            self.speculator.cancel()
+            return
+        self.speculator.speculate(question)
+
     def handle_question_submission(self, event=None):
+        if self.current_cancel_token is not None:
+            return  # A question is already running
         question = self.question_entry.get().strip()
         if not question:
             status_msg = "Please enter a question."
@@ -239,43 +512,269 @@ class App(ThemedTk):
 
         self.status_label_var.set("Processing...") # Bypass mode will be appended by callback or final status
         self._update_response_text("Contacting Vix AI Assistant...\n", append=False)
+        self.result_grid.clear()
+        self.response_notebook.tab(self.result_grid, text="Results")
+        self.page_handle, self.current_page = None, None
+        cancel_token = CancellationToken()
+        self.current_cancel_token = cancel_token
+        self.current_question = question
+        self.ask_button.config(state=tk.DISABLED)
+        self.export_button.config(state=tk.DISABLED)
+        self.save_question_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
 
         def gui_status_callback(log_message):
-            self._update_response_text(f"[VIX LOG] {log_message}", append=True)
+            self.after(0, self._update_response_text, f"[VIX LOG] {log_message}", True)
+
+        if self._speculation_after_id is not None:
+            self.after_cancel(self._speculation_after_id)
+            self._speculation_after_id = None
+
+        def worker():
+            try:
+                prepared_sql = None
+                if self.speculator is not None:
+                    prepared_sql = self.speculator.take(question, cancel_token)
+                result_dict = initialize_and_process_question(question, status_cb_param=gui_status_callback,
+                                                              cancel_token=cancel_token, conversation=self.conversation,
+                                                              prepared_sql=prepared_sql)
+                self.after(0, self._on_question_finished, result_dict)
+            except Exception as e:
+                self.after(0, self._on_question_crashed, e, traceback.format_exc())
+
+        # The pipeline runs off the Tk thread so the window (and the Cancel button) stays responsive
+        threading.Thread(target=worker, daemon=True).start()
+
+    def cancel_current_question(self):
+        if self.current_cancel_token is None:
+            return
+        self.current_cancel_token.cancel()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.status_label_var.set("Cancelling...")
+
+    def _reset_question_controls(self):
+        self.current_cancel_token = None
+        self.ask_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.export_button.config(state=tk.NORMAL if self.last_sql_query else tk.DISABLED)
+        self.save_question_button.config(state=tk.NORMAL if self.last_question else tk.DISABLED)
+        self._update_page_buttons()
+
+    def _update_page_buttons(self):
+        running = self.current_cancel_token is not None
+        self.next_page_button.config(
+            state=tk.NORMAL if self.page_handle and self.page_has_next and not running else tk.DISABLED)
+        self.previous_page_button.config(
+            state=tk.NORMAL if self.page_handle and self.current_page is not None and not running else tk.DISABLED)
+
+    def show_next_page(self):
+        if self.page_handle is None or self.current_cancel_token is not None:
+            return
+        # Première page suivante : celle qui commence après les lignes de l'aperçu
+        page = len(self.preview_rows) // self.page_size if self.current_page is None else self.current_page + 1
+        self._load_page(page)
 
+    def show_previous_page(self):
+        if self.page_handle is None or self.current_page is None or self.current_cancel_token is not None:
+            return
+        if self.current_page - 1 < len(self.preview_rows) // self.page_size:
+            self.current_page = None
+            self.result_grid.set_data(self.last_columns, self.preview_rows)
+            self.response_notebook.tab(self.result_grid, text=f"Results ({len(self.preview_rows)})")
+            self.status_label_var.set("Showing the first rows of the result.")
+            self.page_has_next = True
+            self._update_page_buttons()
+            return
+        self._load_page(self.current_page - 1)
+
+    def _load_page(self, page):
+        cancel_token = CancellationToken()
+        self.current_cancel_token = cancel_token
+        self.ask_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self._update_page_buttons()
+        self.status_label_var.set(f"Loading page {page + 1}...")
+        handle = self.page_handle
+
+        def worker():
+            try:
+                page_data = fetch_result_page(handle, page, cancel_token=cancel_token)
+                self.after(0, self._on_page_loaded, page_data, None)
+            except Exception as e:
+                self.after(0, self._on_page_loaded, None, "Cancelled." if cancel_token.is_cancelled else str(e))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _on_page_loaded(self, page_data, error):
+        self.current_cancel_token = None
+        if error:
+            self._reset_question_controls()
+            self.status_label_var.set(f"Page not loaded: {error}")
+            return
+        self.current_page = page_data["page"]
+        self.result_grid.set_data(page_data["columns"], page_data["rows"])
+        total = f" of {page_data['total_rows']}" if page_data["total_rows"] is not None else ""
+        self.response_notebook.tab(self.result_grid,
+                                   text=f"Results (rows {page_data['first_row']}-{page_data['last_row']}{total})")
+        self.ask_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
+        self.page_has_next = page_data["has_next"]
+        self._update_page_buttons()
+        self.status_label_var.set(f"Page {page_data['page'] + 1} of the result ({page_data['source']}).")
+
+    def _start_snapshot_scheduler(self):
+        def scheduler_status_callback(message):
+            self.after(0, self.status_label_var.set, f"Scheduler: {message}")
         try:
-            load_dotenv(ENV_FILE_PATH, override=True)
-            result_dict = initialize_and_process_question(question, status_cb_param=gui_status_callback)
-
-            final_status_message = ""
-            if result_dict.get("error"):
-                self._update_response_text(f"\n--- ERROR ---", append=True)
-                self._update_response_text(result_dict["error"], append=True)
-                final_status_message = "Error occurred."
-                messagebox.showerror("Processing Error", result_dict["error"], parent=self)
+            start_snapshot_scheduler(scheduler_status_callback)
+        except Exception as e:
+            scheduler_status_callback(f"not started ({str(e)[:80]})")
+
+    def save_last_question(self):
+        if self.current_cancel_token is not None or not self.last_question:
+            return
+        minutes = simpledialog.askinteger("Save question", f"Refresh \"{self.last_question[:60]}\" every N minutes:",
+                                          parent=self, initialvalue=60, minvalue=1)
+        if not minutes:
+            return
+        timestamp_column = simpledialog.askstring(
+            "Save question", "Timestamp column for incremental refresh (append-only results; leave empty to re-run "
+            f"in full):\n{', '.join(self.last_columns or [])}", parent=self) or None
+        question, sql_query = self.last_question, self.last_sql_query
+
+        def worker():
+            try:
+                start_snapshot_scheduler()  # Relancé si la base configurée a changé
+                saved_id = save_current_question(question, sql_query, minutes * 60, timestamp_column)
+                self.after(0, self.status_label_var.set, f"Saved question {saved_id}; refreshed every {minutes} min.")
+            except Exception as e:
+                self.after(0, messagebox.showerror, "Save question", str(e))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def open_saved_questions_window(self):
+        SavedQuestionsWindow(self)
+
+    def start_new_conversation(self):
+        if self.current_cancel_token is not None:
+            return
+        self.conversation.clear()
+        self.status_label_var.set("New conversation: follow-up questions start from scratch.")
+
+    def export_last_result(self):
+        if self.current_cancel_token is not None or not self.last_sql_query:
+            return
+        path = filedialog.asksaveasfilename(
+            parent=self, title="Export full result", defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("Parquet", "*.parquet"), ("Arrow IPC", "*.arrow")])
+        if not path:
+            return
+        cancel_token = CancellationToken()
+        self.current_cancel_token = cancel_token
+        self.ask_button.config(state=tk.DISABLED)
+        self.export_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status_label_var.set("Exporting...")
+        sql_query = self.last_sql_query
+
+        def export_status_callback(message):
+            self.after(0, self.status_label_var.set, f"Status: {message}")
+
+        def worker():
+            try:
+                stats = export_query_to_file(sql_query, path, status_cb=export_status_callback, cancel_token=cancel_token)
+                self.after(0, self._on_export_finished, stats, None)
+            except Exception as e:
+                self.after(0, self._on_export_finished, None, "Cancelled." if cancel_token.is_cancelled else str(e))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _on_export_finished(self, stats, error):
+        self._reset_question_controls()
+        if error:
+            self.status_label_var.set(f"Export failed: {error}")
+            if error != "Cancelled.": messagebox.showerror("Export Error", error, parent=self)
+            return
+        self.status_label_var.set(f"Exported {stats['rows']} rows ({stats['bytes']} bytes, {stats['rows_per_second']:.0f} rows/s) to {stats['path']}")
+
+    def _on_question_finished(self, result_dict):
+        self._reset_question_controls()
+        final_status_message = ""
+        if result_dict.get("cancelled"):
+            self._update_response_text(f"\n--- CANCELLED ---", append=True)
+            final_status_message = "Cancelled."
+        elif result_dict.get("error"):
+            self._update_response_text(f"\n--- ERROR ---", append=True)
+            self._update_response_text(result_dict["error"], append=True)
+            final_status_message = "Error occurred."
+            messagebox.showerror("Processing Error", result_dict["error"], parent=self)
+        else:
+            # Le SQL local, ou les requêtes des sous-questions, ne se ré-exécutent pas tels quels sur la base :
+            # pas d'export plutôt que celui d'un résultat précédent
+            if result_dict.get("source") in ("workspace", "plan"):
+                self.last_sql_query = None
+            else:
+                self.last_sql_query = result_dict.get("sql_query")
+            self.last_question = self.current_question if result_dict.get("source") == "database" else None
+            self.last_columns = result_dict.get("columns")
+            self.page_handle, self.page_size = result_dict.get("result_handle"), result_dict.get("page_size")
+            self.preview_rows = result_dict.get("rows") or []
+            self.page_has_next = self.page_handle is not None
+            self._update_page_buttons()
+            self.export_button.config(state=tk.NORMAL if self.last_sql_query else tk.DISABLED)
+            self.save_question_button.config(state=tk.NORMAL if self.last_question else tk.DISABLED)
+            self._update_response_text(f"\n--- SQL QUERY ---", append=True)
+            self._update_response_text(result_dict.get("sql_query", "No SQL query generated."), append=True)
+            self._update_response_text(f"\n--- VIX ANSWER ---", append=True)
+            self._update_response_text(result_dict.get("answer", "No answer provided."), append=True)
+            if result_dict.get("columns"):
+                self.result_grid.set_data(result_dict["columns"], result_dict.get("rows") or [])
+                self.response_notebook.tab(self.result_grid, text=f"Results ({len(result_dict.get('rows') or [])})")
+            if result_dict.get("source") == "workspace":
+                final_status_message = "Done (answered from previous results)."
+            elif result_dict.get("source") == "plan":
+                timing = result_dict["plan_timing"]
+                final_status_message = (f"Done ({len(result_dict['sub_questions'])} sub-questions in parallel: "
+                                        f"{timing['wall_s']:.1f}s vs {timing['sequential_s']:.1f}s sequential).")
+            elif result_dict.get("source") == "snapshot":
+                final_status_message = f"Done (saved question snapshot, {format_age(result_dict['snapshot_age_s'])} old)."
             else:
-                self._update_response_text(f"\n--- SQL QUERY ---", append=True)
-                self._update_response_text(result_dict.get("sql_query", "No SQL query generated."), append=True)
-                self._update_response_text(f"\n--- VIX ANSWER ---", append=True)
-                self._update_response_text(result_dict.get("answer", "No answer provided."), append=True)
                 final_status_message = "Done."
+            totals = result_dict.get("llm_usage_totals")
+            if totals and totals["calls"]:
+                final_status_message += (f" LLM: {totals['calls']} calls, {totals['prompt_tokens']} prompt + "
+                                         f"{totals['completion_tokens']} completion tokens"
+                                         + (" (estimated)." if totals["estimated"] else "."))
+            budget = result_dict.get("budget")
+            if budget and budget["mode"] != "normal":
+                final_status_message += f" Budget: {budget['mode']} ({budget['reason']})."
+            if self.speculator is not None:
+                stats = self.speculator.stats()
+                final_status_message += (f" Speculation: {stats['hits']}/{stats['hits'] + stats['misses']} reused, "
+                                         f"{stats['wasted'] + stats['cancelled']} discarded.")
 
-            if self.llm_bypass_active:
-                final_status_message += " (LLM Bypass)"
-            self.status_label_var.set(final_status_message)
-
-        except Exception as e:
-            crit_err_msg = "Critical GUI error."
-            if self.llm_bypass_active: crit_err_msg += " (LLM Bypass)"
-            self._update_response_text(f"\n--- CRITICAL GUI ERROR ---", append=True)
-            self._update_response_text(str(e), append=True)
-            self.status_label_var.set(crit_err_msg)
-            import traceback
-            self._update_response_text(traceback.format_exc(), append=True)
-            messagebox.showerror("Critical Error", str(e), parent=self)
+        if self.llm_bypass_active:
+            final_status_message += " (LLM Bypass)"
+        self.status_label_var.set(final_status_message)
+
+    def _on_question_crashed(self, error, formatted_traceback):
+        self._reset_question_controls()
+        crit_err_msg = "Critical GUI error."
+        if self.llm_bypass_active: crit_err_msg += " (LLM Bypass)"
+        self._update_response_text(f"\n--- CRITICAL GUI ERROR ---", append=True)
+        self._update_response_text(str(error), append=True)
+        self.status_label_var.set(crit_err_msg)
+        self._update_response_text(formatted_traceback, append=True)
+        messagebox.showerror("Critical Error", str(error), parent=self)
+
+    def on_close(self):
+        if self.current_cancel_token is not None:
+            self.current_cancel_token.cancel()
+        if self.speculator is not None:
+            self.speculator.cancel()
+        self.destroy()
 
     def open_settings_window(self):
-        load_dotenv(ENV_FILE_PATH, override=True)
         settings_win = SettingsWindow(self)
         settings_win.grab_set()
 
@@ -300,6 +799,11 @@ class App(ThemedTk):
         self.question_label.configure(style="TLabel")
         self.question_entry.configure(style="TEntry")
         self.ask_button.configure(style="TButton")
+        self.cancel_button.configure(style="TButton")
+        self.new_conversation_button.configure(style="TButton")
+        self.save_question_button.configure(style="TButton")
+        self.saved_questions_button.configure(style="TButton")
+        self.export_button.configure(style="TButton")
         self.response_label.configure(style="TLabel")
         self.status_label.configure(style="TLabel") # Main status label
 
@@ -310,6 +814,11 @@ class App(ThemedTk):
         self.bypass_mode_indicator_label.configure(style="Bypass.TLabel")
 
 
+        self.style.configure("Treeview", background=entry_bg, fieldbackground=entry_bg, foreground=text_fg)
+        self.style.configure("Treeview.Heading", background=btn_bg, foreground=text_fg)
+        self.style.configure("TNotebook", background=bg)
+        self.style.configure("TNotebook.Tab", background=btn_bg, foreground=text_fg)
+
         self.response_text.config(background=entry_bg, foreground=text_fg, insertbackground=text_fg)
         try:
             self.response_text.tk.call(self.response_text._w, 'configure', '-selectbackground', text_fg if self.current_theme == "dark" else "#0078D4")
@@ -0,0 +1,212 @@
+"""Appels LLM partagés par processus : fusion des prompts identiques en vol, limite RPM/TPM et reprises."""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from cancellation import CancellationToken, QuestionCancelled, invoke_cancellable
+from prompt_budget import count_tokens
+
+DEFAULT_LLM_RPM = 60
+DEFAULT_LLM_TPM = 1000000
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF_BASE_S = 1.0
+DEFAULT_BACKOFF_MAX_S = 30.0
+_OUTPUT_TOKEN_ESTIMATE = 256  # Réservé en plus du prompt dans le seau TPM
+
+_RETRYABLE_MARKERS = ("429", "resource exhausted", "resourceexhausted", "quota", "rate limit", "too many requests",
+                      "503", "unavailable", "deadline", "timed out", "timeout", "500 internal", "internalservererror")
+
+
+class TokenBucket:
+    """Seau à jetons rechargé en continu ; le solde peut devenir négatif (réservation dans l'ordre d'arrivée)."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """Réserve amount jetons ; retourne l'attente (s) avant de pouvoir les utiliser. Appel sous verrou."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= min(amount, self.capacity)
+        return max(0.0, -self.tokens / self.rate)
+
+
+class RateLimiter:
+    """Limite requêtes/minute et tokens/minute (0 désactive la limite correspondante)."""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm, self.tpm = rpm, tpm
+        self._requests = TokenBucket(rpm) if rpm > 0 else None
+        self._tokens = TokenBucket(tpm) if tpm > 0 else None
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int, cancel_token: Optional[CancellationToken] = None) -> float:
+        """Attend son tour ; retourne le temps passé en file (s)."""
+        with self._lock:
+            delay = max(self._requests.reserve(1) if self._requests else 0.0,
+                        self._tokens.reserve(tokens) if self._tokens else 0.0)
+        _sleep(delay, cancel_token)
+        return delay
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Un seul appel réel par clé à un instant donné ; les appelants concurrents partagent son résultat."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+
+    def do(self, key: str, fn: Callable[[], Any], cancel_token: Optional[CancellationToken] = None) -> tuple:
+        """Retourne (résultat, partagé). Si l'appel du meneur est annulé, les suiveurs relancent le leur."""
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+            if leader:
+                try:
+                    flight.result = fn()
+                    return flight.result, False
+                except BaseException as e:
+                    flight.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        self._flights.pop(key, None)
+                    flight.done.set()
+            while not flight.done.wait(0.1):
+                if cancel_token: cancel_token.raise_if_cancelled()
+            if isinstance(flight.error, QuestionCancelled):
+                continue  # Annulation propre au meneur : on tente à notre tour
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+
+def _sleep(delay: float, cancel_token: Optional[CancellationToken]) -> None:
+    if delay <= 0:
+        return
+    if cancel_token is None:
+        time.sleep(delay)
+    elif cancel_token.wait(delay):
+        raise QuestionCancelled("Question cancelled while waiting for the LLM rate limiter.")
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Quota, limite de débit, indisponibilité temporaire ou timeout du fournisseur."""
+    if isinstance(error, QuestionCancelled):
+        return False
+    description = f"{type(error).__name__} {error}".lower()
+    return any(marker in description for marker in _RETRYABLE_MARKERS)
+
+
+def backoff_delay(attempt: int, base_s: float = DEFAULT_BACKOFF_BASE_S, max_s: float = DEFAULT_BACKOFF_MAX_S) -> float:
+    """Backoff exponentiel avec gigue complète : uniforme dans [0, min(max_s, base_s * 2^attempt)]."""
+    return random.uniform(0, min(max_s, base_s * (2 ** attempt)))
+
+
+def _render_prompt(runnable: Any, inputs: Any) -> str:
+    prompt = getattr(runnable, "first", None)
+    if hasattr(prompt, "format") and isinstance(inputs, dict):
+        try:
+            return prompt.format(**inputs)
+        except Exception:
+            pass
+    return json.dumps(inputs, sort_keys=True, default=str, ensure_ascii=False)
+
+
+def _model_name(runnable: Any) -> str:
+    for step in getattr(runnable, "steps", [runnable]):
+        name = getattr(step, "model", None) or getattr(step, "model_name", None)
+        if name:
+            return str(name)
+    return type(runnable).__name__
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+_single_flight = SingleFlight()
+_stats_lock = threading.Lock()
+_totals = {"calls": 0, "coalesced": 0, "retries": 0, "queue_wait_s": 0.0}
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Limiteur partagé du processus (VIX_LLM_RPM, VIX_LLM_TPM), recréé si la configuration change."""
+    global _limiter
+    rpm = int(os.getenv("VIX_LLM_RPM", DEFAULT_LLM_RPM))
+    tpm = int(os.getenv("VIX_LLM_TPM", DEFAULT_LLM_TPM))
+    with _limiter_lock:
+        if _limiter is None or (_limiter.rpm, _limiter.tpm) != (rpm, tpm):
+            _limiter = RateLimiter(rpm, tpm)
+        return _limiter
+
+
+def get_throttle_stats() -> Dict[str, float]:
+    """Cumul du processus : appels réels, appels fusionnés, reprises et attente totale en file."""
+    with _stats_lock:
+        return dict(_totals)
+
+
+def throttled_invoke(runnable: Any, inputs: Any, cancel_token: Optional[CancellationToken] = None,
+                     label: str = "llm", status_cb: Optional[Callable[[str], None]] = None,
+                     stats: Optional[Dict[str, float]] = None) -> Any:
+    """Invoque une chaîne LLM via la fusion des appels identiques, le limiteur et les reprises.
+
+    stats (optionnel) cumule queue_wait_s, retries et coalesced pour l'appelant. Les erreurs
+    de quota persistantes sont remontées en ConnectionError lisible.
+    """
+    log = status_cb or (lambda msg: None)
+    prompt = _render_prompt(runnable, inputs)
+    key = hashlib.sha1(f"{_model_name(runnable)}\x00{prompt}".encode("utf-8")).hexdigest()
+    call_stats = {"queue_wait_s": 0.0, "retries": 0, "coalesced": 0}
+
+    def _call():
+        max_retries = int(os.getenv("VIX_LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES))
+        tokens = count_tokens(prompt) + _OUTPUT_TOKEN_ESTIMATE
+        for attempt in range(max_retries + 1):
+            waited = get_rate_limiter().acquire(tokens, cancel_token)
+            call_stats["queue_wait_s"] += waited
+            if waited >= 0.05:
+                log(f"LLM {label} call waited {waited:.2f}s for the rate limiter.")
+            try:
+                return invoke_cancellable(runnable, inputs, cancel_token)
+            except Exception as e:
+                if not is_retryable_error(e):
+                    raise
+                if attempt == max_retries:
+                    raise ConnectionError(f"LLM {label} call failed after {max_retries} retries (quota or "
+                                          f"provider unavailable): {str(e)[:200]}") from e
+                delay = backoff_delay(attempt)
+                call_stats["retries"] += 1
+                log(f"LLM {label} call hit a retryable error ({type(e).__name__}); retry {attempt + 1}/{max_retries} in {delay:.1f}s.")
+                _sleep(delay, cancel_token)
+                call_stats["queue_wait_s"] += delay
+
+    result, shared = _single_flight.do(key, _call, cancel_token)
+    if shared:
+        call_stats["coalesced"] = 1
+        log(f"LLM {label} call merged with an identical in-flight request.")
+    with _stats_lock:
+        _totals["calls"] += 0 if shared else 1
+        for name, value in call_stats.items():
+            _totals[name] += value
+    if stats is not None:
+        for name, value in call_stats.items():
+            stats[name] = stats.get(name, 0) + value
+    return result
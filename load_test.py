@@ -0,0 +1,204 @@
+"""Test de charge du pipeline : questions concurrentes (threads ou tâches asyncio) sur une base de test avec un LLM simulé.
+
+Usage : python load_test.py [--levels 1,2,4,8,16] [--requests 40] [--mode threads|asyncio|both]
+        [--database-url postgresql+psycopg2://...] [--llm-latency-ms 300] [--json rapport.json]
+
+Sans --database-url, une base SQLite temporaire est créée. Avec une URL (ex. un Postgres local),
+les tables lt_customers et lt_orders y sont créées et remplies si elles sont absentes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from langchain_core.runnables import RunnableLambda
+from sqlalchemy import Column, Float, ForeignKey, Integer, MetaData, String, Table, create_engine, func, insert, select
+
+WORKLOAD = [
+    ("Combien de clients avons-nous ?", "SELECT COUNT(*) AS clients FROM lt_customers;"),
+    ("Montant total des commandes par pays",
+     "SELECT c.country, SUM(o.amount) AS total FROM lt_orders o JOIN lt_customers c ON c.id = o.customer_id "
+     "GROUP BY c.country ORDER BY total DESC LIMIT 100;"),
+    ("Les 10 clients qui ont le plus dépensé",
+     "SELECT c.name, SUM(o.amount) AS total FROM lt_orders o JOIN lt_customers c ON c.id = o.customer_id "
+     "GROUP BY c.id, c.name ORDER BY total DESC LIMIT 10;"),
+    ("Nombre de commandes par statut", "SELECT status, COUNT(*) AS orders FROM lt_orders GROUP BY status LIMIT 100;"),
+    ("Montant moyen d'une commande", "SELECT AVG(amount) AS average_amount FROM lt_orders;"),
+    ("Clients sans aucune commande",
+     "SELECT c.name FROM lt_customers c LEFT JOIN lt_orders o ON o.customer_id = c.id WHERE o.id IS NULL LIMIT 100;"),
+]
+_COUNTRIES = ["France", "Belgique", "Suisse", "Canada", "Maroc", "Sénégal"]
+_STATUSES = ["pending", "paid", "shipped", "cancelled"]
+
+
+def seed_database(db_url: str, customers: int, orders: int) -> None:
+    """Crée et remplit les tables du test si elles sont absentes ou vides."""
+    engine = create_engine(db_url)
+    meta = MetaData()
+    customers_table = Table("lt_customers", meta, Column("id", Integer, primary_key=True), Column("name", String(80)),
+                            Column("country", String(40)))
+    orders_table = Table("lt_orders", meta, Column("id", Integer, primary_key=True),
+                         Column("customer_id", Integer, ForeignKey("lt_customers.id")), Column("amount", Float),
+                         Column("status", String(20)))
+    try:
+        meta.create_all(engine)
+        with engine.begin() as conn:
+            if conn.execute(select(func.count()).select_from(customers_table)).scalar():
+                return
+            rng = random.Random(42)
+            conn.execute(insert(customers_table), [
+                {"id": i, "name": f"Client {i}", "country": rng.choice(_COUNTRIES)} for i in range(1, customers + 1)])
+            buyers = [i for i in range(1, customers + 1) if i % 10]  # Un client sur dix n'a aucune commande
+            conn.execute(insert(orders_table), [
+                {"id": i, "customer_id": rng.choice(buyers),
+                 "amount": round(rng.uniform(5, 500), 2), "status": rng.choice(_STATUSES)} for i in range(1, orders + 1)])
+    finally:
+        engine.dispose()
+
+
+def fake_stage_model(stage: str, latency_s: float, jitter: float) -> Any:
+    """Modèle simulé : attend la latence configurée puis répond le SQL du scénario (ou une réponse fixe)."""
+    def _respond(prompt_value: Any) -> str:
+        prompt = prompt_value.to_string() if hasattr(prompt_value, "to_string") else str(prompt_value)
+        time.sleep(max(0.0, latency_s * random.uniform(1 - jitter, 1 + jitter)))
+        if stage != "sql":
+            return "Réponse simulée par le test de charge."
+        question = prompt.rsplit("Question:", 1)[-1]
+        for workload_question, sql in WORKLOAD:
+            if workload_question in question:
+                return sql
+        return "SELECT 1 AS value;"
+    return RunnableLambda(_respond)
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Percentile au rang le plus proche (valeurs triées)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), int(round(p / 100 * len(sorted_values) + 0.5))))
+    return sorted_values[rank - 1]
+
+
+def _run_one(process: Callable[..., Dict[str, Any]], index: int, distinct: bool) -> Dict[str, Any]:
+    question = WORKLOAD[index % len(WORKLOAD)][0]
+    if distinct:
+        question = f"{question} (n°{index})"  # Prompts distincts : pas de fusion des appels LLM identiques
+    started = time.perf_counter()
+    result = process(question)
+    return {"latency_s": time.perf_counter() - started, "error": result.get("error")}
+
+
+def run_level(process: Callable[..., Dict[str, Any]], mode: str, concurrency: int, requests: int,
+              distinct: bool) -> Dict[str, Any]:
+    """Lance requests questions avec concurrency appelants simultanés ; retourne débit et latences."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"vix-load-{mode}") as pool:
+        if mode == "threads":
+            outcomes = list(pool.map(lambda i: _run_one(process, i, distinct), range(requests)))
+        else:
+            async def _drive():
+                # Appelant asyncio (serveur web async) : le pipeline synchrone est déporté sur un pool de threads
+                semaphore = asyncio.Semaphore(concurrency)
+                loop = asyncio.get_running_loop()
+
+                async def _task(i):
+                    async with semaphore:
+                        return await loop.run_in_executor(pool, _run_one, process, i, distinct)
+                return await asyncio.gather(*(_task(i) for i in range(requests)))
+            outcomes = asyncio.run(_drive())
+    elapsed = time.perf_counter() - started
+    latencies = sorted(o["latency_s"] for o in outcomes)
+    errors = [o["error"] for o in outcomes if o["error"]]
+    return {"mode": mode, "concurrency": concurrency, "requests": requests, "errors": len(errors),
+            "error_samples": sorted(set(e[:150] for e in errors))[:3], "elapsed_s": elapsed,
+            "throughput_qps": requests / elapsed if elapsed else 0.0, "p50_s": percentile(latencies, 50),
+            "p95_s": percentile(latencies, 95), "p99_s": percentile(latencies, 99),
+            "max_s": latencies[-1] if latencies else 0.0}
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    print(f"\n{'mode':<8} {'conc.':>5} {'req.':>5} {'err.':>5} {'q/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['concurrency']:>5} {r['requests']:>5} {r['errors']:>5} {r['throughput_qps']:>8.2f} "
+              f"{r['p50_s']:>7.3f}s {r['p95_s']:>7.3f}s {r['p99_s']:>7.3f}s {r['max_s']:>7.3f}s")
+        for sample in r["error_samples"]:
+            print(f"         erreur : {sample}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Test de charge de initialize_and_process_question.")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="Niveaux de concurrence, séparés par des virgules")
+    parser.add_argument("--requests", type=int, default=40, help="Questions par niveau")
+    parser.add_argument("--mode", choices=["threads", "asyncio", "both"], default="both")
+    parser.add_argument("--database-url", help="Base de test (par défaut : SQLite temporaire)")
+    parser.add_argument("--customers", type=int, default=2000)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="Latence simulée par appel LLM")
+    parser.add_argument("--llm-jitter", type=float, default=0.3, help="Variation relative de la latence simulée")
+    parser.add_argument("--same-question", action="store_true",
+                        help="Questions identiques (les appels LLM concurrents sont fusionnés)")
+    parser.add_argument("--json", help="Écrit les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="vix-load-")
+    db_url = args.database_url or f"sqlite:///{os.path.join(work_dir, 'load_test.db')}"
+    env_file = os.path.join(work_dir, ".env")
+    open(env_file, "w").close()
+    # Configuration isolée, fixée avant l'import du pipeline : le .env du projet n'est pas relu
+    os.environ.update({
+        "VIX_ENV_FILE": env_file, "DATABASE_URL": db_url, "GOOGLE_API_KEY": "LOAD_TEST_KEY_NOT_USED",
+        "VIX_LLM_RPM": "0", "VIX_LLM_TPM": "0", "VIX_TEST_MODE_NO_LLM": "false",
+        "VIX_SQL_MODEL": "", "VIX_ANSWER_MODEL": "", "VIX_EXAMPLES_FILE": "", "VIX_REPLICAS": "",
+        "DATABASE_REPLICA_URLS": "", "DB_REPLICA_HOSTS": "",
+        "VIX_HISTORY_PATH": os.path.join(work_dir, "history.db"),
+        "VIX_EXAMPLES_PATH": os.path.join(work_dir, "examples.db"),
+        "VIX_VALUE_INDEX_PATH": os.path.join(work_dir, "value_index.db"),
+        "VIX_SAVED_PATH": os.path.join(work_dir, "saved.db"),
+        "VIX_USAGE_PATH": os.path.join(work_dir, "usage.db"), "VIX_USER_DAILY_TOKENS": "0", "VIX_DB_DAILY_TOKENS": "0",
+        "VIX_USAGE_BUDGETS": "", "VIX_QUESTION_PLANNER": "false",
+    })
+    import model_registry
+    from app_refactored import initialize_and_process_question, dispose_query_engines
+    from llm_throttle import get_throttle_stats
+    from query_history import get_history_writer
+
+    fakes = {stage: fake_stage_model(stage, args.llm_latency_ms / 1000, args.llm_jitter) for stage in model_registry.STAGES}
+    model_registry.get_stage_model = lambda stage: fakes[stage]
+
+    try:
+        print(f"Préparation de la base de test ({db_url.split('@')[-1]})...")
+        seed_database(db_url, args.customers, args.orders)
+        initialize_and_process_question(WORKLOAD[0][0])  # Préchauffage : engine, cache du schéma
+        levels = [int(level) for level in args.levels.split(",") if level.strip()]
+        modes = ["threads", "asyncio"] if args.mode == "both" else [args.mode]
+        results = []
+        for mode in modes:
+            for concurrency in levels:
+                result = run_level(initialize_and_process_question, mode, concurrency,
+                                   max(args.requests, concurrency), not args.same_question)
+                results.append(result)
+                print(f"{mode} x{concurrency}: {result['throughput_qps']:.2f} q/s, p95 {result['p95_s']:.3f}s, "
+                      f"{result['errors']} erreurs")
+        print_results(results)
+        print(f"\nAppels LLM : {get_throttle_stats()}")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"database": db_url.split("@")[-1], "llm_latency_ms": args.llm_latency_ms,
+                           "results": results}, f, indent=2, ensure_ascii=False)
+            print(f"Résultats écrits dans {args.json}")
+    finally:
+        writer = get_history_writer()
+        if writer is not None:
+            writer.flush()
+        dispose_query_engines()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Registre des modèles par étape (génération SQL, rédaction de la réponse, découpage des questions composées)
+et latence mesurée par étape."""
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from cancellation import CancellationToken
+from llm_throttle import throttled_invoke
+from prompt_budget import count_tokens
+
+try:
+    from langchain_openai import ChatOpenAI
+except ImportError:
+    ChatOpenAI = None
+
+STAGES = ("sql", "answer", "plan")
+DEFAULT_MODEL = "gemini-2.0-flash"
+PROVIDERS = ("google", "openai")
+_LATENCY_WINDOW = 200  # Derniers appels gardés par (étape, modèle)
+
+
+def get_stage_config(stage: str) -> Dict[str, Any]:
+    """Configuration d'une étape depuis VIX_<STAGE>_MODEL, _TEMPERATURE, _BASE_URL et _API_KEY.
+
+    Le modèle s'écrit "fournisseur:nom" ("openai:" pour tout endpoint compatible OpenAI, ex.
+    un serveur local) ; sans préfixe, c'est un modèle Gemini. Les étapes "answer" et "plan"
+    reprennent le modèle de l'étape "sql" si elles ne sont pas configurées.
+    """
+    if stage not in STAGES:
+        raise ValueError(f"Unknown model stage: {stage} (expected one of {', '.join(STAGES)})")
+    prefix = f"VIX_{stage.upper()}_"
+    spec = os.getenv(prefix + "MODEL") or (os.getenv("VIX_SQL_MODEL") if stage != "sql" else None) or DEFAULT_MODEL
+    provider, _, model = spec.partition(":") if ":" in spec else ("google", "", spec)
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown model provider '{provider}' in {prefix}MODEL (expected {', '.join(PROVIDERS)}).")
+    config = {"provider": provider, "model": model, "temperature": float(os.getenv(prefix + "TEMPERATURE", "0.0"))}
+    if provider == "openai":
+        config["base_url"] = os.getenv(prefix + "BASE_URL") or os.getenv("OPENAI_BASE_URL")
+        config["api_key"] = os.getenv(prefix + "API_KEY") or os.getenv("OPENAI_API_KEY") or "not-needed"
+    else:
+        config["api_key"] = os.getenv("GOOGLE_API_KEY")
+    return config
+
+
+def describe_stage(stage: str) -> str:
+    config = get_stage_config(stage)
+    return f"{config['provider']}:{config['model']} (t={config['temperature']})"
+
+
+def requires_google_api_key() -> bool:
+    return any(get_stage_config(stage)["provider"] == "google" for stage in STAGES)
+
+
+@lru_cache(maxsize=16)
+def _build_model(provider: str, model: str, temperature: float, base_url: Optional[str], api_key: Optional[str]) -> Any:
+    if provider == "openai":
+        if ChatOpenAI is None:
+            raise ImportError("langchain-openai is required for openai: models: pip install langchain-openai")
+        return ChatOpenAI(model=model, temperature=temperature, base_url=base_url, api_key=api_key)
+    return ChatGoogleGenerativeAI(model=model, temperature=temperature, convert_system_message_to_human=True)
+
+
+def get_stage_model(stage: str) -> Any:
+    """Modèle de chat de l'étape, mis en cache tant que sa configuration (et sa clé) ne change pas.
+
+    L'instance est partagée par tous les threads : ses appels asynchrones passent tous par la boucle
+    unique de cancellation.invoke_cancellable, à laquelle son client asynchrone reste lié.
+    """
+    config = get_stage_config(stage)
+    return _build_model(config["provider"], config["model"], config["temperature"],
+                        config.get("base_url"), config.get("api_key"))
+
+
+_latency_lock = threading.Lock()
+_latencies: Dict[tuple, deque] = {}
+
+
+def record_stage_latency(stage: str, model: str, seconds: float) -> None:
+    with _latency_lock:
+        _latencies.setdefault((stage, model), deque(maxlen=_LATENCY_WINDOW)).append(seconds)
+
+
+def get_latency_stats() -> List[Dict[str, Any]]:
+    """Latence par (étape, modèle) sur les derniers appels : nombre, moyenne, p50, p95."""
+    with _latency_lock:
+        snapshot = {key: sorted(values) for key, values in _latencies.items()}
+    stats = []
+    for (stage, model), values in sorted(snapshot.items()):
+        stats.append({"stage": stage, "model": model, "calls": len(values), "mean_s": statistics.fmean(values),
+                      "p50_s": values[len(values) // 2], "p95_s": values[min(len(values) - 1, int(len(values) * 0.95))]})
+    return stats
+
+
+def _usage_entry(stage: str, model: str, prompt: Any, inputs: Dict[str, Any], message: Any,
+                 output: str, latency: float, coalesced: bool) -> Dict[str, Any]:
+    """Tokens d'un appel depuis usage_metadata du message, sinon estimés sur le prompt et la réponse."""
+    metadata = getattr(message, "usage_metadata", None) or {}
+    if metadata:
+        prompt_tokens, completion_tokens = metadata.get("input_tokens", 0), metadata.get("output_tokens", 0)
+    else:
+        try:
+            prompt_tokens = count_tokens(prompt.format(**inputs))
+        except Exception:
+            prompt_tokens = count_tokens(str(inputs))
+        completion_tokens = count_tokens(output)
+    return {"stage": stage, "model": model, "prompt_tokens": int(prompt_tokens),
+            "completion_tokens": int(completion_tokens), "latency_s": round(latency, 3),
+            "estimated": not metadata, "coalesced": coalesced}
+
+
+def invoke_stage(stage: str, prompt: Any, inputs: Dict[str, Any], cancel_token: Optional[CancellationToken] = None,
+                 status_cb: Optional[Callable[[str], None]] = None, stats: Optional[Dict[str, float]] = None,
+                 label: Optional[str] = None, usage: Optional[List[Dict[str, Any]]] = None) -> str:
+    """Exécute prompt | modèle de l'étape, via le limiteur, et enregistre la latence du modèle.
+
+    La latence enregistrée exclut l'attente en file du limiteur et les pauses entre reprises.
+    usage (optionnel) reçoit l'appel : étape, modèle, tokens de prompt et de complétion, latence.
+    """
+    log = status_cb or (lambda msg: None)
+    model_description = describe_stage(stage)
+    call_stats: Dict[str, float] = {}
+    started = time.perf_counter()
+    # Sans StrOutputParser dans la chaîne : le message garde usage_metadata (tokens facturés)
+    message = throttled_invoke(prompt | get_stage_model(stage), inputs, cancel_token,
+                               label=label or stage, status_cb=log, stats=call_stats)
+    output = StrOutputParser().invoke(message)
+    latency = time.perf_counter() - started - call_stats.get("queue_wait_s", 0.0)
+    if usage is not None:
+        config = get_stage_config(stage)
+        usage.append(_usage_entry(stage, f"{config['provider']}:{config['model']}", prompt, inputs, message, output,
+                                  latency, bool(call_stats.get("coalesced"))))
+    if not call_stats.get("coalesced"):
+        record_stage_latency(stage, model_description, latency)
+    log(f"{label or stage} stage answered by {model_description} in {latency:.2f}s.")
+    if stats is not None:
+        for name, value in call_stats.items():
+            stats[name] = stats.get(name, 0) + value
+        stats[f"{stage}_s"] = stats.get(f"{stage}_s", 0) + latency
+    return output
+
+
+if __name__ == "__main__":
+    # Affiche le routage configuré : python model_registry.py
+    from dotenv import load_dotenv
+    load_dotenv()
+    for stage_name in STAGES:
+        print(f"{stage_name:<7} -> {describe_stage(stage_name)}")
@@ -0,0 +1,156 @@
+"""Comptage des tokens des prompts et réduction par priorité pour tenir dans un budget."""
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_SQL_PROMPT_BUDGET = 12000
+DEFAULT_ANSWER_PROMPT_BUDGET = 8000
+_CHARS_PER_TOKEN = 4  # Approximation quand tiktoken est absent
+_SAMPLE_ROWS_RE = re.compile(r"\n*/\*\n\d+ rows from .*?\*/", re.DOTALL)
+_COMPACT_SAMPLES_RE = re.compile(r"\n  e\.g\. [^\n]*")  # Valeurs d'exemple du schéma compact
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # Fichier d'encodage non téléchargeable (hors ligne)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Nombre de tokens (tiktoken cl100k si disponible, sinon estimation à 4 caractères par token)."""
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / _CHARS_PER_TOKEN)
+
+
+def get_prompt_budget(kind: str) -> int:
+    """Budget en tokens du prompt "sql" ou "answer" (VIX_SQL_PROMPT_BUDGET, VIX_ANSWER_PROMPT_BUDGET)."""
+    if kind == "sql":
+        return int(os.getenv("VIX_SQL_PROMPT_BUDGET", DEFAULT_SQL_PROMPT_BUDGET))
+    if kind == "answer":
+        return int(os.getenv("VIX_ANSWER_PROMPT_BUDGET", DEFAULT_ANSWER_PROMPT_BUDGET))
+    raise ValueError(f"Unknown prompt kind: {kind}")
+
+
+# Étapes de réduction : chacune reçoit la section et le ratio budget/taille actuelle (< 1)
+
+def _drop_last_block(section: str, ratio: float) -> str:
+    """Retire le dernier exemple (blocs séparés par une ligne vide, le premier étant l'en-tête)."""
+    blocks = section.split("\n\n")
+    return "\n\n".join(blocks[:-1]) if len(blocks) > 2 else ""
+
+
+def _drop_last_line(section: str, ratio: float) -> str:
+    lines = section.split("\n")
+    return "\n".join(lines[:-1]) if len(lines) > 2 else ""
+
+
+def _strip_sample_rows(section: str, ratio: float) -> str:
+    return _COMPACT_SAMPLES_RE.sub("", _SAMPLE_ROWS_RE.sub("", section))
+
+
+def _split_tables(section: str) -> Tuple[List[str], List[str]]:
+    """Blocs du schéma et nom de leur table : CREATE TABLE, ou schéma compact (une table par ligne non indentée)."""
+    if "CREATE TABLE" in section:
+        tables = [t for t in re.split(r"\n+(?=CREATE TABLE)", section.strip()) if t.strip()]
+        pattern = r"CREATE TABLE\s+[\"`\[]?([\w.]+)"
+    else:
+        tables = [t for t in re.split(r"\n+(?=\S)", section.strip()) if t.strip()]
+        pattern = r"[\"`\[]?([\w.]+)\("
+    names = [match.group(1).lower() if match else "" for match in (re.match(pattern, t) for t in tables)]
+    return tables, names
+
+
+def _drop_tables(question: str) -> Callable[[str, float], str]:
+    """Retire des tables du schéma (en proportion du dépassement), d'abord celles que la question ne mentionne pas."""
+    question_words = set(re.findall(r"\w+", question.lower()))
+
+    def _step(section: str, ratio: float) -> str:
+        tables, names = _split_tables(section)
+        if len(tables) <= 1:
+            return section
+        # Ordre de suppression : tables non mentionnées (de la fin), puis tables mentionnées (de la fin)
+        unmentioned = [i for i, name in enumerate(names) if name not in question_words]
+        mentioned = [i for i in range(len(tables)) if i not in unmentioned]
+        drop_order = unmentioned[::-1] + mentioned[::-1]
+        count = min(len(tables) - 1, max(1, int(len(tables) * (1 - ratio))))
+        victims = set(drop_order[:count])
+        separator = "\n\n" if "CREATE TABLE" in section else "\n"
+        return separator.join(t for i, t in enumerate(tables) if i not in victims)
+    return _step
+
+
+def _keep_table_rows(section: str, ratio: float) -> str:
+    """Ne garde qu'une partie des lignes d'un tableau markdown/texte, avec une note sur les lignes omises."""
+    lines = section.split("\n")
+    header, rows = lines[:2], [line for line in lines[2:] if not line.startswith("…")]
+    if len(rows) <= 1:
+        return section
+    keep = max(1, min(len(rows) - 1, int(len(rows) * ratio * 0.9)))
+    omitted = len(rows) - keep + sum(int(n) for n in re.findall(r"^… (\d+)", section, re.MULTILINE))
+    return "\n".join(header + rows[:keep] + [f"… {omitted} lignes supplémentaires non affichées"])
+
+
+def _truncate(section: str, ratio: float) -> str:
+    keep = int(len(section) * ratio * 0.95)
+    return section[:keep] + "\n…" if keep < len(section) else section
+
+
+def sql_prompt_steps(question: str) -> List[Tuple[str, Callable[[str, float], str]]]:
+    """Ordre de réduction du prompt SQL : exemples, puis indices de valeurs, puis schéma."""
+    return [("examples", _drop_last_block), ("hints", _drop_last_line), ("schema", _strip_sample_rows),
+            ("schema", _drop_tables(question)), ("schema", _truncate)]
+
+
+ANSWER_PROMPT_STEPS = [("result", _keep_table_rows), ("result", _truncate)]
+
+
+def fit_prompt(render: Callable[[Dict[str, str]], str], sections: Dict[str, str], budget: int,
+               steps: List[Tuple[str, Callable[[str, float], str]]]) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """Applique les étapes de réduction dans l'ordre jusqu'à ce que le prompt rendu tienne dans le budget.
+
+    Retourne les sections réduites et un rapport : tokens finaux, tokens par section, sections
+    réduites et dépassement éventuel (si même le prompt minimal dépasse le budget).
+    """
+    sections = dict(sections)
+    tokens = initial_tokens = count_tokens(render(sections))
+    trimmed: List[str] = []
+    for name, step in steps:
+        while tokens > budget and sections.get(name):
+            reduced = step(sections[name], budget / tokens)
+            if reduced == sections[name]:
+                break
+            sections[name] = reduced
+            if name not in trimmed: trimmed.append(name)
+            tokens = count_tokens(render(sections))
+    return sections, {
+        "tokens": tokens,
+        "initial_tokens": initial_tokens,
+        "budget": budget,
+        "sections": {name: count_tokens(value) for name, value in sections.items()},
+        "trimmed": trimmed,
+        "over_budget": tokens > budget,
+    }
+
+
+def describe_report(label: str, report: Dict[str, Any]) -> str:
+    """Ligne de log résumant le rapport de fit_prompt."""
+    detail = ", ".join(f"{name} {count}" for name, count in report["sections"].items())
+    message = f"{label} prompt: {report['tokens']} tokens ({detail}) / budget {report['budget']}"
+    if report["trimmed"]:
+        message += f"; trimmed {', '.join(report['trimmed'])} from {report['initial_tokens']} tokens"
+    if report["over_budget"]:
+        message += "; still over budget"
+    return message + "."
@@ -0,0 +1,241 @@
+"""Garde-fous d'exécution des requêtes générées : timeouts par dialecte et seuil de coût EXPLAIN."""
+import os
+import re
+import json
+import math
+import time
+import weakref
+from typing import Dict, Any, Optional, Callable
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, Engine
+
+# Valeurs par défaut, surchargées par les variables d'environnement puis par VIX_QUERY_LIMITS
+DEFAULT_QUERY_LIMITS: Dict[str, Any] = {
+    "statement_timeout_ms": 30000,
+    "max_cost": None,       # Coût estimé maximal (unités propres au SGBD)
+    "max_rows": None,       # Nombre de lignes estimé maximal
+    "cost_action": "reject" # "reject" ou "warn"
+}
+
+_ENV_KEYS = {
+    "statement_timeout_ms": "VIX_STATEMENT_TIMEOUT_MS",
+    "max_cost": "VIX_MAX_QUERY_COST",
+    "max_rows": "VIX_MAX_QUERY_ROWS",
+    "cost_action": "VIX_QUERY_COST_ACTION",
+}
+
+_installed_engines: "weakref.WeakKeyDictionary[Engine, int]" = weakref.WeakKeyDictionary()
+
+
+def _parse_limit(key: str, value: Any) -> Any:
+    if value is None or value == "":
+        return None
+    if key == "cost_action":
+        action = str(value).lower()
+        if action not in ("reject", "warn"):
+            raise ValueError(f"Invalid cost action: {value} (expected 'reject' or 'warn')")
+        return action
+    if key == "statement_timeout_ms":
+        return int(value)
+    return float(value)
+
+
+def get_query_limits(db_type: str, database_name: Optional[str] = None) -> Dict[str, Any]:
+    """Retourne les limites applicables à une base.
+
+    Ordre de priorité : entrée de VIX_QUERY_LIMITS pour le nom de la base, puis pour le type
+    de BDD, puis variables VIX_* individuelles, puis valeurs par défaut.
+    VIX_QUERY_LIMITS est un objet JSON, par ex. {"ventes": {"max_cost": 100000}, "sqlite": {"statement_timeout_ms": 5000}}.
+    """
+    limits = dict(DEFAULT_QUERY_LIMITS)
+    for key, env_key in _ENV_KEYS.items():
+        env_value = os.getenv(env_key)
+        if env_value not in (None, ""):
+            limits[key] = _parse_limit(key, env_value)
+
+    raw_overrides = os.getenv("VIX_QUERY_LIMITS", "").strip()
+    if raw_overrides:
+        try:
+            overrides = json.loads(raw_overrides)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"VIX_QUERY_LIMITS is not valid JSON: {e}")
+        db_key = os.path.splitext(os.path.basename(database_name))[0] if database_name else None
+        for scope in (db_type.lower(), db_key):
+            if scope and isinstance(overrides.get(scope), dict):
+                for key, value in overrides[scope].items():
+                    if key in DEFAULT_QUERY_LIMITS:
+                        limits[key] = _parse_limit(key, value)
+    return limits
+
+
+def _apply_session_timeout(dbapi_conn, db_type: str, timeout_ms: int) -> None:
+    """Applique le timeout d'instruction au niveau de la session du driver."""
+    if db_type == "postgresql":
+        cursor = dbapi_conn.cursor()
+        cursor.execute(f"SET statement_timeout = {int(timeout_ms)}")
+        cursor.close()
+        dbapi_conn.commit()  # Un SET hors commit serait annulé par le rollback du pool
+    elif db_type == "mysql":
+        cursor = dbapi_conn.cursor()
+        cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {int(timeout_ms)}")
+        cursor.close()
+    elif db_type == "mariadb":
+        cursor = dbapi_conn.cursor()
+        cursor.execute(f"SET SESSION max_statement_time = {timeout_ms / 1000.0:.3f}")
+        cursor.close()
+    elif db_type == "mssql":
+        dbapi_conn.timeout = math.ceil(timeout_ms / 1000) if timeout_ms > 0 else 0  # pyodbc : secondes, 0 = aucun
+    elif db_type == "oracle":
+        dbapi_conn.call_timeout = int(timeout_ms)
+    elif db_type == "sqlite":
+        pass  # Géré par le progress handler, armé à chaque exécution
+
+
+def install_statement_timeout(engine: Engine, db_type: str, timeout_ms: Optional[int]) -> None:
+    """Installe le timeout d'instruction sur toutes les connexions de l'engine.
+
+    Le réglage est appliqué à chaque checkout du pool (y compris pour les connexions déjà
+    ouvertes) ; pour SQLite, l'échéance est réarmée avant chaque exécution et l'instruction
+    est interrompue par le progress handler une fois l'échéance dépassée. Un nouvel appel sur
+    le même engine change la valeur ; 0 (ou None) désactive le timeout.
+    """
+    timeout_ms = max(0, int(timeout_ms or 0))
+    first_install = engine not in _installed_engines
+    if first_install and not timeout_ms:
+        return  # Rien à désactiver : les listeners seront posés au premier timeout
+    _installed_engines[engine] = timeout_ms
+    if not first_install:
+        return  # Les listeners lisent la valeur courante dans _installed_engines
+
+    db_type = db_type.lower()
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_conn, connection_record, connection_proxy):
+        current_timeout = _installed_engines.get(engine, 0)
+        if connection_record.info.get("vix_timeout_ms", 0) == current_timeout:
+            return
+        if db_type == "sqlite":
+            # Progress handler posé une fois ; avec un timeout à 0, _arm_deadline ne fixe aucune échéance
+            info = connection_record.info
+            def _progress_handler():
+                deadline = info.get("vix_deadline")
+                return 1 if deadline is not None and time.monotonic() > deadline else 0
+            if "vix_timeout_ms" not in info:
+                dbapi_conn.set_progress_handler(_progress_handler, 10000)
+        else:  # Une valeur à 0 réinitialise la session (0 = aucun timeout pour chaque SGBD)
+            _apply_session_timeout(dbapi_conn, db_type, current_timeout)
+        connection_record.info["vix_timeout_ms"] = current_timeout
+
+    if db_type == "sqlite":
+        @event.listens_for(engine, "before_cursor_execute")
+        def _arm_deadline(conn, cursor, statement, parameters, context, executemany):
+            current_timeout = _installed_engines.get(engine)
+            conn.info["vix_deadline"] = time.monotonic() + current_timeout / 1000.0 if current_timeout else None
+
+
+def rearm_statement_deadline(conn: Connection) -> None:
+    """Donne un nouveau délai complet à la lecture suivante d'un curseur resté ouvert (pagination).
+
+    Sans effet hors SQLite, dont l'échéance (progress handler) court depuis l'exécution de l'instruction.
+    """
+    current_timeout = _installed_engines.get(conn.engine)
+    if current_timeout and "vix_deadline" in conn.info:
+        conn.info["vix_deadline"] = time.monotonic() + current_timeout / 1000.0
+
+
+def _collect_json_values(node: Any, keys: tuple, found: list) -> None:
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in keys:
+                try: found.append(float(value))
+                except (TypeError, ValueError): pass
+            _collect_json_values(value, keys, found)
+    elif isinstance(node, list):
+        for item in node:
+            _collect_json_values(item, keys, found)
+
+
+def estimate_query_cost(engine: Engine, query: str, db_type: str) -> Optional[Dict[str, float]]:
+    """Estime le coût et le nombre de lignes d'une requête via EXPLAIN, sans l'exécuter.
+
+    Retourne {"cost": ..., "rows": ...} ou None si le SGBD ne fournit pas d'estimation
+    (SQLite n'expose pas de coût dans EXPLAIN QUERY PLAN).
+    """
+    sql = query.strip().rstrip(";")
+    db_type = db_type.lower()
+
+    if db_type == "postgresql":
+        with engine.connect() as conn:
+            plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        if isinstance(plan, str): plan = json.loads(plan)
+        root = plan[0]["Plan"]
+        return {"cost": float(root["Total Cost"]), "rows": float(root["Plan Rows"])}
+
+    if db_type in ("mysql", "mariadb"):
+        with engine.connect() as conn:
+            plan = json.loads(conn.execute(text(f"EXPLAIN FORMAT=JSON {sql}")).scalar())
+        costs, rows = [], []
+        _collect_json_values(plan, ("query_cost",), costs)
+        _collect_json_values(plan, ("rows_produced_per_join", "rows"), rows)
+        return {"cost": max(costs) if costs else None, "rows": max(rows) if rows else None}
+
+    if db_type == "mssql":
+        with engine.connect() as conn:
+            cursor = conn.connection.dbapi_connection.cursor()
+            try:
+                cursor.execute("SET SHOWPLAN_XML ON")
+                cursor.execute(sql)
+                plan_xml = cursor.fetchone()[0]
+            finally:
+                cursor.execute("SET SHOWPLAN_XML OFF")
+                cursor.close()
+        cost_match = re.search(r'StatementSubTreeCost="([^"]+)"', plan_xml)
+        rows_match = re.search(r'StatementEstRows="([^"]+)"', plan_xml)
+        return {"cost": float(cost_match.group(1)) if cost_match else None,
+                "rows": float(rows_match.group(1)) if rows_match else None}
+
+    if db_type == "oracle":
+        statement_id = f"vix_{os.getpid()}_{int(time.time() * 1000) % 1000000}"
+        with engine.connect() as conn:
+            conn.execute(text(f"EXPLAIN PLAN SET STATEMENT_ID = '{statement_id}' FOR {sql}"))
+            row = conn.execute(text("SELECT cost, cardinality FROM plan_table WHERE statement_id = :sid AND id = 0"),
+                               {"sid": statement_id}).fetchone()
+            conn.execute(text("DELETE FROM plan_table WHERE statement_id = :sid"), {"sid": statement_id})
+            conn.commit()
+        if not row: return None
+        return {"cost": float(row[0]) if row[0] is not None else None,
+                "rows": float(row[1]) if row[1] is not None else None}
+
+    return None
+
+
+def check_query_cost(engine: Engine, query: str, db_type: str, limits: Dict[str, Any],
+                     status_cb: Callable[[str], None]) -> Optional[Dict[str, float]]:
+    """Compare l'estimation EXPLAIN aux seuils configurés ; rejette (ValueError) ou avertit."""
+    max_cost, max_rows = limits.get("max_cost"), limits.get("max_rows")
+    if max_cost is None and max_rows is None:
+        return None
+
+    try:
+        estimate = estimate_query_cost(engine, query, db_type)
+    except Exception as e:
+        status_cb(f"EXPLAIN cost estimate failed: {str(e)[:100]}. Skipping cost guard.")
+        return None
+    if not estimate:
+        status_cb(f"Cost guard: no EXPLAIN estimate available for {db_type.upper()}.")
+        return None
+    status_cb(f"EXPLAIN estimate: cost={estimate.get('cost')}, rows={estimate.get('rows')}.")
+
+    violations = []
+    if max_cost is not None and estimate.get("cost") is not None and estimate["cost"] > max_cost:
+        violations.append(f"estimated cost {estimate['cost']:.0f} > {max_cost:.0f}")
+    if max_rows is not None and estimate.get("rows") is not None and estimate["rows"] > max_rows:
+        violations.append(f"estimated rows {estimate['rows']:.0f} > {max_rows:.0f}")
+    if violations:
+        message = f"Query too expensive: {', '.join(violations)}."
+        if limits.get("cost_action") == "warn":
+            status_cb(f"Warning: {message}")
+        else:
+            raise ValueError(message)
+    return estimate
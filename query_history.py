@@ -0,0 +1,234 @@
+"""Historique local des questions traitées (SQLite), écrit par lots en arrière-plan, et rapport d'analyse en CLI."""
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from example_store import normalize_sql
+from value_index import normalize_text
+
+DEFAULT_HISTORY_PATH = "vix_history.db"
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_INTERVAL_S = 2.0
+_MAX_PENDING = 10000  # Au-delà, les enregistrements sont abandonnés plutôt que de bloquer une question
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY, created_at REAL NOT NULL, db_key TEXT, db_type TEXT, question TEXT NOT NULL,
+    question_norm TEXT NOT NULL, sql TEXT, sql_norm TEXT, source TEXT, status TEXT NOT NULL, error TEXT,
+    row_count INTEGER, result_bytes INTEGER, total_s REAL NOT NULL, stages TEXT NOT NULL,
+    prompt_tokens TEXT, llm_stats TEXT);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created_at);
+CREATE INDEX IF NOT EXISTS runs_sql ON runs (db_key, sql_norm);
+"""
+
+
+class RunTrace:
+    """Chronométrage d'un traitement par étapes successives, et identité de la base interrogée."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.stages: Dict[str, float] = {}
+        self.db_key: Optional[str] = None
+        self.db_type: Optional[str] = None
+        self.sql: Optional[str] = None  # SQL nettoyé, gardé même si une étape ultérieure échoue
+        self.user: Optional[str] = None
+        self.budget: Optional[Dict[str, Any]] = None  # Mode autorisé par les budgets LLM (usage_meter.check_budget)
+        self.llm_usage: List[Dict[str, Any]] = []  # Appels LLM du traitement (voir invoke_stage)
+
+    def lap(self, stage: str) -> None:
+        """Attribue à stage le temps écoulé depuis l'étape précédente (cumulé si l'étape revient)."""
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    @property
+    def total_s(self) -> float:
+        return time.perf_counter() - self.started
+
+
+class HistoryWriter:
+    """File d'écriture asynchrone : les enregistrements sont insérés par lots dans une seule transaction.
+
+    record() ne fait qu'ajouter à une file en mémoire ; le calcul de la taille du résultat et
+    l'écriture SQLite se font dans le thread d'écriture.
+    """
+
+    def __init__(self, path: str = DEFAULT_HISTORY_PATH, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval_s: float = DEFAULT_FLUSH_INTERVAL_S):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.dropped = 0
+        self.written = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=_MAX_PENDING)
+        self._thread = threading.Thread(target=self._loop, name="vix-history-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Attend que les enregistrements en file soient écrits (fin de processus, tests)."""
+        done = threading.Event()
+        self.record({"_flush": done})
+        done.wait(timeout)
+
+    def _loop(self) -> None:
+        conn = sqlite3.connect(self.path)
+        conn.executescript(_SCHEMA)
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval_s
+            while len(batch) < self.batch_size and not any("_flush" in e for e in batch):
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            rows = [_row(e) for e in batch if "_flush" not in e]
+            if rows:
+                try:
+                    with conn:
+                        conn.executemany(
+                            "INSERT INTO runs (created_at, db_key, db_type, question, question_norm, sql, sql_norm, source, "
+                            "status, error, row_count, result_bytes, total_s, stages, prompt_tokens, llm_stats) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                    self.written += len(rows)
+                except sqlite3.Error:
+                    self.dropped += len(rows)
+            for entry in batch:
+                if "_flush" in entry:
+                    entry["_flush"].set()
+
+
+def _row(entry: Dict[str, Any]) -> tuple:
+    result_text = entry.get("result")
+    sql = entry.get("sql")
+    return (entry["created_at"], entry.get("db_key"), entry.get("db_type"), entry["question"],
+            normalize_text(entry["question"]), sql, normalize_sql(sql) if sql else None, entry.get("source"),
+            entry["status"], entry.get("error"), entry.get("row_count"),
+            len(result_text.encode("utf-8")) if isinstance(result_text, str) else None, entry["total_s"],
+            json.dumps(entry.get("stages") or {}), json.dumps(entry.get("prompt_tokens") or {}),
+            json.dumps(entry.get("llm_stats") or {}))
+
+
+_writer: Optional[HistoryWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_history_writer() -> Optional[HistoryWriter]:
+    """Écrivain partagé du processus (VIX_HISTORY_PATH) ; None si VIX_HISTORY=false."""
+    global _writer
+    if os.getenv("VIX_HISTORY", "true").lower() == "false":
+        return None
+    path = os.getenv("VIX_HISTORY_PATH", DEFAULT_HISTORY_PATH)
+    with _writer_lock:
+        if _writer is None or _writer.path != path:
+            if _writer is not None:
+                _writer.flush()
+            _writer = HistoryWriter(path)
+            atexit.register(_writer.flush)
+        return _writer
+
+
+def record_run(question: str, result: Dict[str, Any], trace: RunTrace) -> None:
+    """Met en file l'enregistrement d'un traitement (résultat de initialize_and_process_question)."""
+    writer = get_history_writer()
+    if writer is None:
+        return
+    status = "cancelled" if result.get("cancelled") else ("error" if result.get("error") else "ok")
+    writer.record({
+        "created_at": time.time(), "db_key": trace.db_key, "db_type": trace.db_type, "question": question,
+        "sql": result.get("sql_query") or trace.sql, "source": result.get("source"), "status": status,
+        "error": result.get("error"), "row_count": len(result["rows"]) if result.get("rows") is not None else None,
+        "result": result.get("result"), "total_s": trace.total_s, "stages": dict(trace.stages),
+        "prompt_tokens": result.get("prompt_tokens"), "llm_stats": result.get("llm_stats"),
+    })
+
+
+# --- Rapport ---
+
+def history_report(path: str = DEFAULT_HISTORY_PATH, days: float = 30, limit: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+    """Questions les plus lentes, SQL les plus fréquents, opportunités de cache et erreurs récurrentes."""
+    conn = sqlite3.connect(path)
+    conn.executescript(_SCHEMA)
+    conn.row_factory = sqlite3.Row
+    since = time.time() - days * 86400
+    try:
+        slowest = [dict(r) for r in conn.execute(
+            "SELECT question, sql, total_s, stages, row_count, result_bytes, datetime(created_at, 'unixepoch', 'localtime') AS at "
+            "FROM runs WHERE created_at >= ? AND status = 'ok' ORDER BY total_s DESC LIMIT ?", (since, limit))]
+        for run in slowest:
+            stages = json.loads(run.pop("stages"))
+            run["slowest_stage"] = max(stages, key=stages.get) if stages else None
+        frequent_sql = [dict(r) for r in conn.execute(
+            "SELECT MIN(sql) AS sql, COUNT(*) AS runs, AVG(total_s) AS avg_s, AVG(row_count) AS avg_rows, "
+            "AVG(result_bytes) AS avg_bytes FROM runs WHERE created_at >= ? AND sql_norm IS NOT NULL "
+            "GROUP BY db_key, sql_norm ORDER BY runs DESC LIMIT ?", (since, limit))]
+        # Même question (texte normalisé) exécutée plusieurs fois sur la base : candidates aux questions
+        # enregistrées ou à un cache de résultats ; gain estimé = temps total des exécutions répétées
+        cache_opportunities = [dict(r) for r in conn.execute(
+            "SELECT MIN(question) AS question, COUNT(*) AS runs, COUNT(DISTINCT sql_norm) AS distinct_sql, "
+            "SUM(total_s) - MIN(total_s) AS saveable_s, AVG(total_s) AS avg_s FROM runs "
+            "WHERE created_at >= ? AND status = 'ok' AND source = 'database' "
+            "GROUP BY db_key, question_norm HAVING COUNT(*) > 1 ORDER BY saveable_s DESC LIMIT ?", (since, limit))]
+        error_hot_spots = [dict(r) for r in conn.execute(
+            "SELECT substr(error, 1, 120) AS error, COUNT(*) AS runs, COUNT(DISTINCT question_norm) AS questions, "
+            "MIN(question) AS example_question, datetime(MAX(created_at), 'unixepoch', 'localtime') AS last_seen "
+            "FROM runs WHERE created_at >= ? AND status = 'error' GROUP BY substr(error, 1, 120) "
+            "ORDER BY runs DESC LIMIT ?", (since, limit))]
+        totals = dict(conn.execute(
+            "SELECT COUNT(*) AS runs, SUM(status = 'error') AS errors, AVG(total_s) AS avg_s FROM runs WHERE created_at >= ?",
+            (since,)).fetchone())
+    finally:
+        conn.close()
+    return {"totals": totals, "slowest": slowest, "frequent_sql": frequent_sql,
+            "cache_opportunities": cache_opportunities, "error_hot_spots": error_hot_spots}
+
+
+def _one_line(text: Optional[str], width: int = 70) -> str:
+    flat = " ".join((text or "").split())
+    return flat if len(flat) <= width else flat[:width - 1] + "…"
+
+
+def print_report(report: Dict[str, Any], days: float) -> None:
+    totals = report["totals"]
+    print(f"Historique sur {days:g} jours : {totals['runs'] or 0} questions, {totals['errors'] or 0} erreurs, "
+          f"{totals['avg_s'] or 0:.2f}s en moyenne")
+    print("\nQuestions les plus lentes :")
+    for run in report["slowest"]:
+        print(f"  {run['total_s']:7.2f}s  [{run['slowest_stage'] or '-'}]  {run['row_count'] or 0} lignes, "
+              f"{run['result_bytes'] or 0} o  {_one_line(run['question'], 60)}  ({run['at']})")
+    print("\nSQL les plus fréquents :")
+    for item in report["frequent_sql"]:
+        print(f"  {item['runs']:5d}x  {item['avg_s']:6.2f}s moy.  {item['avg_rows'] or 0:8.0f} lignes moy.  "
+              f"{_one_line(item['sql'])}")
+    print("\nOpportunités de cache (même question relancée sur la base) :")
+    for item in report["cache_opportunities"]:
+        print(f"  {item['runs']:5d}x  {item['saveable_s']:7.2f}s récupérables  {item['distinct_sql']} SQL distinct(s)  "
+              f"{_one_line(item['question'], 60)}")
+    print("\nErreurs récurrentes :")
+    for item in report["error_hot_spots"]:
+        print(f"  {item['runs']:5d}x  {item['questions']} question(s), dernière {item['last_seen']}  {_one_line(item['error'])}")
+        print(f"         ex. {_one_line(item['example_question'], 80)}")
+
+
+if __name__ == "__main__":
+    # python query_history.py report [jours] [limite]
+    import sys
+    from dotenv import load_dotenv
+    load_dotenv()
+    if len(sys.argv) < 2 or sys.argv[1] != "report":
+        print("Usage: python query_history.py report [jours=30] [limite=10]")
+        sys.exit(1)
+    report_days = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+    print_report(history_report(os.getenv("VIX_HISTORY_PATH", DEFAULT_HISTORY_PATH), report_days,
+                                int(sys.argv[3]) if len(sys.argv) > 3 else 10), report_days)
@@ -0,0 +1,134 @@
+"""Questions composées : découpage en sous-questions indépendantes, traitées en parallèle puis fusionnées localement."""
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_core.prompts import PromptTemplate
+
+from cancellation import CancellationToken, QuestionCancelled
+from value_index import normalize_text
+
+DEFAULT_MAX_PARTS = 4
+
+# Indices d'une question composée : le planificateur LLM n'est appelé que si l'un d'eux est présent
+_COMPOUND_PATTERNS = [
+    r"\bcompar", r"\bpuis\b", r"\bainsi que\b", r"\bet aussi\b", r"\bde meme que\b", r"\bpar ailleurs\b",
+    r"\bet (?:donne|affiche|liste|montre|calcule|indique|compte)\b",
+    r"\band (?:also|then|show|list|give)\b", r"\bas well as\b", r"\bversus\b", r"\bvs\b",
+]
+
+
+def may_be_compound(question: str) -> bool:
+    """Filtre bon marché avant l'appel au planificateur : plusieurs demandes, comparaison ou enchaînement."""
+    if question.count("?") > 1 or ";" in question:
+        return True
+    text = normalize_text(question)
+    return any(re.search(pattern, text) for pattern in _COMPOUND_PATTERNS)
+
+
+@lru_cache(maxsize=None)
+def get_plan_prompt() -> PromptTemplate:
+    return PromptTemplate.from_template("""Tu découpes les questions posées à une base de données.
+Si la question regroupe plusieurs demandes indépendantes (chacune répondable par sa propre requête SQL,
+sans utiliser le résultat d'une autre), réécris chaque demande en une question autonome et complète,
+en y reprenant le contexte commun (période, filtres, regroupement). Une comparaison entre périodes
+ou catégories peut être découpée en une question par période ou catégorie.
+Sinon, retourne la question telle quelle, seule.
+Réponds uniquement par un tableau JSON de chaînes, de {max_parts} éléments au plus.
+
+Question: {question}
+Sous-questions (JSON): """)
+
+
+def parse_plan(text: str, max_parts: int = DEFAULT_MAX_PARTS) -> List[str]:
+    """Sous-questions lues dans la réponse du planificateur ; [] si la question reste entière."""
+    match = re.search(r"\[.*\]", text or "", flags=re.DOTALL)
+    if not match:
+        return []
+    try:
+        items = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return []
+    sub_questions, seen = [], set()
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, str) and item.strip() and normalize_text(item) not in seen:
+            seen.add(normalize_text(item))
+            sub_questions.append(item.strip())
+    # Trop de parties : le découpage est suspect, la génération en une seule requête reste plus sûre
+    return sub_questions if 2 <= len(sub_questions) <= max_parts else []
+
+
+def run_sub_questions(sub_questions: Sequence[str], run_part: Callable[[str], Dict[str, Any]], max_workers: int,
+                      cancel_token: Optional[CancellationToken] = None) -> tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """Traite les sous-questions en parallèle ; retourne leurs résultats (dans l'ordre) et la durée comparée.
+
+    Une partie en échec porte son message dans "error" sans interrompre les autres. sequential_s,
+    somme des durées des parties, est le temps qu'aurait pris leur traitement l'une après l'autre.
+    """
+    def _timed(sub_question: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            part = {**run_part(sub_question), "error": None}
+        except QuestionCancelled:
+            raise
+        except Exception as e:
+            part = {"question": sub_question, "error": str(e)}
+        part["seconds"] = time.perf_counter() - started
+        return part
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="vix-sub-question") as pool:
+        parts = list(pool.map(_timed, sub_questions))
+    if cancel_token: cancel_token.raise_if_cancelled()
+    wall_s = time.perf_counter() - started
+    sequential_s = sum(part["seconds"] for part in parts)
+    return parts, {"wall_s": wall_s, "sequential_s": sequential_s,
+                   "speedup": sequential_s / wall_s if wall_s else 1.0}
+
+
+def _unique_columns(columns: Sequence[str]) -> List[str]:
+    """Noms rendus uniques dans l'ordre (count, count_2) : deux colonnes homonymes restent distinctes."""
+    names: List[str] = []
+    for column in columns:
+        name, suffix = str(column), 2
+        while name in names:
+            name, suffix = f"{column}_{suffix}", suffix + 1
+        names.append(name)
+    return names
+
+
+def merge_part_results(parts: Sequence[Dict[str, Any]]) -> tuple[List[str], List[tuple]]:
+    """Union des résultats des parties : colonne sub_question puis toutes les colonnes rencontrées, vides ailleurs."""
+    part_columns = [_unique_columns(part["columns"]) for part in parts]
+    columns: List[str] = []
+    for names in part_columns:
+        columns += [column for column in names if column not in columns]
+    rows = []
+    for part, names in zip(parts, part_columns):
+        positions = {name: position for position, name in enumerate(names)}
+        rows += [(part["question"], *(row[positions[c]] if c in positions else None for c in columns))
+                 for row in part["rows"]]
+    return ["sub_question"] + columns, rows
+
+
+def format_plan_result(parts: Sequence[Dict[str, Any]], format_part: Callable[[Dict[str, Any]], str]) -> str:
+    """Une section par sous-question : son tableau, ou son erreur."""
+    sections = []
+    for index, part in enumerate(parts, 1):
+        body = f"Erreur : {part['error']}" if part["error"] else format_part(part)
+        sections.append(f"### {index}. {part['question']}\n\n{body}")
+    return "\n\n".join(sections)
+
+
+def planner_enabled() -> bool:
+    return os.getenv("VIX_QUESTION_PLANNER", "false").lower() == "true"
+
+
+def planner_settings() -> Dict[str, int]:
+    """Nombre maximal de sous-questions et de parties traitées simultanément, depuis l'environnement."""
+    max_parts = int(os.getenv("VIX_PLANNER_MAX_PARTS", DEFAULT_MAX_PARTS))
+    return {"max_parts": max_parts, "max_workers": int(os.getenv("VIX_PLANNER_WORKERS", max_parts))}
@@ -0,0 +1,221 @@
+"""Routage des requêtes en lecture validées vers des réplicas, avec contrôles de santé et repli sur le primaire."""
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+ROUTING_STRATEGIES = ("round_robin", "least_latency")
+DEFAULT_HEALTH_INTERVAL_S = 15.0
+DEFAULT_MAX_FAILURES = 2     # Échecs consécutifs avant éjection
+DEFAULT_RECOVER_AFTER = 2    # Succès consécutifs avant réintégration
+_LATENCY_SMOOTHING = 0.3     # Poids du dernier échantillon dans la moyenne mobile
+
+
+def replica_uris_from_env(primary_uri: str) -> List[str]:
+    """URIs des réplicas de la base primaire.
+
+    Sources, par priorité : VIX_REPLICAS (JSON {"nom_base": ["uri", ...]}), DATABASE_REPLICA_URLS
+    (URIs séparées par des virgules), DB_REPLICA_HOSTS ("hote[:port],...", mêmes identifiants
+    et base que le primaire).
+    """
+    primary = make_url(primary_uri)
+    raw_map = os.getenv("VIX_REPLICAS", "").strip()
+    if raw_map:
+        try:
+            replicas_by_db = json.loads(raw_map)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"VIX_REPLICAS is not valid JSON: {e}")
+        db_key = os.path.splitext(os.path.basename(primary.database or ""))[0]
+        if isinstance(replicas_by_db.get(db_key), list):
+            return [str(uri) for uri in replicas_by_db[db_key]]
+    listed = [uri.strip() for uri in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if uri.strip()]
+    if listed:
+        return listed
+    uris = []
+    for host_spec in (h.strip() for h in os.getenv("DB_REPLICA_HOSTS", "").split(",")):
+        if not host_spec:
+            continue
+        host, _, port = host_spec.partition(":")
+        uris.append(primary.set(host=host, port=int(port) if port else primary.port).render_as_string(hide_password=False))
+    return uris
+
+
+class _Replica:
+    def __init__(self, uri: str, engine: Engine):
+        self.name = make_url(uri).render_as_string(hide_password=True)
+        self.engine = engine
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+        self.queries = 0
+        self.errors = 0
+        self.latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_check: Optional[float] = None
+
+    def observe_latency(self, elapsed_ms: float) -> None:
+        self.latency_ms = elapsed_ms if self.latency_ms is None else \
+            (1 - _LATENCY_SMOOTHING) * self.latency_ms + _LATENCY_SMOOTHING * elapsed_ms
+
+
+class ReplicaRouter:
+    """Répartit les SELECT validés sur les réplicas sains ; le primaire sert de repli.
+
+    Un thread de fond sonde chaque réplica (SELECT 1) toutes les health_interval_s secondes :
+    un réplica est éjecté après max_failures échecs consécutifs et réintégré après
+    recover_after succès consécutifs.
+    """
+
+    def __init__(self, replica_uris: List[str], engine_factory: Callable[[str], Engine], strategy: str = "round_robin",
+                 health_interval_s: float = DEFAULT_HEALTH_INTERVAL_S, max_failures: int = DEFAULT_MAX_FAILURES,
+                 recover_after: int = DEFAULT_RECOVER_AFTER, status_cb: Optional[Callable[[str], None]] = None):
+        if strategy not in ROUTING_STRATEGIES:
+            raise ValueError(f"Unknown replica routing strategy: {strategy} (expected one of {', '.join(ROUTING_STRATEGIES)})")
+        self.strategy = strategy
+        self.max_failures = max_failures
+        self.recover_after = recover_after
+        self.primary_fallbacks = 0
+        self._log = status_cb or (lambda msg: None)
+        self._lock = threading.Lock()
+        self._replicas = [_Replica(uri, engine_factory(uri)) for uri in replica_uris]
+        self._round_robin = itertools.count()
+        self._stop = threading.Event()
+        self._health_thread = None
+        if self._replicas and health_interval_s > 0:
+            self._health_thread = threading.Thread(target=self._health_loop, args=(health_interval_s,),
+                                                   name="vix-replica-health", daemon=True)
+            self._health_thread.start()
+
+    def _choose(self) -> Optional[_Replica]:
+        with self._lock:
+            healthy = [r for r in self._replicas if r.healthy]
+            if not healthy:
+                return None
+            if self.strategy == "least_latency":
+                return min(healthy, key=lambda r: r.latency_ms if r.latency_ms is not None else 0.0)
+            return healthy[next(self._round_robin) % len(healthy)]
+
+    def _record(self, replica: _Replica, ok: bool, elapsed_ms: Optional[float] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            replica.last_check = time.time()
+            if ok:
+                replica.consecutive_failures = 0
+                replica.consecutive_successes += 1
+                if elapsed_ms is not None: replica.observe_latency(elapsed_ms)
+                if not replica.healthy and replica.consecutive_successes >= self.recover_after:
+                    replica.healthy = True
+                    self._log(f"Replica {replica.name} is healthy again; back in rotation.")
+                return
+            replica.errors += 1
+            replica.consecutive_successes = 0
+            replica.consecutive_failures += 1
+            replica.last_error = error
+            if replica.healthy and replica.consecutive_failures >= self.max_failures:
+                replica.healthy = False
+                self._log(f"Replica {replica.name} ejected after {replica.consecutive_failures} failures: {error}")
+
+    def _probe(self, replica: _Replica) -> bool:
+        started = time.perf_counter()
+        try:
+            with replica.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except Exception as e:
+            self._record(replica, False, error=str(e)[:200])
+            return False
+        self._record(replica, True, (time.perf_counter() - started) * 1000)
+        return True
+
+    def _health_loop(self, interval_s: float) -> None:
+        while not self._stop.wait(interval_s):
+            for replica in list(self._replicas):
+                self._probe(replica)
+
+    def execute_select(self, query: str, primary_engine: Engine,
+                       status_cb: Optional[Callable[[str], None]] = None) -> Tuple[List[str], List[tuple], str]:
+        """Exécute la requête sur un réplica sain, sinon sur le primaire ; retourne (colonnes, lignes, cible).
+
+        Une erreur de connexion sur un réplica déclenche une sonde : si elle échoue aussi (échec
+        compté pour l'éjection), la requête repart sur le primaire ; sinon l'erreur vient de la
+        requête elle-même et est remontée.
+        """
+        log = status_cb or (lambda msg: None)
+        replica = self._choose()
+        if replica is not None:
+            started = time.perf_counter()
+            try:
+                columns, rows = _run(replica.engine, query)
+                with self._lock:
+                    replica.queries += 1
+                self._record(replica, True, (time.perf_counter() - started) * 1000)
+                return columns, rows, replica.name
+            except (OperationalError, InterfaceError) as e:
+                if self._probe(replica):
+                    raise
+                log(f"Replica {replica.name} failed ({str(e)[:100]}); falling back to the primary.")
+        with self._lock:
+            self.primary_fallbacks += 1
+        columns, rows = _run(primary_engine, query)
+        return columns, rows, "primary"
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs exposés : par réplica (santé, requêtes, erreurs, latence lissée) et replis sur le primaire."""
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "primary_fallbacks": self.primary_fallbacks,
+                "replicas": [{"name": r.name, "healthy": r.healthy, "queries": r.queries, "errors": r.errors,
+                              "consecutive_failures": r.consecutive_failures,
+                              "latency_ms": round(r.latency_ms, 1) if r.latency_ms is not None else None,
+                              "last_error": r.last_error, "last_check": r.last_check} for r in self._replicas],
+            }
+
+    def close(self) -> None:
+        self._stop.set()
+        for replica in self._replicas:
+            replica.engine.dispose()
+
+
+def _run(engine: Engine, query: str) -> Tuple[List[str], List[tuple]]:
+    with engine.connect() as conn:
+        result = conn.execute(text(query))
+        return list(result.keys()), [tuple(row) for row in result]
+
+
+_routers: Dict[Tuple[str, Tuple[str, ...]], ReplicaRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_replica_router(primary_uri: str, engine_factory: Callable[[str], Engine],
+                       status_cb: Optional[Callable[[str], None]] = None,
+                       health_log: Optional[Callable[[str], None]] = None) -> Optional[ReplicaRouter]:
+    """Routeur partagé du processus pour cette base primaire, ou None sans réplica configuré.
+
+    Les engines des réplicas vivent aussi longtemps que le routeur (pas de reconnexion par question).
+    health_log reçoit les éjections/réintégrations détectées en arrière-plan (durée de vie du routeur).
+    """
+    replica_uris = replica_uris_from_env(primary_uri)
+    if not replica_uris:
+        return None
+    key = (primary_uri, tuple(replica_uris))
+    with _routers_lock:
+        router = _routers.get(key)
+        if router is None:
+            router = ReplicaRouter(replica_uris, engine_factory,
+                                   strategy=os.getenv("VIX_REPLICA_STRATEGY", "round_robin").lower(),
+                                   health_interval_s=float(os.getenv("VIX_REPLICA_HEALTH_INTERVAL_S", DEFAULT_HEALTH_INTERVAL_S)),
+                                   max_failures=int(os.getenv("VIX_REPLICA_MAX_FAILURES", DEFAULT_MAX_FAILURES)),
+                                   status_cb=health_log)
+            _routers[key] = router
+            if status_cb: status_cb(f"Replica routing enabled ({router.strategy}) over {len(replica_uris)} replicas.")
+        return router
+
+
+def get_replica_stats() -> List[Dict[str, Any]]:
+    with _routers_lock:
+        return [router.stats() for router in _routers.values()]
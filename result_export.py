@@ -0,0 +1,272 @@
+"""Export en flux des résultats complets d'une requête vers CSV, Parquet ou Arrow IPC."""
+import csv
+import os
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from cancellation import CancellationToken, bind_token
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = {".csv": "csv", ".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def detect_export_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export extension '{extension}' (expected {', '.join(EXPORT_FORMATS)}).")
+    return EXPORT_FORMATS[extension]
+
+
+PREVIEW_ROW_LIMIT = 100  # Limite d'aperçu demandée au générateur SQL (« Utilise LIMIT 100 » dans le prompt)
+
+_LIMIT_PATTERNS = [r"\s+LIMIT\s+(\d+)\s*$", r"\s+FETCH\s+(?:FIRST|NEXT)\s+(\d+)\s+ROWS?\s+ONLY\s*$"]
+_TOP_PATTERN = r"^SELECT\s+TOP\s*\(?\s*(\d+)\s*\)?\s+"
+
+
+def row_limit(query: str, db_type: str) -> Optional[int]:
+    """Limite de lignes finale de la requête (LIMIT, FETCH FIRST, TOP en MSSQL), ou None."""
+    sql = query.strip().rstrip(";").strip()
+    for pattern in _LIMIT_PATTERNS + ([_TOP_PATTERN] if db_type == "mssql" else []):
+        match = re.search(pattern, sql, flags=re.IGNORECASE)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def strip_row_limit(query: str, db_type: str, preview_limit: int = PREVIEW_ROW_LIMIT) -> str:
+    """Retire la limite finale quand c'est la limite d'aperçu ; une limite voulue par la question
+    (« les 5 meilleurs clients ») est gardée et la requête retournée telle quelle."""
+    sql = query.strip().rstrip(";").strip()
+    if row_limit(sql, db_type) != preview_limit:
+        return sql
+    for pattern in _LIMIT_PATTERNS:
+        sql = re.sub(pattern, "", sql, flags=re.IGNORECASE)
+    if db_type == "mssql":
+        sql = re.sub(_TOP_PATTERN, "SELECT ", sql, flags=re.IGNORECASE)
+    return sql
+
+
+def strip_order_by(query: str) -> str:
+    """Retire le ORDER BY final de premier niveau, avant d'emballer la requête dans une sous-requête
+    (MSSQL refuse un ORDER BY sans TOP dans une table dérivée)."""
+    sql = query.strip().rstrip(";").strip()
+    for match in reversed(list(re.finditer(r"\s+ORDER\s+BY\s", sql, flags=re.IGNORECASE))):
+        head, tail = sql[:match.start()], sql[match.end():]
+        if head.count("(") == head.count(")") and tail.count("(") == tail.count(")"):
+            return head
+    return sql
+
+
+class _CsvWriter:
+    def __init__(self, path: str, columns: List[str]):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> None:
+        self.writer.writerows(rows)
+
+    def bytes_written(self) -> int:
+        return self.file.tell()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _SchemaChanged(Exception):
+    """Un lot ne tient plus dans le schéma déjà écrit : l'export repart avec le schéma élargi."""
+
+    def __init__(self, schema: Any, detail: str):
+        super().__init__(detail)
+        self.schema = schema
+
+
+def _promote(current: Any, observed: Any) -> Any:
+    """Type commun aux deux (int -> double, décimales élargies), ou texte s'il n'y en a pas."""
+    try:
+        promoted = pa.unify_schemas([pa.schema([pa.field("v", current)]), pa.schema([pa.field("v", observed)])],
+                                    promote_options="permissive").field("v").type
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return pa.string()
+    return _widen(promoted)
+
+
+def _widen(data_type: Any) -> Any:
+    # Précision maximale d'emblée : une précision qui grandit d'un lot à l'autre ne relance pas l'export
+    if pa.types.is_decimal(data_type) and data_type.precision < 38 and data_type.scale <= 38:
+        return pa.decimal128(38, data_type.scale)
+    return data_type
+
+
+def _as_text(values: Sequence[Any]) -> Any:
+    return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+class _ArrowWriter:
+    """Écrit des lots Arrow ; le schéma est déduit du premier lot (colonnes entièrement NULL en texte),
+    sauf s'il est imposé par une reprise après _SchemaChanged."""
+
+    def __init__(self, path: str, columns: List[str], fmt: str, schema: Any = None):
+        if pa is None:
+            raise ImportError("pyarrow is required for Parquet/Arrow export: pip install pyarrow")
+        self.path, self.columns, self.fmt = path, columns, fmt
+        self.sink = pa.OSFile(path, "wb")
+        self.schema = schema
+        self.writer = None
+
+    def _batch(self, rows: Sequence[Sequence[Any]]):
+        column_values = list(zip(*rows)) if rows else [[] for _ in self.columns]
+        if self.schema is None:
+            arrays = []
+            for values in column_values:
+                try:
+                    array = pa.array(values)
+                except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+                    array = _as_text(values)  # Types mêlés dans la colonne (typage dynamique SQLite)
+                if pa.types.is_null(array.type):
+                    array = _as_text(values)
+                arrays.append(array.cast(_widen(array.type)))
+            self.schema = pa.schema([pa.field(name, array.type) for name, array in zip(self.columns, arrays)])
+            return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        arrays, widened = [], {}
+        for index, (values, field) in enumerate(zip(column_values, self.schema)):
+            if pa.types.is_string(field.type):
+                arrays.append(_as_text(values))
+                continue
+            try:
+                # Inférence puis conversion contrôlée : pa.array(values, type=int64) tronquerait des flottants
+                array = pa.array(values)
+                if not pa.types.is_null(array.type) and array.type != field.type:
+                    promoted = _promote(field.type, array.type)
+                    if promoted != field.type:
+                        widened[index] = promoted
+                        continue
+                arrays.append(array.cast(field.type))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+                widened[index] = pa.string()
+        if widened:
+            schema = self.schema
+            for index, promoted in widened.items():
+                schema = schema.set(index, pa.field(schema[index].name, promoted))
+            raise _SchemaChanged(schema, ", ".join(f"column {self.schema[i].name}: {self.schema[i].type} -> {t}"
+                                                   for i, t in widened.items()))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> None:
+        batch = self._batch(rows)
+        if self.writer is None:
+            if self.fmt == "parquet":
+                self.writer = pq.ParquetWriter(self.sink, self.schema)
+            else:
+                self.writer = pa.ipc.new_file(self.sink, self.schema)
+        if self.fmt == "parquet":
+            self.writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self.writer.write_batch(batch)
+
+    def bytes_written(self) -> int:
+        return self.sink.tell()
+
+    def close(self) -> None:
+        try:
+            if self.writer is None:  # Résultat vide : fichier valide avec le schéma seul
+                self.schema = self.schema or pa.schema([pa.field(name, pa.string()) for name in self.columns])
+                self.writer = pq.ParquetWriter(self.sink, self.schema) if self.fmt == "parquet" else pa.ipc.new_file(self.sink, self.schema)
+            self.writer.close()
+        finally:
+            self.sink.close()
+
+
+def _format_count(value: float) -> str:
+    return f"{value:,.0f}".replace(",", " ")
+
+
+def _format_bytes(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024.0
+
+
+def _export_pass(engine: Engine, query: str, path: str, fmt: str, chunk_size: int, schema: Any,
+                 status_cb: Callable[[str], None], cancel_token: Optional[CancellationToken], started: float) -> int:
+    """Une exécution complète de la requête vers le fichier ; retourne le nombre de lignes écrites."""
+    rows_written, writer = 0, None
+    try:
+        with bind_token(cancel_token), engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(text(query))
+            columns = list(result.keys())
+            writer = _CsvWriter(path, columns) if fmt == "csv" else _ArrowWriter(path, columns, fmt, schema)
+            for chunk in result.partitions(chunk_size):
+                if cancel_token: cancel_token.raise_if_cancelled()
+                writer.write(chunk)
+                rows_written += len(chunk)
+                elapsed = time.perf_counter() - started
+                status_cb(f"Exported {_format_count(rows_written)} rows ({_format_count(rows_written / elapsed if elapsed else 0)} rows/s, "
+                          f"{_format_bytes(writer.bytes_written())}).")
+            writer.close()
+            writer = None
+    finally:
+        if writer is not None:
+            try: writer.close()
+            except Exception: pass
+    return rows_written
+
+
+def export_query_results(engine: Engine, query: str, path: str, fmt: Optional[str] = None,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE, status_cb: Optional[Callable[[str], None]] = None,
+                         cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+    """Exécute la requête avec un curseur côté serveur et écrit les lignes par blocs.
+
+    La mémoire reste bornée par chunk_size quel que soit le volume. En Parquet/Arrow, un bloc dont
+    les valeurs ne tiennent plus dans le schéma du fichier (typage dynamique SQLite, entiers puis
+    flottants, décimales plus précises) relance l'export avec le type élargi, ou en texte. Retourne
+    les statistiques finales : lignes, octets écrits, durée et débit.
+    """
+    status_cb = status_cb or (lambda msg: None)
+    fmt = fmt or detect_export_format(path)
+    if fmt not in ("csv", "parquet", "arrow"):
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    started = time.perf_counter()
+    schema, restarts = None, 0
+    try:
+        while True:
+            try:
+                rows_written = _export_pass(engine, query, path, fmt, chunk_size, schema, status_cb, cancel_token, started)
+                break
+            except _SchemaChanged as change:
+                # Le fichier déjà écrit garde l'ancien schéma : l'export repart avec le schéma élargi. Chaque
+                # reprise élargit une colonne (au pire jusqu'au texte), le nombre de reprises est donc borné
+                restarts += 1
+                if restarts > 3 * len(change.schema):
+                    raise ValueError("Export aborted: the result column types kept changing.") from change
+                schema = change.schema
+                status_cb(f"Export schema widened ({change}); restarting the export.")
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)  # Pas de fichier partiel laissé derrière un échec ou une annulation
+        raise
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "path": path,
+        "format": fmt,
+        "rows": rows_written,
+        "bytes": os.path.getsize(path),
+        "seconds": elapsed,
+        "rows_per_second": rows_written / elapsed if elapsed else 0.0,
+    }
+    status_cb(f"Export finished: {_format_count(rows_written)} rows, {_format_bytes(stats['bytes'])} in {elapsed:.1f}s -> {path}")
+    return stats
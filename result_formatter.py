@@ -0,0 +1,219 @@
+"""Formatage colonnaire des résultats : type et rendu décidés une fois par colonne, largeurs alignées."""
+import datetime
+import decimal
+import html
+from typing import Any, Callable, List, Optional, Sequence
+
+NULL_DISPLAY = "NULL"
+OUTPUT_STYLES = ("markdown", "text", "html")
+_MOJIBAKE_MARKERS = ("Ã", "Â", "â€")
+
+
+def repair_mojibake(value: str) -> str:
+    """Répare un texte UTF-8 décodé à tort en Latin-1/CP1252 (ex. 'Ã©' -> 'é')."""
+    for encoding in ("cp1252", "latin-1"):
+        try:
+            return value.encode(encoding).decode("utf-8")
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            continue
+    return value
+
+
+def _group_thousands(value) -> str:
+    return f"{value:,}".replace(",", " ")
+
+
+class ColumnFormat:
+    """Type, convertisseur et alignement d'une colonne, décidés à partir de ses valeurs.
+
+    render ne reçoit jamais None : les NULL sont traités à part, une fois par colonne.
+    """
+
+    def __init__(self, name: str, kind: str, render: Callable[[Any], str], has_null: bool):
+        self.name = name
+        self.kind = kind
+        self.render = render
+        self.has_null = has_null
+        self.align_right = kind == "number"
+
+
+_KIND_BY_TYPE = {
+    type(None): None, bool: "bool", int: "number", float: "number", decimal.Decimal: "number",
+    str: "text", bytes: "bytes", bytearray: "bytes", memoryview: "bytes",
+    datetime.date: "datetime", datetime.datetime: "datetime", datetime.time: "datetime",
+}
+_CELL_SEPARATOR = "\x1f"
+
+
+def _kind_of_type(value_type: type) -> Optional[str]:
+    if value_type in _KIND_BY_TYPE:
+        return _KIND_BY_TYPE[value_type]
+    for base_type, kind in _KIND_BY_TYPE.items():  # Sous-classes (ex. types des drivers)
+        if base_type is not type(None) and issubclass(value_type, base_type):
+            return kind
+    return "other"
+
+
+def _detect_kind(values: Sequence[Any]) -> str:
+    kinds = {_kind_of_type(value_type) for value_type in set(map(type, values))}
+    kinds.discard(None)
+    if len(kinds) > 1: return "mixed"
+    return kinds.pop() if kinds else "null"
+
+
+def _render_mixed(value: Any) -> str:
+    if isinstance(value, (int, float, decimal.Decimal)) and not isinstance(value, bool):
+        return _group_thousands(value)
+    return str(value)
+
+
+def _make_renderer(kind: str, values: Sequence[Any]) -> Optional[Callable[[Any], str]]:
+    """Retourne le convertisseur de la colonne, ou None si les valeurs sont déjà du texte final."""
+    if kind == "number":
+        return "{:,}".format  # Séparateur de milliers remplacé en une passe sur toute la colonne
+    if kind == "text":
+        return None
+    if kind == "bytes":
+        return lambda v: f"<{len(v)} bytes>"
+    if kind == "mixed":
+        return _render_mixed
+    return str  # str() d'une date/heure est déjà au format ISO
+
+
+def build_column_formats(columns: Sequence[str], column_values: Sequence[Sequence[Any]]) -> List[ColumnFormat]:
+    formats = []
+    for name, values in zip(columns, column_values):
+        kind = _detect_kind(values)
+        formats.append(ColumnFormat(str(name), kind, _make_renderer(kind, values), None in values))
+    return formats
+
+
+def _repair_column(cells: List[str]) -> List[str]:
+    joined = _CELL_SEPARATOR.join(cells)
+    if not any(marker in joined for marker in _MOJIBAKE_MARKERS):
+        return cells
+    repaired = repair_mojibake(joined)
+    if repaired is not joined and repaired.count(_CELL_SEPARATOR) == len(cells) - 1:
+        return repaired.split(_CELL_SEPARATOR)
+    return [repair_mojibake(c) for c in cells]  # Colonne partiellement corrompue : cellule par cellule
+
+
+def _render_column(fmt: ColumnFormat, values: Sequence[Any], style: str) -> List[str]:
+    render = fmt.render
+    if render is None:
+        cells = [NULL_DISPLAY if v is None else v for v in values] if fmt.has_null else list(values)
+    elif fmt.has_null:
+        cells = [NULL_DISPLAY if v is None else render(v) for v in values]
+    else:
+        cells = list(map(render, values))
+    if fmt.kind == "number":
+        return _CELL_SEPARATOR.join(cells).replace(",", " ").split(_CELL_SEPARATOR) if cells else cells
+    if fmt.kind == "text":
+        cells = _repair_column(cells)
+    if style == "html":
+        return [html.escape(c) for c in cells]
+    joined = _CELL_SEPARATOR.join(cells)
+    if "\n" in joined or (style == "markdown" and "|" in joined):
+        cells = [_escape_cell(c, style) for c in cells]
+    return cells
+
+
+def _escape_cell(value: str, style: str) -> str:
+    if style == "markdown":
+        return value.replace("|", "\\|").replace("\n", " ")
+    if style == "text":
+        return value.replace("\n", " ")
+    return html.escape(value)
+
+
+def format_rows(columns: Sequence[str], rows: Sequence[Sequence[Any]], style: str = "markdown",
+                max_cell_width: Optional[int] = None) -> str:
+    """Formate des lignes (séquences de valeurs) en tableau markdown, texte brut ou HTML.
+
+    Le type de chaque colonne est détecté une seule fois, puis toute la colonne est convertie
+    d'un bloc ; les largeurs sont calculées par colonne pour aligner les cellules.
+    """
+    if style not in OUTPUT_STYLES:
+        raise ValueError(f"Unknown output style: {style} (expected one of {', '.join(OUTPUT_STYLES)})")
+    column_values = list(zip(*rows)) if rows else [() for _ in columns]
+    formats = build_column_formats(columns, column_values)
+
+    rendered_columns = [_render_column(fmt, values, style) for fmt, values in zip(formats, column_values)]
+    if max_cell_width:
+        rendered_columns = [[c if len(c) <= max_cell_width else c[:max_cell_width - 1] + "…" for c in cells]
+                            for cells in rendered_columns]
+    headers = [_escape_cell(fmt.name, style) for fmt in formats]
+    row_cells = list(zip(*rendered_columns))
+
+    if style == "html":
+        head = "".join(f"<th>{h}</th>" for h in headers)
+        row_template = "<tr>" + "".join('<td style="text-align:right">{}</td>' if fmt.align_right else "<td>{}</td>"
+                                         for fmt in formats) + "</tr>"
+        body = "\n".join(row_template.format(*cells) for cells in row_cells)
+        return f"<table>\n<thead><tr>{head}</tr></thead>\n<tbody>\n{body}\n</tbody>\n</table>"
+
+    widths = [max(len(h), 3, max(map(len, cells), default=0)) for h, cells in zip(headers, rendered_columns)]
+    cell_specs = [f"{{:{'>' if fmt.align_right else '<'}{w}}}" for fmt, w in zip(formats, widths)]
+    header_specs = [f"{{:<{w}}}" for w in widths]
+
+    if style == "markdown":
+        row_template = "| " + " | ".join(cell_specs) + " |"
+        header = ("| " + " | ".join(header_specs) + " |").format(*headers)
+        separator = "| " + " | ".join(("-" * (w - 1) + ":") if fmt.align_right else "-" * w
+                                      for fmt, w in zip(formats, widths)) + " |"
+        lines = [row_template.format(*cells) for cells in row_cells]
+    else:
+        row_template = "  ".join(cell_specs)
+        header = "  ".join(header_specs).format(*headers).rstrip()
+        separator = "  ".join("-" * w for w in widths)
+        lines = [row_template.format(*cells).rstrip() for cells in row_cells]
+    return "\n".join([header, separator] + lines)
+
+
+if __name__ == "__main__":
+    # Benchmark : ancienne boucle cellule par cellule vs formatage colonnaire
+    import sys
+    import time
+
+    def _legacy_format(columns, rows):
+        # Ancien format_query_result : conversion en dictionnaires puis boucle par cellule
+        result = [dict(zip(columns, row)) for row in rows]
+        columns = list(result[0].keys())
+        header = "| " + " | ".join(str(col) for col in columns) + " |"
+        separator = "| " + " | ".join("-" * max(len(str(col)), 3) for col in columns) + " |"
+        rows = []
+        for row in result:
+            row_values = []
+            for col in columns:
+                val = row.get(col, '')
+                if val is None:
+                    val = 'NULL'
+                elif isinstance(val, (int, float)):
+                    val = f"{val:,}".replace(',', ' ')
+                val = str(val).replace('Ã©', 'é').replace('Ã¨', 'è').replace('Ã´', 'ô').replace('Ã', 'É')
+                row_values.append(str(val))
+            rows.append("| " + " | ".join(row_values) + " |")
+        return "\n".join([header, separator] + rows)
+
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    bench_columns = ["id", "client", "ville", "montant", "quantite", "date_commande", "remise"]
+    bench_rows = [(i, f"Client {i}", ["Lyon", "Paris", "Orléans", "Nîmes"][i % 4], i * 13.37, i % 97,
+                   datetime.date(2023, 1 + i % 12, 1 + i % 28), None if i % 5 else 0.1)
+                  for i in range(row_count)]
+
+    def _timed(label, fn, repeat=3):
+        best = min(_run_once(fn) for _ in range(repeat))
+        print(f"{label:<28} {best * 1000:>9.1f} ms  ({row_count / best:,.0f} rows/s)".replace(",", " "))
+        return best
+
+    def _run_once(fn):
+        started = time.perf_counter()
+        fn()
+        return time.perf_counter() - started
+
+    print(f"Formatting {row_count} rows x {len(bench_columns)} columns")
+    legacy = _timed("legacy per-cell markdown", lambda: _legacy_format(bench_columns, bench_rows))
+    columnar = _timed("columnar markdown", lambda: format_rows(bench_columns, bench_rows, "markdown"))
+    _timed("columnar text", lambda: format_rows(bench_columns, bench_rows, "text"))
+    _timed("columnar html", lambda: format_rows(bench_columns, bench_rows, "html"))
+    print(f"Speed-up (markdown): x{legacy / columnar:.2f}")
@@ -0,0 +1,228 @@
+"""Pagination des grands résultats : curseur côté serveur gardé ouvert entre les pages, expiré après inactivité.
+
+Un handle est enregistré pour chaque requête exécutée (sans sa limite d'aperçu) ; le curseur n'est
+ouvert qu'à la première page demandée. Les pages suivantes sont lues sur ce curseur, sans relancer
+le LLM ni la requête ; les dernières pages lues restent en mémoire pour revenir en arrière.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from cancellation import CancellationToken, QuestionCancelled, bind_token, current_token, interruptible_fetch
+from query_guard import rearm_statement_deadline
+
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_IDLE_TTL_S = 600.0
+DEFAULT_MAX_OPEN_CURSORS = 4   # Connexions retenues par les curseurs ouverts, prises sur le pool de l'engine
+DEFAULT_CACHED_PAGES = 10      # Pages gardées par handle
+
+
+class _PagedResult:
+    def __init__(self, handle: str, engine: Engine, sql: str, page_size: int):
+        self.handle = handle
+        self.engine = engine
+        self.sql = sql
+        self.page_size = page_size
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.columns: Optional[List[str]] = None
+        self.total_rows: Optional[int] = None  # Connu une fois le curseur épuisé
+        self.reopened = 0
+        self.pages: "OrderedDict[int, List[tuple]]" = OrderedDict()
+        self._conn = None
+        self._result = None
+        self._position = 0  # Lignes déjà lues sur le curseur
+        self._lookahead: List[tuple] = []
+
+    @property
+    def cursor_open(self) -> bool:
+        return self._conn is not None
+
+    def _open(self) -> None:
+        self._conn = self.engine.connect()
+        try:
+            self._result = self._conn.execution_options(stream_results=True, yield_per=self.page_size).execute(text(self.sql))
+        except Exception:
+            self.close_cursor()
+            raise
+        self.columns = list(self._result.keys())
+        self._position, self._lookahead = 0, []
+
+    def close_cursor(self) -> None:
+        result, conn, self._result, self._conn = self._result, self._conn, None, None
+        for resource in (result, conn):
+            if resource is not None:
+                try: resource.close()
+                except Exception: pass  # Connexion déjà interrompue : le pool la remplacera
+
+    def _take(self, count: int) -> List[tuple]:
+        rows, self._lookahead = self._lookahead[:count], self._lookahead[count:]
+        if len(rows) < count and self._result is not None:
+            rearm_statement_deadline(self._conn)
+            token = current_token()
+            try:
+                with interruptible_fetch(self._conn, self._result.cursor, token):
+                    rows += [tuple(row) for row in self._result.fetchmany(count - len(rows))]
+            except Exception:
+                self.close_cursor()  # Curseur interrompu ou en erreur : la page suivante relira la requête
+                if token is not None and token.is_cancelled:
+                    raise QuestionCancelled("Page fetch cancelled by user.")
+                raise
+        self._position += len(rows)
+        return rows
+
+    def read_page(self, page: int, max_cached: int) -> Dict[str, Any]:
+        """Page demandée (0 = premières lignes) ; appelé sous self.lock."""
+        self.last_used = time.monotonic()
+        source = "cache"
+        if page in self.pages:
+            self.pages.move_to_end(page)
+            rows = self.pages[page]
+        else:
+            source = "cursor"
+            start = page * self.page_size
+            if self.total_rows is not None and start >= self.total_rows and page > 0:
+                raise ValueError(f"Page {page + 1} is past the end of the result ({self.total_rows} rows).")
+            if self._conn is None or start < self._position:
+                # Curseur fermé (limite de curseurs ouverts) ou page antérieure sortie du cache : relecture
+                if self.columns is not None:
+                    self.reopened += 1
+                    source = "reopened"
+                self.close_cursor()
+                self._open()
+            while self._position < start:
+                if not self._take(min(self.page_size, start - self._position)):
+                    break
+            rows = self._take(self.page_size) if self._position == start else []
+            if self._result is not None:
+                self._lookahead = self._take(1)  # Une ligne d'avance pour savoir s'il reste une page
+                self._position -= len(self._lookahead)
+                if not self._lookahead:
+                    self.total_rows = self._position
+                    self.close_cursor()
+            if not rows and page > 0:
+                raise ValueError(f"Page {page + 1} is past the end of the result ({self.total_rows} rows).")
+            self.pages[page] = rows
+            while len(self.pages) > max_cached:
+                self.pages.popitem(last=False)
+        first_row = page * self.page_size
+        has_next = (self.total_rows is None or first_row + len(rows) < self.total_rows) and len(rows) == self.page_size
+        return {"handle": self.handle, "page": page, "page_size": self.page_size, "columns": self.columns,
+                "rows": rows, "first_row": first_row + 1, "last_row": first_row + len(rows),
+                "has_next": has_next, "has_previous": page > 0, "total_rows": self.total_rows, "source": source}
+
+
+class ResultPages:
+    """Registre des handles de pagination du processus.
+
+    Un handle inactif depuis idle_ttl_s expire (curseur fermé, pages oubliées) ; au plus
+    max_open curseurs restent ouverts, les moins récemment lus sont fermés puis relus au besoin.
+    """
+
+    def __init__(self, idle_ttl_s: float = DEFAULT_IDLE_TTL_S, max_open: int = DEFAULT_MAX_OPEN_CURSORS,
+                 max_cached_pages: int = DEFAULT_CACHED_PAGES):
+        self.idle_ttl_s = idle_ttl_s
+        self.max_open = max_open
+        self.max_cached_pages = max_cached_pages
+        self._lock = threading.Lock()
+        self._handles: "OrderedDict[str, _PagedResult]" = OrderedDict()
+        self._counts = {"registered": 0, "pages": 0, "cache_hits": 0, "reopened": 0, "expired": 0}
+        self._stop = threading.Event()
+        threading.Thread(target=self._reap_loop, name="vix-result-pages", daemon=True).start()
+
+    def register(self, engine: Engine, sql: str, page_size: int = DEFAULT_PAGE_SIZE) -> str:
+        """Enregistre une requête validée (sans limite d'aperçu) ; retourne son handle. Aucun curseur n'est ouvert."""
+        handle = uuid.uuid4().hex[:16]
+        with self._lock:
+            self._handles[handle] = _PagedResult(handle, engine, sql, page_size)
+            self._counts["registered"] += 1
+        return handle
+
+    def fetch_page(self, handle: str, page: int, cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+        """Lignes de la page (0 = premières lignes), avec has_next, total_rows (si connu) et source."""
+        if page < 0:
+            raise ValueError(f"Invalid page number: {page}")
+        with self._lock:
+            paged = self._handles.get(handle)
+            if paged is None:
+                raise ValueError("Unknown or expired result handle: ask the question again to page through its result.")
+            self._handles.move_to_end(handle)
+        with paged.lock, bind_token(cancel_token):
+            page_data = paged.read_page(page, self.max_cached_pages)
+        with self._lock:
+            self._counts["pages"] += 1
+            self._counts["cache_hits"] += page_data["source"] == "cache"
+            self._counts["reopened"] += page_data["source"] == "reopened"
+        self._limit_open_cursors(keep=handle)
+        return page_data
+
+    def _limit_open_cursors(self, keep: str) -> None:
+        with self._lock:
+            open_handles = [p for h, p in self._handles.items() if p.cursor_open and h != keep]
+        for paged in open_handles[:max(0, len(open_handles) - (self.max_open - 1))]:
+            if paged.lock.acquire(blocking=False):  # Une page en cours de lecture n'est pas interrompue
+                try: paged.close_cursor()
+                finally: paged.lock.release()
+
+    def close(self, handle: str) -> None:
+        with self._lock:
+            paged = self._handles.pop(handle, None)
+        if paged is not None:
+            with paged.lock:
+                paged.close_cursor()
+
+    def _reap_loop(self) -> None:
+        while not self._stop.wait(max(1.0, min(30.0, self.idle_ttl_s / 4))):
+            self.expire_idle()
+
+    def expire_idle(self) -> int:
+        """Ferme les handles inactifs depuis idle_ttl_s ; retourne leur nombre."""
+        deadline = time.monotonic() - self.idle_ttl_s
+        with self._lock:
+            expired = [h for h, p in self._handles.items() if p.last_used < deadline]
+            for handle in expired:
+                paged = self._handles.pop(handle)
+                if paged.lock.acquire(blocking=False):
+                    try: paged.close_cursor()
+                    finally: paged.lock.release()
+                else:
+                    self._handles[handle] = paged  # Lecture en cours : expirera au prochain passage
+            self._counts["expired"] += sum(1 for h in expired if h not in self._handles)
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._counts, "handles": len(self._handles),
+                    "open_cursors": sum(1 for p in self._handles.values() if p.cursor_open)}
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        with self._lock:
+            handles = list(self._handles)
+        for handle in handles:
+            self.close(handle)
+
+
+_pages: Optional[ResultPages] = None
+_pages_lock = threading.Lock()
+
+
+def get_result_pages() -> ResultPages:
+    """Registre partagé du processus (VIX_RESULT_PAGE_TTL_S, VIX_RESULT_PAGES_MAX_OPEN)."""
+    global _pages
+    with _pages_lock:
+        if _pages is None:
+            _pages = ResultPages(idle_ttl_s=float(os.getenv("VIX_RESULT_PAGE_TTL_S", DEFAULT_IDLE_TTL_S)),
+                                 max_open=int(os.getenv("VIX_RESULT_PAGES_MAX_OPEN", DEFAULT_MAX_OPEN_CURSORS)))
+        return _pages
+
+
+def fetch_page(handle: str, page: int, cancel_token: Optional[CancellationToken] = None) -> Dict[str, Any]:
+    """Page d'un résultat enregistré (voir ResultPages.fetch_page)."""
+    return get_result_pages().fetch_page(handle, page, cancel_token)
@@ -0,0 +1,314 @@
+"""Questions enregistrées avec leur SQL validé : rafraîchissement planifié en arrière-plan et instantanés servis tels quels."""
+import datetime
+import decimal
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from result_export import strip_row_limit, strip_order_by, row_limit
+from value_index import normalize_text
+
+DEFAULT_SAVED_PATH = "vix_saved.db"
+DEFAULT_REFRESH_INTERVAL_S = 3600
+DEFAULT_POLL_S = 30.0
+DEFAULT_MAX_SNAPSHOT_ROWS = 50000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS saved_questions (
+    id INTEGER PRIMARY KEY, db_key TEXT NOT NULL, db_type TEXT NOT NULL, question TEXT NOT NULL,
+    question_norm TEXT NOT NULL, sql TEXT NOT NULL, interval_s REAL NOT NULL, timestamp_column TEXT,
+    created_at REAL NOT NULL, last_attempt_at REAL, last_error TEXT, UNIQUE (db_key, question_norm));
+CREATE TABLE IF NOT EXISTS snapshots (
+    saved_id INTEGER PRIMARY KEY REFERENCES saved_questions(id) ON DELETE CASCADE,
+    columns TEXT NOT NULL, rows TEXT NOT NULL, row_count INTEGER NOT NULL, refreshed_at REAL NOT NULL,
+    watermark TEXT, duration_s REAL NOT NULL);
+"""
+
+
+def _connect(store_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(store_path)
+    conn.executescript(_SCHEMA)
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+def _json_value(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode_watermark(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return json.dumps({"type": "datetime", "value": value.isoformat()})
+    if isinstance(value, datetime.date):
+        return json.dumps({"type": "date", "value": value.isoformat()})
+    return json.dumps({"type": "value", "value": _json_value(value)})
+
+
+def _decode_watermark(raw: Optional[str]) -> Any:
+    if not raw:
+        return None
+    item = json.loads(raw)
+    if item["type"] == "datetime":
+        return datetime.datetime.fromisoformat(item["value"])
+    if item["type"] == "date":
+        return datetime.date.fromisoformat(item["value"])
+    return item["value"]
+
+
+def format_age(seconds: float) -> str:
+    """Âge lisible d'un instantané : « 42 s », « 5 min », « 3 h 10 min », « 2 j »."""
+    seconds = max(0, int(seconds))
+    if seconds < 60:
+        return f"{seconds} s"
+    if seconds < 3600:
+        return f"{seconds // 60} min"
+    if seconds < 86400:
+        return f"{seconds // 3600} h {seconds % 3600 // 60:02d} min"
+    return f"{seconds // 86400} j"
+
+
+def save_question(question: str, sql: str, db_key: str, db_type: str,
+                  interval_s: float = DEFAULT_REFRESH_INTERVAL_S, timestamp_column: Optional[str] = None,
+                  store_path: str = DEFAULT_SAVED_PATH) -> int:
+    """Enregistre (ou met à jour) une question et son SQL validé ; retourne son identifiant.
+
+    timestamp_column, une colonne du résultat, active le rafraîchissement incrémental : seules les
+    lignes plus récentes que la dernière valeur vue sont relues et ajoutées. Réservé aux résultats
+    ligne à ligne en ajout seul (journal, commandes) ; un agrégat doit être relu entièrement, de même
+    qu'une requête limitée par la question (« les 10 dernières commandes »).
+    """
+    if timestamp_column and not re.fullmatch(r"\w+", timestamp_column):
+        raise ValueError(f"Invalid timestamp column name: {timestamp_column}")
+    if interval_s <= 0:
+        raise ValueError("Refresh interval must be positive.")
+    conn = _connect(store_path)
+    try:
+        conn.execute(
+            "INSERT INTO saved_questions (db_key, db_type, question, question_norm, sql, interval_s, timestamp_column, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (db_key, question_norm) DO UPDATE SET "
+            "sql = excluded.sql, db_type = excluded.db_type, interval_s = excluded.interval_s, "
+            "timestamp_column = excluded.timestamp_column, last_attempt_at = NULL, last_error = NULL",
+            (db_key, db_type, question.strip(), normalize_text(question), sql.strip().rstrip(";"), interval_s,
+             timestamp_column or None, time.time()))
+        saved_id = conn.execute("SELECT id FROM saved_questions WHERE db_key = ? AND question_norm = ?",
+                                (db_key, normalize_text(question))).fetchone()[0]
+        # Le SQL a pu changer : l'ancien instantané n'est plus valable
+        conn.execute("DELETE FROM snapshots WHERE saved_id = ?", (saved_id,))
+        conn.commit()
+        return saved_id
+    finally:
+        conn.close()
+
+
+def delete_saved_question(saved_id: int, store_path: str = DEFAULT_SAVED_PATH) -> bool:
+    conn = _connect(store_path)
+    try:
+        deleted = conn.execute("DELETE FROM saved_questions WHERE id = ?", (saved_id,)).rowcount > 0
+        conn.commit()
+        return deleted
+    finally:
+        conn.close()
+
+
+def list_saved_questions(db_key: str, store_path: str = DEFAULT_SAVED_PATH) -> List[Dict[str, Any]]:
+    """Questions enregistrées de la base, avec l'état de leur dernier instantané."""
+    conn = _connect(store_path)
+    try:
+        rows = conn.execute(
+            "SELECT q.id, q.question, q.sql, q.interval_s, q.timestamp_column, s.row_count, s.refreshed_at, q.last_error "
+            "FROM saved_questions q LEFT JOIN snapshots s ON s.saved_id = q.id WHERE q.db_key = ? ORDER BY q.question",
+            (db_key,)).fetchall()
+    finally:
+        conn.close()
+    now = time.time()
+    return [{"id": r[0], "question": r[1], "sql": r[2], "interval_s": r[3], "timestamp_column": r[4],
+             "row_count": r[5], "refreshed_at": r[6], "age_s": now - r[6] if r[6] else None, "last_error": r[7]}
+            for r in rows]
+
+
+def find_snapshot(question: str, db_key: str, store_path: str = DEFAULT_SAVED_PATH) -> Optional[Dict[str, Any]]:
+    """Dernier instantané de la question enregistrée identique (texte normalisé), ou None."""
+    conn = _connect(store_path)
+    try:
+        row = conn.execute(
+            "SELECT q.id, q.question, q.sql, s.columns, s.rows, s.refreshed_at FROM saved_questions q "
+            "JOIN snapshots s ON s.saved_id = q.id WHERE q.db_key = ? AND q.question_norm = ?",
+            (db_key, normalize_text(question))).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return {"id": row[0], "question": row[1], "sql": row[2], "columns": json.loads(row[3]),
+            "rows": [tuple(r) for r in json.loads(row[4])], "refreshed_at": row[5], "age_s": time.time() - row[5]}
+
+
+def _run(engine: Engine, sql: str, params: Optional[Dict[str, Any]] = None) -> Tuple[List[str], List[tuple]]:
+    with engine.connect() as conn:
+        result = conn.execute(text(sql), params or {})
+        return list(result.keys()), [tuple(row) for row in result]
+
+
+def refresh_saved_question(engine: Engine, saved_id: int, store_path: str = DEFAULT_SAVED_PATH,
+                           max_rows: int = DEFAULT_MAX_SNAPSHOT_ROWS) -> Dict[str, Any]:
+    """Relit une question enregistrée et remplace (ou complète, en incrémental) son instantané."""
+    conn = _connect(store_path)
+    try:
+        saved = conn.execute("SELECT sql, db_type, timestamp_column FROM saved_questions WHERE id = ?",
+                             (saved_id,)).fetchone()
+        if saved is None:
+            raise ValueError(f"Saved question {saved_id} not found.")
+        sql, db_type, timestamp_column = saved
+        previous = conn.execute("SELECT columns, rows, watermark FROM snapshots WHERE saved_id = ?",
+                                (saved_id,)).fetchone()
+    finally:
+        conn.close()
+
+    started = time.perf_counter()
+    full_sql = strip_row_limit(sql, db_type)  # Sans la limite d'aperçu ; une limite voulue par la question reste
+    # Une requête encore limitée (top N) ne peut pas être complétée ligne à ligne : elle est relue entièrement
+    incremental = bool(timestamp_column and previous and previous[2]) and row_limit(full_sql, db_type) is None
+    try:
+        if incremental:
+            # Sous-requête sans limite ni tri : seules les lignes postérieures au dernier repère
+            columns, new_rows = _run(engine, f"SELECT * FROM ({strip_order_by(full_sql)}) vix_src "
+                                             f"WHERE vix_src.{timestamp_column} > :watermark",
+                                     {"watermark": _decode_watermark(previous[2])})
+            rows = [tuple(r) for r in json.loads(previous[1])] + [tuple(map(_json_value, r)) for r in new_rows]
+        else:
+            columns, new_rows = _run(engine, full_sql if timestamp_column else sql)
+            rows = [tuple(map(_json_value, r)) for r in new_rows]
+        watermark = previous[2] if incremental else None
+        if timestamp_column:
+            if timestamp_column not in columns:
+                raise ValueError(f"Timestamp column '{timestamp_column}' is not in the result.")
+            position = columns.index(timestamp_column)
+            values = [r[position] for r in new_rows if r[position] is not None]
+            if values:
+                watermark = _encode_watermark(max(values))
+        rows = rows[-max_rows:]
+        error = None
+    except Exception as e:
+        columns, rows, new_rows, watermark, error = [], [], [], None, str(e)[:300]
+    duration = time.perf_counter() - started
+
+    conn = _connect(store_path)
+    try:
+        # En cas d'échec, le dernier instantané valide reste servi ; l'erreur est consignée sur la question
+        conn.execute("UPDATE saved_questions SET last_attempt_at = ?, last_error = ? WHERE id = ?",
+                     (time.time(), error, saved_id))
+        if error is None:
+            conn.execute("INSERT OR REPLACE INTO snapshots (saved_id, columns, rows, row_count, refreshed_at, watermark, "
+                         "duration_s) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (saved_id, json.dumps(columns), json.dumps(rows, default=str), len(rows), time.time(),
+                          watermark, duration))
+        conn.commit()
+    finally:
+        conn.close()
+    return {"id": saved_id, "rows": len(rows), "new_rows": len(new_rows), "incremental": incremental,
+            "duration_s": duration, "error": error}
+
+
+def due_saved_questions(db_key: str, store_path: str = DEFAULT_SAVED_PATH, now: Optional[float] = None) -> List[int]:
+    """Questions jamais rafraîchies ou dont la dernière tentative date de plus que leur intervalle."""
+    conn = _connect(store_path)
+    try:
+        rows = conn.execute(
+            "SELECT id FROM saved_questions WHERE db_key = ? AND COALESCE(last_attempt_at, 0) + interval_s <= ? "
+            "ORDER BY COALESCE(last_attempt_at, 0)",
+            (db_key, now if now is not None else time.time())).fetchall()
+    finally:
+        conn.close()
+    return [r[0] for r in rows]
+
+
+class SnapshotScheduler:
+    """Thread de fond qui rafraîchit les questions enregistrées arrivées à échéance.
+
+    Les questions d'une même base passent l'une après l'autre, sur l'engine fourni (avec ses
+    timeouts d'instruction) ; validate, s'il est fourni, revérifie chaque SQL avant exécution.
+    """
+
+    def __init__(self, engine: Engine, db_key: str, store_path: str = DEFAULT_SAVED_PATH,
+                 poll_s: float = DEFAULT_POLL_S, validate: Optional[Callable[[str], Any]] = None,
+                 status_cb: Optional[Callable[[str], None]] = None):
+        self.engine = engine
+        self.db_key = db_key
+        self.store_path = store_path
+        self.poll_s = poll_s
+        self._validate = validate
+        self._log = status_cb or (lambda msg: None)
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SnapshotScheduler":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="vix-snapshot-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self) -> None:
+        """Déclenche un passage immédiat (ex. juste après l'enregistrement d'une question)."""
+        self._wake.set()
+
+    def refresh_due(self) -> List[Dict[str, Any]]:
+        reports = []
+        for saved_id in due_saved_questions(self.db_key, self.store_path):
+            if self._stop.is_set():
+                break
+            if self._validate is not None:
+                try:
+                    self._validate(self._saved_sql(saved_id))
+                except Exception as e:
+                    self._log(f"Saved question {saved_id} skipped: {str(e)[:150]}")
+                    continue
+            report = refresh_saved_question(self.engine, saved_id, self.store_path)
+            if report["error"]:
+                self._log(f"Saved question {saved_id} refresh failed: {report['error'][:150]}")
+            else:
+                mode = "incremental" if report["incremental"] else "full"
+                self._log(f"Saved question {saved_id} refreshed ({mode}, {report['new_rows']} new rows, "
+                          f"{report['rows']} total) in {report['duration_s']:.2f}s.")
+            reports.append(report)
+        return reports
+
+    def _saved_sql(self, saved_id: int) -> str:
+        conn = _connect(self.store_path)
+        try:
+            return conn.execute("SELECT sql FROM saved_questions WHERE id = ?", (saved_id,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh_due()
+            except Exception as e:
+                self._log(f"Snapshot scheduler error: {str(e)[:150]}")
+            self._wake.wait(self.poll_s)
+            self._wake.clear()
+
+
+def snapshot_answer(snapshot: Dict[str, Any], formatted_result: str) -> str:
+    """Réponse servie depuis un instantané, sans appel LLM, avec son âge."""
+    refreshed = datetime.datetime.fromtimestamp(snapshot["refreshed_at"]).strftime("%Y-%m-%d %H:%M")
+    return (f"Résultat enregistré pour « {snapshot['question']} » (actualisé il y a {format_age(snapshot['age_s'])}, "
+            f"le {refreshed}) :\n\n{formatted_result}")
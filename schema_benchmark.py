@@ -0,0 +1,117 @@
+"""Banc d'essai des formats de schéma du prompt SQL : tokens, temps de rendu et latence de génération.
+
+Usage : python schema_benchmark.py [--database-url URL] [--questions questions.txt] [--llm] [--repeat 3]
+        [--json rapport.json]
+
+Compare le format actuel (CREATE TABLE + lignes d'exemple, "ddl") au format compact, avec et sans
+valeurs d'exemple. Sans --llm, seuls les tokens et le temps de rendu sont mesurés ; avec --llm, chaque
+question du fichier (une par ligne) est générée --repeat fois par format avec le modèle de l'étape "sql".
+Sans --database-url, la base configurée dans le .env est utilisée.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+
+DEFAULT_QUESTIONS = ["Combien de lignes contient la plus grande table ?"]
+VARIANTS = [("ddl", "ddl", None), ("compact", "compact", None), ("compact sans exemples", "compact", 0)]
+
+
+def render_variants(engine: Any, sample_rows: int, workers: int) -> List[Dict[str, Any]]:
+    """Rend le schéma dans chaque format à partir d'une seule réflexion (clés étrangères comprises)."""
+    from schema_reflection import reflect_schema, render_schema, load_schema_descriptions
+    from prompt_budget import count_tokens
+    report = reflect_schema(engine, max_workers=workers, foreign_keys=True)
+    descriptions = load_schema_descriptions(os.getenv("VIX_SCHEMA_DESCRIPTIONS"))
+    variants = []
+    for label, schema_format, rows in VARIANTS:
+        started = time.perf_counter()
+        schema = render_schema(engine, report, schema_format, sample_rows if rows is None else rows, workers,
+                               descriptions if schema_format == "compact" else None)
+        variants.append({"variant": label, "render_s": time.perf_counter() - started, "chars": len(schema),
+                         "schema_tokens": count_tokens(schema), "schema": schema})
+    return variants
+
+
+def measure_generation(variant: Dict[str, Any], db_type: str, questions: List[str], repeat: int) -> Dict[str, Any]:
+    """Génère le SQL de chaque question avec ce schéma ; latences et tokens facturés par le fournisseur."""
+    from app_refactored import get_sql_prompt_template
+    from model_registry import invoke_stage
+    prompt = get_sql_prompt_template(db_type)
+    usage: List[Dict[str, Any]] = []
+    for _ in range(repeat):
+        for question in questions:
+            invoke_stage("sql", prompt, {"question": question, "schema": variant["schema"], "examples": "", "hints": ""},
+                         usage=usage)
+    latencies = sorted(call["latency_s"] for call in usage)
+    return {"calls": len(usage), "mean_latency_s": statistics.fmean(latencies),
+            "p50_latency_s": latencies[len(latencies) // 2],
+            "mean_prompt_tokens": statistics.fmean(call["prompt_tokens"] for call in usage),
+            "mean_completion_tokens": statistics.fmean(call["completion_tokens"] for call in usage),
+            "estimated_tokens": any(call["estimated"] for call in usage)}
+
+
+def print_results(variants: List[Dict[str, Any]]) -> None:
+    baseline = variants[0]["schema_tokens"] or 1
+    print(f"\n{'format':<22} {'caract.':>9} {'tokens':>8} {'vs ddl':>7} {'rendu':>8} {'prompt':>8} {'lat. moy.':>9} {'p50':>7}")
+    for v in variants:
+        line = (f"{v['variant']:<22} {v['chars']:>9} {v['schema_tokens']:>8} {v['schema_tokens'] / baseline:>6.0%} "
+                f"{v['render_s']:>7.3f}s")
+        generation = v.get("generation")
+        if generation:
+            estimated = "*" if generation["estimated_tokens"] else " "
+            line += (f" {generation['mean_prompt_tokens']:>7.0f}{estimated} {generation['mean_latency_s']:>8.2f}s "
+                     f"{generation['p50_latency_s']:>6.2f}s")
+        print(line)
+    if any((v.get("generation") or {}).get("estimated_tokens") for v in variants):
+        print("* tokens estimés (fournisseur sans métadonnées d'usage)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare les formats de schéma du prompt SQL.")
+    parser.add_argument("--database-url", help="Base à décrire (par défaut : celle du .env)")
+    parser.add_argument("--questions", help="Fichier de questions, une par ligne (génération avec --llm)")
+    parser.add_argument("--llm", action="store_true", help="Mesure aussi la latence de génération SQL par format")
+    parser.add_argument("--repeat", type=int, default=3, help="Générations par question et par format")
+    parser.add_argument("--show", action="store_true", help="Affiche le schéma rendu dans chaque format")
+    parser.add_argument("--json", help="Écrit les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    from app_refactored import resolve_database_uri, create_query_engine
+    from schema_reflection import DEFAULT_REFLECTION_WORKERS, DEFAULT_SAMPLE_ROWS
+    db_uri, db_type = resolve_database_uri(lambda msg: None)
+    engine = create_query_engine(db_uri, db_type, lambda msg: None)
+    try:
+        variants = render_variants(engine, int(os.getenv("VIX_SCHEMA_SAMPLE_ROWS", DEFAULT_SAMPLE_ROWS)),
+                                   int(os.getenv("VIX_REFLECTION_WORKERS", DEFAULT_REFLECTION_WORKERS)))
+        if args.llm:
+            questions = DEFAULT_QUESTIONS
+            if args.questions:
+                with open(args.questions, encoding="utf-8") as f:
+                    questions = [line.strip() for line in f if line.strip()]
+            for variant in variants:
+                print(f"Génération avec le format {variant['variant']} ({len(questions)} questions x {args.repeat})...")
+                variant["generation"] = measure_generation(variant, db_type, questions, args.repeat)
+        if args.show:
+            for variant in variants:
+                print(f"\n--- {variant['variant']} ---\n{variant['schema']}")
+        print_results(variants)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"database": db_uri.split("@")[-1], "db_type": db_type,
+                           "results": [{k: v for k, v in variant.items() if k != "schema"} for variant in variants]},
+                          f, indent=2, ensure_ascii=False)
+            print(f"Résultats écrits dans {args.json}")
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
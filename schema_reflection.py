@@ -0,0 +1,394 @@
+"""Réflexion du schéma en masse via le catalogue (information_schema, ALL_TAB_COLUMNS), parallélisée par schéma,
+et rendu du schéma pour le prompt (compact ou CREATE TABLE)."""
+import fnmatch
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import column as sql_column, inspect, select, table as sql_table, text
+from sqlalchemy.engine import Engine
+
+DEFAULT_REFLECTION_WORKERS = 8
+DEFAULT_SAMPLE_ROWS = 3
+DEFAULT_SCHEMA_CACHE_S = 300.0
+DEFAULT_SCHEMA_FORMAT = "compact"
+SCHEMA_FORMATS = ("compact", "ddl")
+DEFAULT_SAMPLE_CHARS = 24  # Longueur maximale d'une valeur d'exemple au format compact
+_MAX_SAMPLE_VALUE_LENGTH = 100  # Comme SQLDatabase.get_table_info
+_RENDERED_CACHE_SIZE = 16
+
+# Schémas système ignorés sauf inclusion explicite
+_SYSTEM_SCHEMAS = {
+    "postgresql": ["pg_catalog", "information_schema", "pg_toast*", "pg_temp_*"],
+    "mysql": ["information_schema", "mysql", "performance_schema", "sys"],
+    "mariadb": ["information_schema", "mysql", "performance_schema", "sys"],
+    "mssql": ["sys", "information_schema", "guest", "db_*"],
+    "oracle": ["sys", "system", "xdb", "outln", "ctxsys", "mdsys", "ordsys", "ordplugins", "wmsys", "dbsnmp",
+               "appqossys", "audsys", "dvsys", "gsmadmin_internal", "lbacsys", "ojvmsys", "olapsys", "apex_*",
+               "flows_*", "ords_*", "anonymous", "dbsfwuser", "remote_scheduler_agent"],
+}
+
+# Colonnes et clés primaires de tout un schéma en une requête chacune
+_INFORMATION_SCHEMA_COLUMNS = """
+SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, IS_NULLABLE, CHARACTER_MAXIMUM_LENGTH
+FROM INFORMATION_SCHEMA.COLUMNS
+WHERE TABLE_SCHEMA = :schema
+ORDER BY TABLE_NAME, ORDINAL_POSITION"""
+_INFORMATION_SCHEMA_PRIMARY_KEYS = """
+SELECT kcu.TABLE_NAME, kcu.COLUMN_NAME
+FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS tc
+JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE kcu
+  ON kcu.CONSTRAINT_NAME = tc.CONSTRAINT_NAME AND kcu.TABLE_SCHEMA = tc.TABLE_SCHEMA AND kcu.TABLE_NAME = tc.TABLE_NAME
+WHERE tc.CONSTRAINT_TYPE = 'PRIMARY KEY' AND tc.TABLE_SCHEMA = :schema
+ORDER BY kcu.TABLE_NAME, kcu.ORDINAL_POSITION"""
+_ORACLE_COLUMNS = """
+SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, NULLABLE, CHAR_LENGTH
+FROM ALL_TAB_COLUMNS
+WHERE OWNER = :schema AND TABLE_NAME NOT LIKE 'BIN$%'
+ORDER BY TABLE_NAME, COLUMN_ID"""
+_ORACLE_PRIMARY_KEYS = """
+SELECT cc.TABLE_NAME, cc.COLUMN_NAME
+FROM ALL_CONSTRAINTS c
+JOIN ALL_CONS_COLUMNS cc ON cc.OWNER = c.OWNER AND cc.CONSTRAINT_NAME = c.CONSTRAINT_NAME
+WHERE c.CONSTRAINT_TYPE = 'P' AND c.OWNER = :schema
+ORDER BY cc.TABLE_NAME, cc.POSITION"""
+_CATALOG_QUERIES = {
+    "postgresql": (_INFORMATION_SCHEMA_COLUMNS, _INFORMATION_SCHEMA_PRIMARY_KEYS),
+    "mysql": (_INFORMATION_SCHEMA_COLUMNS, _INFORMATION_SCHEMA_PRIMARY_KEYS),
+    "mariadb": (_INFORMATION_SCHEMA_COLUMNS, _INFORMATION_SCHEMA_PRIMARY_KEYS),
+    "mssql": (_INFORMATION_SCHEMA_COLUMNS, _INFORMATION_SCHEMA_PRIMARY_KEYS),
+    "oracle": (_ORACLE_COLUMNS, _ORACLE_PRIMARY_KEYS),
+}
+
+
+def _patterns(raw: Optional[str]) -> List[str]:
+    return [p.strip() for p in (raw or "").split(",") if p.strip()]
+
+
+def _matches(name: str, patterns: List[str]) -> bool:
+    return any(fnmatch.fnmatch(name.lower(), p.lower()) for p in patterns)
+
+
+def select_schemas(engine: Engine, include: Optional[List[str]] = None,
+                   exclude: Optional[List[str]] = None) -> Tuple[List[str], Optional[str]]:
+    """Schémas à refléter et schéma par défaut.
+
+    Sans motif d'inclusion, seul le schéma par défaut est reflété (comme SQLDatabase) ; les
+    motifs (fnmatch, insensibles à la casse) s'appliquent aux noms de schéma, puis l'exclusion
+    et les schémas système du dialecte retirent les schémas correspondants.
+    """
+    inspector = inspect(engine)
+    default_schema = inspector.default_schema_name
+    if not include:
+        return ([default_schema] if default_schema else [None]), default_schema
+    excluded = list(exclude or [])
+    system = _SYSTEM_SCHEMAS.get(engine.dialect.name, [])
+    selected = []
+    for schema in inspector.get_schema_names():
+        if not _matches(schema, include) or _matches(schema, excluded):
+            continue
+        if _matches(schema, system) and not any(p.lower() == schema.lower() for p in include):
+            continue
+        selected.append(schema)
+    return selected, default_schema
+
+
+def _format_type(data_type: str, length: Any) -> str:
+    data_type = str(data_type).upper()
+    if length and ("CHAR" in data_type or "BINARY" in data_type) and "(" not in data_type:
+        return f"{data_type}({'MAX' if int(length) == -1 else int(length)})"
+    return data_type
+
+
+def _reflect_catalog(engine: Engine, schema: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Toutes les tables et vues d'un schéma via deux requêtes sur le catalogue du dialecte."""
+    columns_sql, primary_keys_sql = _CATALOG_QUERIES[engine.dialect.name]
+    catalog_schema = engine.dialect.denormalize_name(schema) if engine.dialect.name == "oracle" else schema
+    normalize = engine.dialect.normalize_name if engine.dialect.name == "oracle" else (lambda name: name)
+    tables: Dict[str, Dict[str, Any]] = {}
+    with engine.connect() as conn:
+        for table_name, column_name, data_type, nullable, length in conn.execute(text(columns_sql), {"schema": catalog_schema}):
+            entry = tables.setdefault(normalize(table_name), {"columns": [], "primary_key": []})
+            entry["columns"].append((normalize(column_name), _format_type(data_type, length),
+                                     str(nullable).upper() in ("YES", "Y")))
+        for table_name, column_name in conn.execute(text(primary_keys_sql), {"schema": catalog_schema}):
+            if normalize(table_name) in tables:
+                tables[normalize(table_name)]["primary_key"].append(normalize(column_name))
+    return tables
+
+
+def _reflect_table(engine: Engine, schema: Optional[str], table_name: str) -> Dict[str, Any]:
+    """Repli par table via l'inspecteur SQLAlchemy (SQLite et dialectes sans catalogue en masse)."""
+    inspector = inspect(engine)
+    columns = []
+    for col in inspector.get_columns(table_name, schema=schema):
+        try:
+            type_name = col["type"].compile(dialect=engine.dialect)
+        except Exception:
+            type_name = ""
+        columns.append((col["name"], type_name, col.get("nullable", True)))
+    primary_key = (inspector.get_pk_constraint(table_name, schema=schema) or {}).get("constrained_columns") or []
+    return {"columns": columns, "primary_key": primary_key}
+
+
+def _reflect_foreign_keys(engine: Engine, schema: Optional[str], default_schema: Optional[str]) -> Dict[str, Dict[str, str]]:
+    """Clés étrangères d'un schéma : {table: {colonne: "table_référencée.colonne"}}, en une passe par schéma."""
+    inspector = inspect(engine)
+    foreign_keys: Dict[str, Dict[str, str]] = {}
+    for (_, table_name), constraints in inspector.get_multi_foreign_keys(schema=schema).items():
+        for fk in constraints:
+            referred = fk["referred_table"]
+            if fk.get("referred_schema") not in (None, schema, default_schema):
+                referred = f"{fk['referred_schema']}.{referred}"
+            for column_name, referred_column in zip(fk["constrained_columns"], fk["referred_columns"]):
+                foreign_keys.setdefault(table_name, {})[column_name] = f"{referred}.{referred_column}"
+    return foreign_keys
+
+
+def reflect_schema(engine: Engine, include: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                   max_workers: int = DEFAULT_REFLECTION_WORKERS,
+                   status_cb: Optional[Callable[[str], None]] = None, foreign_keys: bool = False) -> Dict[str, Any]:
+    """Reflète tables et vues des schémas sélectionnés.
+
+    Une requête de catalogue par schéma quand le dialecte le permet, sinon un appel de
+    l'inspecteur par table ; dans les deux cas le travail est réparti sur un pool de threads.
+    Avec foreign_keys, chaque table reçoit aussi ses clés étrangères ("foreign_keys").
+    Retourne {"tables": [...], "schemas": {schéma: {"tables", "seconds"}}, "method", "total_s"}.
+    """
+    log = status_cb or (lambda msg: None)
+    started = time.perf_counter()
+    schemas, default_schema = select_schemas(engine, include, exclude)
+    bulk = engine.dialect.name in _CATALOG_QUERIES
+    timings: Dict[str, Dict[str, Any]] = {}
+    reflected: List[Dict[str, Any]] = []
+
+    def _qualified(schema: Optional[str], name: str) -> str:
+        return name if schema in (None, default_schema) else f"{schema}.{name}"
+
+    def _schema_task(schema: Optional[str]) -> Tuple[Optional[str], Dict[str, Dict[str, Any]], float]:
+        schema_started = time.perf_counter()
+        return schema, _reflect_catalog(engine, schema), time.perf_counter() - schema_started
+
+    def _table_task(schema: Optional[str], name: str) -> Tuple[Optional[str], str, Dict[str, Any], float]:
+        table_started = time.perf_counter()
+        return schema, name, _reflect_table(engine, schema, name), time.perf_counter() - table_started
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="vix-reflect") as pool:
+        if bulk:
+            per_schema = list(pool.map(_schema_task, schemas))
+        else:
+            inspector = inspect(engine)
+            jobs = [(schema, name) for schema in schemas
+                    for name in inspector.get_table_names(schema=schema) + inspector.get_view_names(schema=schema)
+                    if not (engine.dialect.name == "sqlite" and name.startswith("sqlite_"))]
+            grouped: Dict[Optional[str], Tuple[Dict[str, Dict[str, Any]], List[float]]] = {s: ({}, []) for s in schemas}
+            for schema, name, info, seconds in pool.map(lambda job: _table_task(*job), jobs):
+                grouped[schema][0][name] = info
+                grouped[schema][1].append(seconds)
+            # Temps cumulé des appels par table (le temps écoulé réel est plus court, en parallèle)
+            per_schema = [(schema, tables, sum(durations)) for schema, (tables, durations) in grouped.items()]
+        schema_foreign_keys: List[Dict[str, Dict[str, str]]] = [{} for _ in per_schema]
+        if foreign_keys:
+            try:
+                schema_foreign_keys = list(pool.map(lambda item: _reflect_foreign_keys(engine, item[0], default_schema),
+                                                    per_schema))
+            except Exception as e:  # Droits insuffisants sur le catalogue : le schéma reste utilisable sans FK
+                log(f"Foreign key reflection failed: {str(e)[:100]}")
+    for (schema, tables, seconds), schema_fks in zip(per_schema, schema_foreign_keys):
+        timings[str(schema or default_schema or "default")] = {"tables": len(tables), "seconds": seconds}
+        reflected.extend({"schema": schema, "name": _qualified(schema, name), **info,
+                          "foreign_keys": schema_fks.get(name, {})} for name, info in tables.items())
+    reflected.sort(key=lambda t: t["name"])
+    report = {"tables": reflected, "schemas": timings, "method": "catalog" if bulk else "inspector",
+              "workers": max_workers, "total_s": time.perf_counter() - started}
+    log(describe_reflection(report))
+    return report
+
+
+def describe_reflection(report: Dict[str, Any]) -> str:
+    """Ligne de log : durée totale et temps par schéma."""
+    detail = ", ".join(f"{name} {t['tables']} tables {t['seconds']:.2f}s"
+                       for name, t in sorted(report["schemas"].items(), key=lambda item: -item[1]["seconds"]))
+    return (f"Schema reflected via {report['method']}: {len(report['tables'])} tables in {report['total_s']:.2f}s "
+            f"({report['workers']} workers; {detail or 'no schema'}).")
+
+
+def _fetch_samples(engine: Engine, table: Dict[str, Any], sample_rows: int) -> List[tuple]:
+    name = table["name"].split(".")[-1]
+    query = select(*[sql_column(c[0]) for c in table["columns"]]).select_from(
+        sql_table(name, schema=table["schema"])).limit(sample_rows)
+    try:
+        with engine.connect() as conn:
+            return [tuple(row) for row in conn.execute(query)]
+    except Exception:  # Table vide sur certains dialectes, vue invalide, droits insuffisants
+        return []
+
+
+def _sample_rows(engine: Engine, table: Dict[str, Any], sample_rows: int) -> str:
+    column_names = [c[0] for c in table["columns"]]
+    rows = [[str(v)[:_MAX_SAMPLE_VALUE_LENGTH] for v in row] for row in _fetch_samples(engine, table, sample_rows)]
+    return (f"{sample_rows} rows from {table['name']} table:\n" + "\t".join(column_names) + "\n"
+            + "\n".join("\t".join(row) for row in rows))
+
+
+def format_schema(engine: Engine, report: Dict[str, Any], sample_rows: int = DEFAULT_SAMPLE_ROWS,
+                  max_workers: int = DEFAULT_REFLECTION_WORKERS) -> str:
+    """Schéma au format de SQLDatabase.get_table_info (CREATE TABLE + lignes d'exemple, lues en parallèle)."""
+    tables = [t for t in report["tables"] if t["columns"]]
+    samples = [""] * len(tables)
+    if sample_rows > 0 and tables:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="vix-sample") as pool:
+            samples = list(pool.map(lambda t: _sample_rows(engine, t, sample_rows), tables))
+    blocks = []
+    for table, sample in zip(tables, samples):
+        definitions = [f"\t{name} {type_name}".rstrip() + ("" if nullable else " NOT NULL")
+                       for name, type_name, nullable in table["columns"]]
+        if table["primary_key"]:
+            definitions.append(f"\tPRIMARY KEY ({', '.join(table['primary_key'])})")
+        block = f"\nCREATE TABLE {table['name']} (\n" + ", \n".join(definitions) + "\n)"
+        blocks.append(block + (f"\n\n/*\n{sample}\n*/" if sample else ""))
+    return "\n\n".join(blocks)
+
+
+def _compact_value(value: Any, max_chars: int) -> str:
+    text_value = "NULL" if value is None else " ".join(str(value).split())
+    return text_value if len(text_value) <= max_chars else text_value[:max_chars - 1] + "…"
+
+
+def format_compact_schema(engine: Engine, report: Dict[str, Any], sample_rows: int = DEFAULT_SAMPLE_ROWS,
+                          max_workers: int = DEFAULT_REFLECTION_WORKERS, descriptions: Optional[Dict[str, str]] = None,
+                          sample_chars: int = DEFAULT_SAMPLE_CHARS) -> str:
+    """Une ligne par table : table(colonne:type PK, colonne:type FK->table.colonne), suivie des descriptions
+    (clés "table" et "table.colonne" de descriptions) et des valeurs d'exemple distinctes, tronquées."""
+    descriptions = {key.lower(): value for key, value in (descriptions or {}).items()}
+    tables = [t for t in report["tables"] if t["columns"]]
+    samples: List[List[tuple]] = [[] for _ in tables]
+    if sample_rows > 0 and tables:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="vix-sample") as pool:
+            samples = list(pool.map(lambda t: _fetch_samples(engine, t, sample_rows), tables))
+    blocks = []
+    for table, rows in zip(tables, samples):
+        foreign_keys = table.get("foreign_keys") or {}
+        definitions = []
+        for name, type_name, _ in table["columns"]:
+            markers = (" PK" if name in table["primary_key"] else "") + (f" FK->{foreign_keys[name]}" if name in foreign_keys else "")
+            definitions.append(f"{name}:{type_name}{markers}" if type_name else f"{name}{markers}")
+        lines = [f"{table['name']}({', '.join(definitions)})"]
+        table_description = descriptions.get(table["name"].lower())
+        if table_description:
+            lines[0] += f" -- {table_description}"
+        for name, _, _ in table["columns"]:
+            column_description = descriptions.get(f"{table['name']}.{name}".lower())
+            if column_description:
+                lines.append(f"  {name}: {column_description}")
+        if rows:
+            examples = []
+            for index, (name, _, _) in enumerate(table["columns"]):
+                values = list(dict.fromkeys(_compact_value(row[index], sample_chars) for row in rows))
+                examples.append(f"{name}={'|'.join(values)}")
+            lines.append(f"  e.g. {'; '.join(examples)}")
+        blocks.append("\n".join(lines))
+    return "\n".join(blocks)
+
+
+def schema_fingerprint(report: Dict[str, Any]) -> str:
+    """Empreinte de la structure reflétée (tables, colonnes, types, clés) : change quand le schéma change."""
+    structure = [(t["name"], t["columns"], t["primary_key"], sorted((t.get("foreign_keys") or {}).items()))
+                 for t in report["tables"]]
+    return hashlib.sha1(json.dumps(structure, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+_descriptions_cache: Dict[str, Tuple[float, Dict[str, str]]] = {}
+
+
+def load_schema_descriptions(path: Optional[str]) -> Dict[str, str]:
+    """Descriptions d'une ligne depuis un fichier JSON {"table": "...", "table.colonne": "..."}, relu s'il change."""
+    if not path or not os.path.exists(path):
+        return {}
+    mtime = os.path.getmtime(path)
+    cached = _descriptions_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding="utf-8") as f:
+            try:
+                descriptions = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Schema descriptions file {path} is not valid JSON: {e}")
+        cached = _descriptions_cache[path] = (mtime, {str(k): " ".join(str(v).split()) for k, v in descriptions.items()})
+    return cached[1]
+
+
+_schema_cache: Dict[tuple, Tuple[float, str, Dict[str, Any]]] = {}
+# Rendus par (configuration, empreinte du schéma) : une nouvelle réflexion d'un schéma inchangé
+# réutilise le rendu (et ses lignes d'exemple) au lieu de le recalculer
+_rendered_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_schema_key_locks: Dict[tuple, threading.Lock] = {}
+_schema_cache_lock = threading.Lock()
+
+
+def render_schema(engine: Engine, report: Dict[str, Any], schema_format: str, sample_rows: int = DEFAULT_SAMPLE_ROWS,
+                  max_workers: int = DEFAULT_REFLECTION_WORKERS, descriptions: Optional[Dict[str, str]] = None,
+                  sample_chars: int = DEFAULT_SAMPLE_CHARS) -> str:
+    """Schéma au format "compact" (format_compact_schema) ou "ddl" (format_schema, comme SQLDatabase)."""
+    if schema_format not in SCHEMA_FORMATS:
+        raise ValueError(f"Invalid schema format: {schema_format} (expected one of {', '.join(SCHEMA_FORMATS)})")
+    if schema_format == "ddl":
+        return format_schema(engine, report, sample_rows, max_workers)
+    return format_compact_schema(engine, report, sample_rows, max_workers, descriptions, sample_chars)
+
+
+def build_schema_info(engine: Engine, status_cb: Optional[Callable[[str], None]] = None) -> Tuple[str, Dict[str, Any]]:
+    """Schéma pour le prompt selon la configuration : VIX_SCHEMA_INCLUDE / VIX_SCHEMA_EXCLUDE (motifs
+    séparés par des virgules), VIX_REFLECTION_WORKERS, VIX_SCHEMA_SAMPLE_ROWS, VIX_SCHEMA_FORMAT
+    ("compact" ou "ddl"), VIX_SCHEMA_SAMPLE_CHARS et VIX_SCHEMA_DESCRIPTIONS (fichier JSON, format compact).
+
+    Le résultat est gardé VIX_SCHEMA_CACHE_S secondes (0 désactive) par base et configuration ; les
+    questions concurrentes qui le trouvent absent attendent une seule réflexion au lieu d'en lancer une chacune.
+    Le rendu est aussi gardé par empreinte du schéma (rapport["fingerprint"]) : tant que la structure
+    reflétée ne change pas, il n'est pas recalculé.
+    """
+    workers = int(os.getenv("VIX_REFLECTION_WORKERS", DEFAULT_REFLECTION_WORKERS))
+    include, exclude = _patterns(os.getenv("VIX_SCHEMA_INCLUDE")), _patterns(os.getenv("VIX_SCHEMA_EXCLUDE"))
+    sample_rows = int(os.getenv("VIX_SCHEMA_SAMPLE_ROWS", DEFAULT_SAMPLE_ROWS))
+    max_age_s = float(os.getenv("VIX_SCHEMA_CACHE_S", DEFAULT_SCHEMA_CACHE_S))
+    schema_format = os.getenv("VIX_SCHEMA_FORMAT", DEFAULT_SCHEMA_FORMAT).lower()
+    if schema_format not in SCHEMA_FORMATS:
+        raise ValueError(f"Invalid VIX_SCHEMA_FORMAT: {schema_format} (expected one of {', '.join(SCHEMA_FORMATS)})")
+    sample_chars = int(os.getenv("VIX_SCHEMA_SAMPLE_CHARS", DEFAULT_SAMPLE_CHARS))
+    descriptions = load_schema_descriptions(os.getenv("VIX_SCHEMA_DESCRIPTIONS")) if schema_format == "compact" else {}
+    key = (engine.url.render_as_string(hide_password=True), tuple(include), tuple(exclude), sample_rows,
+           schema_format, sample_chars, json.dumps(descriptions, sort_keys=True))
+    with _schema_cache_lock:
+        key_lock = _schema_key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        cached = _schema_cache.get(key)
+        if cached is not None and max_age_s > 0 and time.monotonic() - cached[0] < max_age_s:
+            if status_cb: status_cb(f"Schema served from cache ({time.monotonic() - cached[0]:.0f}s old).")
+            return cached[1], cached[2]
+        report = reflect_schema(engine, include=include, exclude=exclude, max_workers=workers, status_cb=status_cb,
+                                foreign_keys=schema_format == "compact")
+        report["fingerprint"], report["format"] = schema_fingerprint(report), schema_format
+        render_key = key + (report["fingerprint"],)
+        with _schema_cache_lock:
+            schema_info = _rendered_cache.get(render_key)
+        if schema_info is None:
+            schema_info = render_schema(engine, report, schema_format, sample_rows, workers, descriptions, sample_chars)
+            with _schema_cache_lock:
+                _rendered_cache[render_key] = schema_info
+                while len(_rendered_cache) > _RENDERED_CACHE_SIZE:
+                    _rendered_cache.popitem(last=False)
+        elif status_cb:
+            status_cb(f"Schema unchanged (fingerprint {report['fingerprint']}): {schema_format} rendering reused.")
+        if max_age_s > 0:
+            _schema_cache[key] = (time.monotonic(), schema_info, report)
+        return schema_info, report
+
+
+def clear_schema_cache() -> None:
+    with _schema_cache_lock:
+        _schema_cache.clear()
+        _rendered_cache.clear()
@@ -0,0 +1,134 @@
+"""Génération spéculative du SQL pendant la saisie : la question soumise reprend le SQL déjà prêt."""
+import difflib
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from cancellation import CancellationToken, QuestionCancelled
+from value_index import normalize_text
+
+DEFAULT_MIN_SIMILARITY = 0.97
+DEFAULT_WAIT_S = 60.0  # Attente maximale d'une spéculation encore en cours au moment de la soumission
+
+
+def is_near_match(speculated: str, submitted: str, min_similarity: float = DEFAULT_MIN_SIMILARITY) -> bool:
+    """Même question à la casse, aux accents et à la ponctuation près, ou presque identique.
+
+    Les nombres doivent être identiques : « top 5 » et « top 50 » sont proches mais pas le même SQL.
+    """
+    a, b = normalize_text(speculated), normalize_text(submitted)
+    if a == b:
+        return True
+    if re.findall(r"\d+", a) != re.findall(r"\d+", b):
+        return False
+    return difflib.SequenceMatcher(None, a, b).ratio() >= min_similarity
+
+
+class _Speculation:
+    def __init__(self, question: str):
+        self.question = question
+        self.token = CancellationToken()
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+
+
+class SqlSpeculator:
+    """Une seule spéculation à la fois : une nouvelle saisie annule la précédente.
+
+    generate_fn(question, cancel_token) produit le SQL (speculate_sql). Compteurs : spéculations
+    lancées, reprises (hits), écartées à la soumission (misses), annulées avant la fin, et appels
+    gaspillés (spéculations menées à terme sans être reprises).
+    """
+
+    def __init__(self, generate_fn: Callable[[str, CancellationToken], Dict[str, Any]],
+                 min_similarity: float = DEFAULT_MIN_SIMILARITY):
+        self.generate_fn = generate_fn
+        self.min_similarity = min_similarity
+        self._lock = threading.Lock()
+        self._current: Optional[_Speculation] = None
+        self._counts = {"started": 0, "hits": 0, "misses": 0, "cancelled": 0, "wasted": 0}
+
+    def speculate(self, question: str) -> None:
+        """Lance la génération pour question, sauf si la spéculation en cours couvre déjà ce texte."""
+        with self._lock:
+            current = self._current
+            if current is not None and not current.token.is_cancelled and \
+                    normalize_text(current.question) == normalize_text(question) and current.error is None:
+                return
+            self._discard(current)
+            speculation = _Speculation(question)
+            self._current = speculation
+            self._counts["started"] += 1
+        threading.Thread(target=self._run, args=(speculation,), name="vix-sql-speculation", daemon=True).start()
+
+    def _run(self, speculation: _Speculation) -> None:
+        try:
+            speculation.result = self.generate_fn(speculation.question, speculation.token)
+        except QuestionCancelled:
+            pass
+        except Exception as e:
+            speculation.error = str(e)
+        finally:
+            speculation.done.set()
+
+    def _discard(self, speculation: Optional[_Speculation]) -> None:
+        """Abandonne une spéculation (appelé sous verrou) : annulée si en cours, gaspillée si terminée."""
+        if speculation is None:
+            return
+        if speculation.done.is_set():
+            if speculation.result is not None:
+                self._counts["wasted"] += 1
+        else:
+            self._counts["cancelled"] += 1
+            speculation.token.cancel()
+
+    def take(self, question: str, cancel_token: Optional[CancellationToken] = None,
+             timeout: float = DEFAULT_WAIT_S) -> Optional[Dict[str, Any]]:
+        """SQL spéculé pour la question soumise, en attendant la fin de la génération si besoin ; None sinon."""
+        with self._lock:
+            speculation, self._current = self._current, None
+            if speculation is None:
+                return None
+            if not is_near_match(speculation.question, question, self.min_similarity):
+                self._counts["misses"] += 1
+                self._discard(speculation)
+                return None
+        if cancel_token is not None:
+            unregister = cancel_token.register(speculation.token.cancel)
+        try:
+            speculation.done.wait(timeout)
+        finally:
+            if cancel_token is not None: unregister()
+        with self._lock:
+            if speculation.result is None:
+                self._counts["misses"] += 1
+                if not speculation.done.is_set():
+                    self._discard(speculation)
+                return None
+            self._counts["hits"] += 1
+            return speculation.result
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._discard(self._current)
+            self._current = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counts)
+        submitted = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / submitted if submitted else None
+        return stats
+
+
+def speculation_enabled() -> bool:
+    return os.getenv("VIX_SPECULATIVE_SQL", "false").lower() == "true"
+
+
+def speculation_settings() -> Dict[str, Any]:
+    """Délai de pause de frappe (ms), nombre minimal de mots et seuil de similarité, depuis l'environnement."""
+    return {"debounce_ms": int(os.getenv("VIX_SPECULATION_DEBOUNCE_MS", "700")),
+            "min_words": int(os.getenv("VIX_SPECULATION_MIN_WORDS", "3")),
+            "min_similarity": float(os.getenv("VIX_SPECULATION_MIN_SIMILARITY", DEFAULT_MIN_SIMILARITY))}
@@ -0,0 +1,73 @@
+"""Accès SQLite en lecture seule aux extraits locaux : fichier ouvert par une URI file: (mode=ro ou immutable)
+et pragmas de lecture (mmap, cache de pages, query_only) à chaque connexion."""
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict
+
+from sqlalchemy.engine import URL
+
+SQLITE_MODES = ("rw", "ro", "immutable")
+DEFAULT_MMAP_MB = 1024
+DEFAULT_CACHE_MB = 64
+
+
+def get_sqlite_settings() -> Dict[str, Any]:
+    """Mode d'ouverture (VIX_SQLITE_MODE) et pragmas (VIX_SQLITE_MMAP_MB, VIX_SQLITE_CACHE_MB, VIX_SQLITE_TEMP_MEMORY).
+
+    "rw" (défaut) garde l'ouverture habituelle ; "ro" ouvre le fichier en lecture seule ; "immutable"
+    indique en plus à SQLite que le fichier ne changera pas pendant qu'il est ouvert (aucun verrou).
+    """
+    mode = os.getenv("VIX_SQLITE_MODE", "rw").lower()
+    if mode not in SQLITE_MODES:
+        raise ValueError(f"Invalid VIX_SQLITE_MODE: {mode} (expected one of {', '.join(SQLITE_MODES)})")
+    return {"mode": mode, "mmap_mb": int(os.getenv("VIX_SQLITE_MMAP_MB", DEFAULT_MMAP_MB)),
+            "cache_mb": int(os.getenv("VIX_SQLITE_CACHE_MB", DEFAULT_CACHE_MB)),
+            # Tables temporaires en mémoire : désactivé par défaut, les GROUP BY/ORDER BY mesurés y sont plus lents
+            "temp_memory": os.getenv("VIX_SQLITE_TEMP_MEMORY", "false").lower() == "true"}
+
+
+def read_only_uri(db_path: str, mode: str) -> str:
+    """URI file: du fichier (chemin absolu, caractères spéciaux échappés) en mode "ro" ou "immutable"."""
+    uri = Path(db_path).resolve().as_uri()
+    return f"{uri}?immutable=1" if mode == "immutable" else f"{uri}?mode=ro"
+
+
+def read_pragmas(settings: Dict[str, Any]) -> list:
+    pragmas = [f"PRAGMA mmap_size = {settings['mmap_mb'] * 1024 * 1024}",
+               f"PRAGMA cache_size = -{settings['cache_mb'] * 1024}",  # Négatif : taille en Kio
+               "PRAGMA query_only = 1"]
+    return pragmas + ["PRAGMA temp_store = MEMORY"] if settings["temp_memory"] else pragmas
+
+
+def sqlite_engine_args(url: URL, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Arguments de create_engine pour ouvrir la base en lecture seule ; {} en mode "rw" ou en mémoire.
+
+    L'URL de l'engine reste sqlite:///chemin : l'empreinte de la base (caches locaux, questions
+    enregistrées) ne dépend pas du mode. Les connexions sont créées sans check_same_thread, comme
+    celles du pool par défaut de SQLAlchemy, et peuvent passer d'un thread de travail à l'autre ;
+    query_only garantit qu'aucune d'elles n'écrit.
+    """
+    db_path = url.database
+    if settings["mode"] == "rw" or not db_path or db_path == ":memory:" or db_path.startswith("file:"):
+        return {}
+    if not os.path.exists(db_path):
+        raise ValueError(f"SQLite file not found: {db_path} (read-only mode cannot create it)")
+    uri = read_only_uri(db_path, settings["mode"])
+    pragmas = read_pragmas(settings)
+
+    def _connect() -> sqlite3.Connection:
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        for pragma in pragmas:
+            conn.execute(pragma)
+        return conn
+    return {"creator": _connect}
+
+
+def describe_sqlite_settings(settings: Dict[str, Any]) -> str:
+    if settings["mode"] == "rw":
+        return "SQLite opened read-write with default pragmas."
+    return (f"SQLite opened {'immutable' if settings['mode'] == 'immutable' else 'read-only'} "
+            f"(mmap {settings['mmap_mb']} MB, cache {settings['cache_mb']} MB"
+            f"{', temp_store memory' if settings['temp_memory'] else ''}, query_only).")
+
@@ -0,0 +1,146 @@
+"""Banc d'essai des modes d'ouverture SQLite (rw, ro, immutable) sur des requêtes de lecture concurrentes.
+
+Usage : python sqlite_benchmark.py [--db extrait.db | --create-mb 200] [--threads 1,4,8] [--requests 200]
+        [--modes rw,ro,immutable] [--json rapport.json]
+
+Sans --db, un extrait synthétique d'environ --create-mb Mo est créé dans un dossier temporaire.
+Chaque mode ouvre un engine par create_query_engine (VIX_SQLITE_MODE) : les requêtes passent par le
+même pool et les mêmes garde-fous que le pipeline. Avec --db, les requêtes sont lues dans --queries
+(une par ligne) ; sinon, le scénario de l'extrait synthétique est utilisé.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+
+from load_test import percentile
+
+WORKLOAD = [
+    ("agrégat complet", "SELECT region, COUNT(*), SUM(amount), AVG(quantity) FROM sb_sales GROUP BY region"),
+    ("recherche indexée", "SELECT * FROM sb_sales WHERE customer_id = {customer} LIMIT 50"),
+    ("regroupement filtré",
+     "SELECT product, SUM(amount) AS total FROM sb_sales WHERE sold_on >= '2024-{month:02d}-01' "
+     "GROUP BY product ORDER BY total DESC LIMIT 20"),
+    ("balayage texte", "SELECT COUNT(*) FROM sb_sales WHERE label LIKE '%{word}%'"),
+]
+_REGIONS = ["Nord", "Sud", "Est", "Ouest", "Centre", "Outre-mer"]
+_WORDS = ["remise", "retour", "express", "cadeau", "standard", "export"]
+
+
+def create_extract(path: str, size_mb: int) -> None:
+    """Extrait synthétique d'environ size_mb Mo (une ligne fait ~100 octets avec son index)."""
+    rng = random.Random(42)
+    rows = size_mb * 10_000
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("CREATE TABLE sb_sales (id INTEGER PRIMARY KEY, customer_id INTEGER, region TEXT, product TEXT,"
+                     " sold_on TEXT, quantity INTEGER, amount REAL, label TEXT)")
+        batch = 50_000
+        for start in range(0, rows, batch):
+            conn.executemany("INSERT INTO sb_sales VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+                (i, rng.randrange(rows // 20 or 1), rng.choice(_REGIONS), f"Produit {rng.randrange(500)}",
+                 f"2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}", rng.randrange(1, 20),
+                 round(rng.uniform(1, 900), 2), f"Vente {rng.choice(_WORDS)} n°{i}")
+                for i in range(start, min(rows, start + batch))])
+        conn.execute("CREATE INDEX sb_sales_customer ON sb_sales (customer_id)")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _query(index: int, queries: List[str], rng: random.Random) -> str:
+    sql = queries[index % len(queries)]
+    return sql.format(customer=rng.randrange(500), month=rng.randrange(1, 13), word=rng.choice(_WORDS))
+
+
+def run_mode(db_path: str, mode: str, threads: int, requests: int, queries: List[str]) -> Dict[str, Any]:
+    """Exécute requests requêtes avec threads appelants sur un engine ouvert dans ce mode."""
+    os.environ["VIX_SQLITE_MODE"] = mode
+    os.environ["VIX_DB_POOL_SIZE"] = str(threads)
+    from app_refactored import create_query_engine
+    engine = create_query_engine(f"sqlite:///{db_path}", "sqlite", lambda msg: None, statement_timeout_ms=0)
+
+    def _one(index: int) -> float:
+        sql = _query(index, queries, random.Random(index))
+        started = time.perf_counter()
+        with engine.connect() as conn:
+            conn.execute(text(sql)).fetchall()
+        return time.perf_counter() - started
+
+    try:
+        _one(0)  # Préchauffage : pages du fichier en cache (mmap ou cache de pages)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"vix-sqlite-{mode}") as pool:
+            latencies = sorted(pool.map(_one, range(requests)))
+        elapsed = time.perf_counter() - started
+    finally:
+        engine.dispose()
+    return {"mode": mode, "threads": threads, "requests": requests, "elapsed_s": elapsed,
+            "throughput_qps": requests / elapsed if elapsed else 0.0, "p50_s": percentile(latencies, 50),
+            "p95_s": percentile(latencies, 95), "max_s": latencies[-1]}
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    baseline = {r["threads"]: r["throughput_qps"] for r in results if r["mode"] == "rw"}
+    print(f"\n{'mode':<10} {'threads':>7} {'req.':>5} {'q/s':>9} {'vs rw':>6} {'p50':>8} {'p95':>8} {'max':>8}")
+    for r in results:
+        ratio = f"{r['throughput_qps'] / baseline[r['threads']]:>5.2f}x" if baseline.get(r["threads"]) else f"{'-':>6}"
+        print(f"{r['mode']:<10} {r['threads']:>7} {r['requests']:>5} {r['throughput_qps']:>9.2f} {ratio} "
+              f"{r['p50_s']:>7.4f}s {r['p95_s']:>7.4f}s {r['max_s']:>7.4f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare les modes d'ouverture SQLite en lecture concurrente.")
+    parser.add_argument("--db", help="Extrait SQLite existant (jamais modifié)")
+    parser.add_argument("--queries", help="Requêtes SELECT sur --db, une par ligne")
+    parser.add_argument("--create-mb", type=int, default=100, help="Taille de l'extrait synthétique (sans --db)")
+    parser.add_argument("--threads", default="1,4,8", help="Nombres de threads appelants, séparés par des virgules")
+    parser.add_argument("--requests", type=int, default=200, help="Requêtes par mode et par niveau")
+    parser.add_argument("--modes", default="rw,ro,immutable", help="Modes comparés, séparés par des virgules")
+    parser.add_argument("--json", help="Écrit les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+    if args.db and not args.queries:
+        parser.error("--queries est requis avec --db (le scénario intégré vise l'extrait synthétique)")
+
+    work_dir = tempfile.mkdtemp(prefix="vix-sqlite-")
+    # Configuration isolée : le .env du projet n'est pas relu
+    env_file = os.path.join(work_dir, ".env")
+    open(env_file, "w").close()
+    os.environ.update({"VIX_ENV_FILE": env_file, "VIX_DB_MAX_OVERFLOW": "0"})
+    try:
+        db_path = args.db
+        queries = [sql for _, sql in WORKLOAD]
+        if args.queries:
+            with open(args.queries, encoding="utf-8") as f:
+                queries = [line.strip() for line in f if line.strip()]
+        if not db_path:
+            db_path = os.path.join(work_dir, "extract.db")
+            print(f"Création d'un extrait synthétique de ~{args.create_mb} Mo...")
+            create_extract(db_path, args.create_mb)
+        print(f"Extrait : {db_path} ({os.path.getsize(db_path) / 1024 / 1024:.0f} Mo)")
+        results = []
+        for threads in [int(t) for t in args.threads.split(",") if t.strip()]:
+            for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+                result = run_mode(db_path, mode, threads, max(args.requests, threads), queries)
+                results.append(result)
+                print(f"{mode} x{threads}: {result['throughput_qps']:.2f} q/s, p95 {result['p95_s']:.4f}s")
+        print_results(results)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"database": db_path, "size_bytes": os.path.getsize(db_path), "results": results},
+                          f, indent=2, ensure_ascii=False)
+            print(f"Résultats écrits dans {args.json}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
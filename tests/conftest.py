@@ -0,0 +1,34 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+# Les modules du projet sont à la racine du dépôt
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_registry  # noqa: E402
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+
+
+@pytest.fixture
+def loop_bound_model(monkeypatch):
+    """Un seul modèle pour tout le processus, dont le client asynchrone est lié à sa première boucle."""
+    state = {"loop": None, "calls": 0}
+
+    async def _respond(prompt_value):
+        loop = asyncio.get_running_loop()
+        if state["loop"] is None:
+            state["loop"] = loop
+        elif state["loop"] is not loop:
+            raise RuntimeError("Future attached to a different loop")
+        state["calls"] += 1
+        await asyncio.sleep(0.01)
+        return "SELECT 1"
+
+    model = RunnableLambda(lambda prompt_value: "SELECT 1", afunc=_respond)
+    monkeypatch.setattr(model_registry, "_build_model", lambda *args: model)
+    monkeypatch.setenv("VIX_LLM_RPM", "0")
+    monkeypatch.setenv("VIX_LLM_TPM", "0")
+    monkeypatch.setenv("VIX_SQL_MODEL", "gemini-test")
+    return state
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from cancellation import CancellationToken, QuestionCancelled, invoke_cancellable
+
+
+class LoopBoundModel:
+    """Modèle simulé dont le client asynchrone est lié à la boucle de son premier appel (comme grpc.aio)."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.client_loop = None
+        self.calls = 0
+
+    def invoke(self, inputs):
+        return f"sync:{inputs}"
+
+    async def ainvoke(self, inputs):
+        loop = asyncio.get_running_loop()
+        if self.client_loop is None:
+            self.client_loop = loop
+        elif self.client_loop is not loop:
+            raise RuntimeError("Future attached to a different loop")
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return f"async:{inputs}"
+
+
+def test_consecutive_cancellable_calls_share_the_model_client():
+    model = LoopBoundModel()
+    assert invoke_cancellable(model, "a", CancellationToken()) == "async:a"
+    assert invoke_cancellable(model, "b", CancellationToken()) == "async:b"
+    assert model.calls == 2
+
+
+def test_concurrent_callers_on_the_same_model():
+    model = LoopBoundModel(delay=0.05)
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(invoke_cancellable(model, i, CancellationToken())))
+               for i in range(4)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert sorted(results) == [f"async:{i}" for i in range(4)]
+
+
+def test_cancel_interrupts_the_call_and_the_loop_stays_usable():
+    model = LoopBoundModel(delay=5)
+    token = CancellationToken()
+    threading.Timer(0.1, token.cancel).start()
+    started = time.monotonic()
+    with pytest.raises(QuestionCancelled):
+        invoke_cancellable(model, "slow", token)
+    assert time.monotonic() - started < 2
+    model.delay = 0
+    assert invoke_cancellable(model, "next", CancellationToken()) == "async:next"
+
+
+def test_already_cancelled_token_and_sync_path():
+    token = CancellationToken()
+    token.cancel()
+    with pytest.raises(QuestionCancelled):
+        invoke_cancellable(LoopBoundModel(), "x", token)
+    assert invoke_cancellable(LoopBoundModel(), "x") == "sync:x"
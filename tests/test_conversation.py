@@ -0,0 +1,55 @@
+import pytest
+
+from conversation import ConversationWorkspace, is_follow_up
+
+
+@pytest.fixture
+def workspace():
+    ws = ConversationWorkspace()
+    ws.add_result("ventes par ville", "SELECT ville, montant FROM ventes", ["ville", "montant"],
+                  [("Paris", 30.0), ("Lyon", 10.0), ("Nice", 20.0)], "sqlite")
+    ws.set_schema_names({"tables": [{"name": "ventes", "columns": [("ville",), ("montant",)]},
+                                    {"name": "clients", "columns": [("nom",), ("retours",)]}]})
+    return ws
+
+
+@pytest.mark.parametrize("question", [
+    "top 10 des villes",
+    "les 10 meilleurs clients en 2023",
+    "sans les retours",
+    "les 10 premiers",
+    "Orders by region",
+])
+def test_standalone_questions_are_not_follow_ups(workspace, question):
+    assert not is_follow_up(question, workspace)
+
+
+@pytest.mark.parametrize("question", [
+    "trie par montant décroissant",
+    "seulement ceux de Paris",
+    "parmi ces villes, lesquelles dépassent 15 ?",
+    "order them by montant",
+    "garde-les si montant > 15",
+])
+def test_explicit_references_are_follow_ups(workspace, question):
+    assert is_follow_up(question, workspace)
+
+
+def test_no_workspace_result_means_no_follow_up():
+    assert not is_follow_up("trie-les par montant", ConversationWorkspace())
+
+
+def test_reference_to_table_outside_workspace_goes_to_database(workspace):
+    assert not is_follow_up("parmi ces villes, les clients", workspace)
+
+
+def test_rule_based_sql_sorts_and_limits(workspace):
+    sql = workspace.rule_based_sql("trie par montant décroissant")
+    assert sql == 'SELECT * FROM r1 ORDER BY "montant" DESC'
+    assert workspace.execute(sql)[1][0] == ("Paris", 30.0)
+    assert workspace.rule_based_sql("les 2 premiers, trie par montant") == 'SELECT * FROM r1 ORDER BY "montant" ASC LIMIT 2'
+
+
+@pytest.mark.parametrize("question", ["top 10", "les 10 premiers", "trie par population"])
+def test_rule_based_sql_never_limits_without_order(workspace, question):
+    assert workspace.rule_based_sql(question) is None
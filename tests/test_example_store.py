@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+import example_store
+from example_store import add_example, load_curated_examples, retrieve_examples
+
+
+@pytest.fixture
+def store(tmp_path):
+    return str(tmp_path / "examples.db")
+
+
+def _curated(tmp_path, pairs):
+    path = tmp_path / "curated.jsonl"
+    path.write_text("\n".join(json.dumps({"question": q, "sql": s}) for q, s in pairs) + "\n\n", encoding="utf-8")
+    return str(path)
+
+
+def test_load_curated_examples_counts_new_pairs_only(tmp_path, store):
+    path = _curated(tmp_path, [("total des ventes", "SELECT SUM(montant) FROM ventes"),
+                               ("nombre de clients", "SELECT COUNT(*) FROM clients")])
+    assert load_curated_examples(path, "db", store_path=store) == 2
+    assert load_curated_examples(path, "db", store_path=store) == 0
+
+
+def test_load_curated_examples_reports_bad_line(tmp_path, store):
+    path = tmp_path / "bad.jsonl"
+    path.write_text('{"question": "a", "sql": "SELECT 1"}\n{oops\n', encoding="utf-8")
+    with pytest.raises(ValueError, match=":2:"):
+        load_curated_examples(str(path), "db", store_path=store)
+
+
+def test_new_examples_are_added_without_rebuilding(store, monkeypatch):
+    for i in range(20):
+        add_example(f"ventes du magasin {i}", f"SELECT * FROM ventes WHERE magasin = {i}", "db", store_path=store)
+    index = example_store._get_index("db", store)
+    builds = []
+    original_init = example_store.ExampleIndex.__init__
+    monkeypatch.setattr(example_store.ExampleIndex, "__init__",
+                        lambda self, examples: builds.append(len(examples)) or original_init(self, examples))
+
+    add_example("nombre de clients par ville", "SELECT ville, COUNT(*) FROM clients GROUP BY ville", "db", store_path=store)
+    result = retrieve_examples("clients par ville", "db", store_path=store)
+    assert result["examples"][0]["sql"].startswith("SELECT ville")
+    assert example_store._get_index("db", store) is index
+    assert builds == []
+
+
+def test_index_rebuilt_past_threshold_and_after_deletion(store, monkeypatch):
+    add_example("ventes par mois", "SELECT 1", "db", store_path=store)
+    first = example_store._get_index("db", store)
+    add_example("ventes par an", "SELECT 2", "db", store_path=store)
+    assert example_store._get_index("db", store) is not first  # 1 ajout sur 1 exemple : au-delà du seuil
+    rebuilt = example_store._get_index("db", store)
+    conn = example_store._connect(store)
+    conn.execute("DELETE FROM examples WHERE sql = 'SELECT 1'")
+    conn.execute("INSERT INTO examples (db_key, question, question_norm, sql, source, created_at) "
+                 "VALUES ('db', 'clients', 'clients', 'SELECT 3', 'run', 0)")
+    conn.commit()
+    conn.close()
+    index = example_store._get_index("db", store)
+    assert index is not rebuilt
+    assert [sql for _, _, sql in index.examples] == ["SELECT 2", "SELECT 3"]
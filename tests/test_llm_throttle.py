@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+import llm_throttle
+from cancellation import CancellationToken, QuestionCancelled
+from llm_throttle import SingleFlight, TokenBucket, backoff_delay, is_retryable_error
+
+
+def test_token_bucket_allows_burst_then_waits(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(llm_throttle.time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(60)  # 1 jeton par seconde
+    assert [bucket.reserve(1) for _ in range(60)] == [0.0] * 60
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    assert bucket.reserve(1) == pytest.approx(2.0)  # Réservations servies dans l'ordre d'arrivée
+    now[0] += 10
+    assert bucket.reserve(1) == 0.0
+
+
+def test_token_bucket_caps_oversized_requests(monkeypatch):
+    monkeypatch.setattr(llm_throttle.time, "monotonic", lambda: 0.0)
+    bucket = TokenBucket(100)
+    assert bucket.reserve(10_000) == 0.0  # Plus grand que le seau : attend au plus un seau plein
+    assert bucket.reserve(50) == pytest.approx(30.0)
+
+
+def test_single_flight_shares_one_call():
+    flights, calls = SingleFlight(), []
+    release = threading.Event()
+
+    def slow_call():
+        calls.append(1)
+        release.wait(5)
+        return "sql"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("prompt", slow_call))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert {result for result, _ in results} == {"sql"}
+
+
+def test_single_flight_followers_retry_after_leader_cancelled():
+    flights, started = SingleFlight(), threading.Event()
+    leader_token = CancellationToken()
+
+    def cancelled_call():
+        started.set()
+        leader_token.wait(5)
+        raise QuestionCancelled("Question cancelled by user.")
+
+    errors = []
+
+    def run_leader():
+        try:
+            flights.do("k", cancelled_call)
+        except QuestionCancelled as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=run_leader)
+    leader.start()
+    started.wait(5)
+    follower_result = []
+    follower = threading.Thread(target=lambda: follower_result.append(flights.do("k", lambda: "own call")))
+    follower.start()
+    time.sleep(0.2)
+    leader_token.cancel()
+    leader.join(5)
+    follower.join(5)
+    assert len(errors) == 1
+    assert follower_result == [("own call", False)]
+
+
+def test_single_flight_propagates_leader_error():
+    flights = SingleFlight()
+    with pytest.raises(RuntimeError):
+        flights.do("k", lambda: (_ for _ in ()).throw(RuntimeError("boom")))
+    assert flights.do("k", lambda: 1) == (1, False)
+
+
+def test_retryable_errors_and_backoff():
+    assert is_retryable_error(RuntimeError("429 Resource exhausted"))
+    assert not is_retryable_error(ValueError("invalid prompt"))
+    assert not is_retryable_error(QuestionCancelled("timeout"))
+    assert all(0 <= backoff_delay(attempt, 1.0, 30.0) <= min(30.0, 2 ** attempt) for attempt in range(8))
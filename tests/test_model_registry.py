@@ -0,0 +1,29 @@
+import threading
+
+from langchain_core.prompts import PromptTemplate
+
+import model_registry
+from cancellation import CancellationToken
+
+
+def test_shared_stage_model_serves_consecutive_calls(loop_bound_model):
+    prompt = PromptTemplate.from_template("Question: {question}")
+    for question in ("première", "seconde"):
+        assert model_registry.invoke_stage("sql", prompt, {"question": question}, CancellationToken()) == "SELECT 1"
+    assert loop_bound_model["calls"] == 2
+
+
+def test_shared_stage_model_serves_concurrent_threads(loop_bound_model):
+    prompt = PromptTemplate.from_template("Question: {question}")
+    outputs, errors = [], []
+
+    def _ask(index):
+        try:
+            outputs.append(model_registry.invoke_stage("plan", prompt, {"question": f"q{index}"}, CancellationToken()))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_ask, args=(i,)) for i in range(6)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert errors == [] and outputs == ["SELECT 1"] * 6
@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from query_guard import get_query_limits, install_statement_timeout
+
+SLOW_SQL = ("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 3000000) "
+            "SELECT COUNT(*) FROM n")
+
+
+def _run(engine):
+    with engine.connect() as conn:
+        return conn.execute(text(SLOW_SQL)).scalar()
+
+
+def test_timeout_can_be_disabled_and_restored_on_shared_engine():
+    engine = create_engine("sqlite://")
+    install_statement_timeout(engine, "sqlite", 20)
+    with pytest.raises(OperationalError, match="interrupted"):
+        _run(engine)
+    install_statement_timeout(engine, "sqlite", 0)
+    assert _run(engine) == 3000000
+    install_statement_timeout(engine, "sqlite", 20)
+    with pytest.raises(OperationalError, match="interrupted"):
+        _run(engine)
+    install_statement_timeout(engine, "sqlite", None)
+    assert _run(engine) == 3000000
+    engine.dispose()
+
+
+def test_disabled_timeout_on_new_engine_installs_nothing():
+    engine = create_engine("sqlite://")
+    install_statement_timeout(engine, "sqlite", 0)
+    assert _run(engine) == 3000000
+    engine.dispose()
+
+
+def test_query_limits_precedence(monkeypatch):
+    monkeypatch.setenv("VIX_STATEMENT_TIMEOUT_MS", "0")
+    monkeypatch.setenv("VIX_QUERY_LIMITS", '{"sqlite": {"max_rows": 10}, "ventes": {"max_rows": 5}}')
+    limits = get_query_limits("sqlite", "/data/ventes.db")
+    assert limits["statement_timeout_ms"] == 0
+    assert limits["max_rows"] == 5
+    assert get_query_limits("sqlite")["max_rows"] == 10
+
+
+def test_invalid_query_limits_raise(monkeypatch):
+    monkeypatch.setenv("VIX_QUERY_LIMITS", "{oops")
+    with pytest.raises(ValueError):
+        get_query_limits("sqlite")
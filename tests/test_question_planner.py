@@ -0,0 +1,65 @@
+from langchain_core.prompts import PromptTemplate
+
+import model_registry
+from cancellation import CancellationToken
+from question_planner import may_be_compound, merge_part_results, parse_plan, run_sub_questions
+
+
+def test_parse_plan_reads_the_json_array():
+    text = 'Voici : ["Ventes 2023 par région ?", "Ventes 2024 par région ?"]'
+    assert parse_plan(text) == ["Ventes 2023 par région ?", "Ventes 2024 par région ?"]
+
+
+def test_parse_plan_keeps_single_or_invalid_plans_whole():
+    assert parse_plan('["Une seule question"]') == []
+    assert parse_plan("pas de JSON") == []
+    assert parse_plan('["a", "b", "c", "d", "e"]', max_parts=4) == []
+    assert parse_plan('["Ventes ?", "ventes ?", "Clients ?"]') == ["Ventes ?", "Clients ?"]
+
+
+def test_may_be_compound():
+    assert may_be_compound("Compare les ventes 2023 et 2024")
+    assert may_be_compound("Combien de clients ? Et combien de commandes ?")
+    assert not may_be_compound("Combien de clients et de commandes par région")
+
+
+def test_merge_part_results_unions_columns():
+    parts = [{"question": "q1", "columns": ["region", "total"], "rows": [("Nord", 10)]},
+             {"question": "q2", "columns": ["total", "annee"], "rows": [(5, 2024)]}]
+    columns, rows = merge_part_results(parts)
+    assert columns == ["sub_question", "region", "total", "annee"]
+    assert rows == [("q1", "Nord", 10, None), ("q2", None, 5, 2024)]
+
+
+def test_merge_part_results_keeps_duplicate_column_names_apart():
+    parts = [{"question": "q1", "columns": ["count", "count"], "rows": [(1, 2)]},
+             {"question": "q2", "columns": ["count"], "rows": [(3,)]}]
+    columns, rows = merge_part_results(parts)
+    assert columns == ["sub_question", "count", "count_2"]
+    assert rows == [("q1", 1, 2), ("q2", 3, None)]
+
+
+def test_run_sub_questions_keeps_order_and_isolates_failures():
+    def _run(question):
+        if question == "boom":
+            raise ValueError("invalid SQL")
+        return {"question": question, "columns": ["n"], "rows": [(len(question),)]}
+
+    parts, timing = run_sub_questions(["a", "boom", "ccc"], _run, max_workers=3)
+    assert [p["question"] for p in parts] == ["a", "boom", "ccc"]
+    assert parts[1]["error"] == "invalid SQL" and parts[0]["error"] is None
+    assert timing["sequential_s"] >= 0 and timing["speedup"] > 0
+
+
+def test_sub_questions_generate_in_parallel_on_the_shared_model(loop_bound_model):
+    prompt = PromptTemplate.from_template("Question: {question}")
+    token = CancellationToken()
+
+    def _run(question):
+        sql = model_registry.invoke_stage("sql", prompt, {"question": question}, token)
+        return {"question": question, "columns": ["sql"], "rows": [(sql,)]}
+
+    for _ in range(2):  # Deuxième plan : le modèle a déjà servi
+        parts, _ = run_sub_questions(["ventes 2023", "ventes 2024", "top 5 produits"], _run, max_workers=3, cancel_token=token)
+        assert [p["error"] for p in parts] == [None, None, None]
+    assert loop_bound_model["calls"] == 6
@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+
+from replica_router import ReplicaRouter
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / "primary.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.commit()
+    conn.close()
+    return f"sqlite:///{path}"
+
+
+def _router(uris, **options):
+    logs = []
+    router = ReplicaRouter(uris, create_engine, health_interval_s=0, status_cb=logs.append, **options)
+    return router, logs
+
+
+def test_replica_ejected_after_max_failures_and_recovered(database):
+    router, logs = _router([database], max_failures=2, recover_after=2)
+    replica = router._replicas[0]
+    router._record(replica, False, error="timeout")
+    assert replica.healthy and replica.consecutive_failures == 1
+    router._record(replica, False, error="timeout")
+    assert not replica.healthy and replica.errors == 2
+    router._record(replica, True, 5.0)
+    assert not replica.healthy and replica.consecutive_successes == 1
+    router._record(replica, False, error="timeout")  # Un échec remet le compteur de succès à zéro
+    router._record(replica, True, 5.0)
+    assert not replica.healthy
+    router._record(replica, True, 5.0)
+    assert replica.healthy and replica.consecutive_failures == 0
+    assert len(logs) == 2 and "ejected after 2 failures" in logs[0] and "healthy again" in logs[1]
+    assert router.stats()["replicas"][0]["errors"] == 3
+    router.close()
+
+
+def test_latency_is_smoothed(database):
+    router, _ = _router([database])
+    replica = router._replicas[0]
+    router._record(replica, True, 10.0)
+    router._record(replica, True, 20.0)
+    assert replica.latency_ms == pytest.approx(13.0)
+    router.close()
+
+
+def test_unreachable_replica_falls_back_to_primary(database, tmp_path):
+    broken = f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"
+    router, _ = _router([broken], max_failures=1)
+    primary = create_engine(database)
+    assert router.execute_select("SELECT x FROM t", primary) == (["x"], [(1,)], "primary")
+    assert not router._replicas[0].healthy and router.primary_fallbacks == 1
+    assert router.execute_select("SELECT x FROM t", primary)[2] == "primary"  # Réplica éjecté : plus essayé
+    assert router.stats()["replicas"][0]["queries"] == 0
+    router.close()
+    primary.dispose()
+
+
+def test_healthy_replica_serves_query(database):
+    router, _ = _router([database])
+    columns, rows, target = router.execute_select("SELECT x FROM t", create_engine("sqlite://"))
+    assert (columns, rows, target) == (["x"], [(1,)], router._replicas[0].name)
+    router.close()
+
+
+def test_unknown_strategy_rejected(database):
+    with pytest.raises(ValueError):
+        ReplicaRouter([database], create_engine, strategy="random", health_interval_s=0)
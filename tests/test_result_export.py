@@ -0,0 +1,76 @@
+import os
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from result_export import export_query_results, row_limit, strip_order_by, strip_row_limit
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+@pytest.mark.parametrize("query, db_type, expected", [
+    ("SELECT * FROM t ORDER BY x LIMIT 100;", "sqlite", "SELECT * FROM t ORDER BY x"),
+    ("SELECT * FROM t ORDER BY x LIMIT 5;", "sqlite", "SELECT * FROM t ORDER BY x LIMIT 5"),
+    ("SELECT TOP 100 a FROM t ORDER BY a", "mssql", "SELECT a FROM t ORDER BY a"),
+    ("SELECT TOP 10 a FROM t", "mssql", "SELECT TOP 10 a FROM t"),
+    ("SELECT a FROM t FETCH FIRST 100 ROWS ONLY", "oracle", "SELECT a FROM t"),
+    ("SELECT a FROM t", "postgresql", "SELECT a FROM t"),
+])
+def test_strip_row_limit_only_removes_the_preview_limit(query, db_type, expected):
+    assert strip_row_limit(query, db_type) == expected
+
+
+def test_row_limit():
+    assert row_limit("SELECT * FROM t LIMIT 5", "sqlite") == 5
+    assert row_limit("SELECT TOP (20) * FROM t", "mssql") == 20
+    assert row_limit("SELECT TOP 20 * FROM t", "sqlite") is None
+    assert row_limit("SELECT * FROM t", "sqlite") is None
+
+
+def test_strip_order_by_keeps_nested_and_window_orderings():
+    assert strip_order_by("SELECT a, SUM(b) FROM t GROUP BY a ORDER BY SUM(b) DESC;") == "SELECT a, SUM(b) FROM t GROUP BY a"
+    assert strip_order_by("SELECT a FROM (SELECT a FROM t ORDER BY a) x") == "SELECT a FROM (SELECT a FROM t ORDER BY a) x"
+    assert strip_order_by("SELECT ROW_NUMBER() OVER (ORDER BY a) FROM t") == "SELECT ROW_NUMBER() OVER (ORDER BY a) FROM t"
+
+
+@pytest.fixture
+def mixed_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'mixed.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (i, d, n)"))
+        values = [f"({k}, {k}, NULL)" for k in range(20)] + ["(1.5, 'texte', 'x')"]
+        conn.execute(text("INSERT INTO t VALUES " + ", ".join(values)))
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize("extension", ["csv", "parquet", "arrow"])
+def test_export_widens_types_that_change_between_chunks(mixed_engine, tmp_path, extension):
+    path = str(tmp_path / f"out.{extension}")
+    stats = export_query_results(mixed_engine, "SELECT * FROM t", path, chunk_size=5)
+    assert stats["rows"] == 21
+    if extension == "parquet":
+        table = pq.read_table(path)
+        assert str(table.schema.field("i").type) == "double" and str(table.schema.field("d").type) == "string"
+        assert table.column("i")[20].as_py() == 1.5
+
+
+def test_decimal_precision_growth_does_not_abort(tmp_path):
+    from result_export import _ArrowWriter, _SchemaChanged
+    path = str(tmp_path / "dec.parquet")
+    writer = _ArrowWriter(path, ["x"], "parquet")
+    writer.write([(Decimal("1.5"),)])
+    writer.write([(Decimal("123456.5"),)])  # Précision plus grande, même échelle : tient dans decimal128(38, 1)
+    with pytest.raises(_SchemaChanged) as change:
+        writer.write([(Decimal("1.25"),)])  # Échelle plus grande : l'export repartira avec le type élargi
+    writer.close()
+    assert change.value.schema.field("x").type.scale == 2
+    assert [v.as_py() for v in pq.read_table(path).column("x")] == [Decimal("1.5"), Decimal("123456.5")]
+
+
+def test_failed_export_leaves_no_file(mixed_engine, tmp_path):
+    path = str(tmp_path / "missing.parquet")
+    with pytest.raises(Exception):
+        export_query_results(mixed_engine, "SELECT * FROM missing_table", path)
+    assert not os.path.exists(path)
@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+
+from cancellation import CancellationToken, QuestionCancelled
+from result_pages import ResultPages
+
+# Trois lignes immédiates (sqlite3 lit une ligne d'avance), puis une lecture qui ne rend rien avant d'être interrompue
+ENDLESS_SQL = ("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+               "SELECT i FROM n WHERE i < 4 OR i > 1000000000000")
+
+
+@pytest.fixture
+def pages():
+    registry = ResultPages(idle_ttl_s=60)
+    yield registry
+    registry.shutdown()
+
+
+def test_pages_read_from_open_cursor_and_cache(pages):
+    engine = create_engine("sqlite://")
+    handle = pages.register(engine, "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 25) "
+                                    "SELECT i FROM n", page_size=10)
+    first = pages.fetch_page(handle, 0)
+    assert [r[0] for r in first["rows"]] == list(range(1, 11)) and first["has_next"]
+    last = pages.fetch_page(handle, 2)
+    assert [r[0] for r in last["rows"]] == list(range(21, 26)) and last["total_rows"] == 25
+    assert pages.fetch_page(handle, 0)["source"] == "cache"
+    with pytest.raises(ValueError):
+        pages.fetch_page(handle, 3)
+
+
+def test_cancel_interrupts_slow_page_fetch(pages):
+    engine = create_engine("sqlite://")
+    handle = pages.register(engine, ENDLESS_SQL, page_size=1)
+    assert pages.fetch_page(handle, 0)["rows"] == [(1,)]
+    token = CancellationToken()
+    threading.Timer(0.2, token.cancel).start()
+    with pytest.raises(QuestionCancelled):
+        pages.fetch_page(handle, 1, cancel_token=token)
+    assert pages.stats()["open_cursors"] == 0
@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from speculation import SqlSpeculator, is_near_match
+
+
+@pytest.mark.parametrize("speculated, submitted, expected", [
+    ("Total des ventes par région", "total des ventes par region ?", True),
+    ("Chiffre d'affaires par mois en 2024", "Chiffre d'affaires par mois en 2024.", True),
+    ("top 5 des clients par chiffre d'affaires", "top 50 des clients par chiffre d'affaires", False),
+    ("ventes de 2023 par magasin", "ventes de 2024 par magasin", False),
+    ("nombre de clients", "nombre de commandes", False),
+    ("le chiffre d'affaires moyen par client et par mois", "le chiffre d'affaire moyen par client et par mois", True),
+])
+def test_is_near_match(speculated, submitted, expected):
+    assert is_near_match(speculated, submitted) is expected
+
+
+def test_near_match_threshold_is_configurable():
+    assert not is_near_match("nombre de clients", "nombre de client actif", 0.97)
+    assert is_near_match("nombre de clients", "nombre de client actif", 0.5)
+
+
+def _speculator(release=None):
+    def generate(question, token):
+        if release is not None:
+            while not release.wait(0.01):
+                token.raise_if_cancelled()
+        return {"sql": f"-- {question}"}
+    return SqlSpeculator(generate)
+
+
+def test_take_reuses_matching_speculation():
+    speculator = _speculator()
+    speculator.speculate("total des ventes par région")
+    assert speculator.take("Total des ventes par region ?") == {"sql": "-- total des ventes par région"}
+    stats = speculator.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 0, 1.0)
+
+
+def test_new_typing_cancels_running_speculation_and_miss_is_counted():
+    release = threading.Event()
+    speculator = _speculator(release)
+    speculator.speculate("total des ventes")
+    speculator.speculate("total des ventes par magasin")
+    assert speculator.take("nombre de clients") is None
+    release.set()
+    stats = speculator.stats()
+    assert (stats["started"], stats["cancelled"], stats["misses"], stats["hits"]) == (2, 2, 1, 0)
+
+
+def test_finished_unused_speculation_is_wasted():
+    speculator = _speculator()
+    speculator.speculate("total des ventes")
+    speculator._current.done.wait(5)
+    speculator.speculate("nombre de clients par ville")
+    assert speculator.stats()["wasted"] == 1
+    speculator.cancel()
@@ -0,0 +1,76 @@
+import pytest
+
+from cancellation import QuestionCancelled
+from usage_meter import check_budget, record_usage, usage_today
+
+
+def _call(tokens, **extra):
+    return {"stage": "sql", "model": "gemini-test", "prompt_tokens": tokens, "completion_tokens": 0,
+            "estimated": False, "latency_s": 0.1, **extra}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    for name in ("VIX_USER_DAILY_TOKENS", "VIX_DB_DAILY_TOKENS", "VIX_USAGE_BUDGETS", "VIX_BUDGET_ACTION",
+                 "VIX_BUDGET_SOFT_RATIO"):
+        monkeypatch.delenv(name, raising=False)
+    return str(tmp_path / "usage.db")
+
+
+def test_unlimited_budget_is_normal(store):
+    record_usage("alice", "ventes", [_call(10**9)], store)
+    assert check_budget("alice", "ventes", store)["mode"] == "normal"
+
+
+@pytest.mark.parametrize("used, mode", [(700, "normal"), (800, "no_answer_llm"), (1000, "cache_only")])
+def test_degrade_modes_follow_user_budget(store, monkeypatch, used, mode):
+    monkeypatch.setenv("VIX_USER_DAILY_TOKENS", "1000")
+    record_usage("alice", "ventes", [_call(used)], store)
+    assert check_budget("alice", "ventes", store)["mode"] == mode
+
+
+def test_throttle_action_and_database_override(store, monkeypatch):
+    monkeypatch.setenv("VIX_BUDGET_ACTION", "throttle")
+    monkeypatch.setenv("VIX_USAGE_BUDGETS", '{"databases": {"ventes": 100}}')
+    record_usage("bob", "ventes", [_call(60)], store)
+    record_usage("alice", "ventes", [_call(50)], store)
+    budget = check_budget("alice", "ventes", store)
+    assert budget["mode"] == "throttle"
+    assert budget["reason"].startswith("database ventes used 110")
+
+
+def test_coalesced_calls_are_not_billed(store):
+    record_usage("alice", "ventes", [_call(40), _call(40, coalesced=True)], store)
+    assert usage_today("alice", "ventes", store) == {"user": 40, "database": 40}
+
+
+def test_invalid_budget_action(store, monkeypatch):
+    monkeypatch.setenv("VIX_BUDGET_ACTION", "block")
+    with pytest.raises(ValueError):
+        check_budget("alice", "ventes", store)
+
+
+def test_speculation_usage_failure_does_not_mask_cancellation(monkeypatch):
+    import app_refactored
+
+    class _Engine:
+        url = "sqlite:///ventes.db"
+
+    class _Db:
+        _engine = _Engine()
+
+    def _cancelled_generation(question, db, db_type, log, token, trace, bypass):
+        trace.llm_usage.append(_call(10))
+        raise QuestionCancelled("Question cancelled by user.")
+
+    def _failing_record(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(app_refactored, "get_database_connection", lambda log: (_Db(), "sqlite"))
+    monkeypatch.setattr(app_refactored, "check_budget", lambda user, database, path: {"mode": "normal", "database": database})
+    monkeypatch.setattr(app_refactored, "_generate_sql", _cancelled_generation)
+    monkeypatch.setattr(app_refactored, "record_usage", _failing_record)
+    logs = []
+    with pytest.raises(QuestionCancelled):
+        app_refactored.speculate_sql("total des ventes", status_cb=logs.append)
+    assert any("Could not record LLM usage" in message for message in logs)
@@ -0,0 +1,210 @@
+"""Consommation LLM (tokens, latence, modèle) par utilisateur, base et jour, et budgets quotidiens.
+
+Budget dépassé, selon VIX_BUDGET_ACTION :
+- "degrade" (défaut) : au-delà de VIX_BUDGET_SOFT_RATIO du budget, la réponse est rédigée sans LLM ;
+  au-delà du budget, seules les questions servies sans génération SQL passent (instantanés des questions
+  enregistrées, suivis résolus par règle sur les résultats précédents).
+- "throttle" : au-delà du budget, les appels LLM de l'utilisateur sur cette base sont espacés d'au moins
+  VIX_BUDGET_THROTTLE_S secondes.
+"""
+import getpass
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.engine import make_url
+
+from cancellation import CancellationToken, QuestionCancelled
+
+DEFAULT_USAGE_PATH = "vix_usage.db"
+DEFAULT_SOFT_RATIO = 0.8
+DEFAULT_THROTTLE_S = 30.0
+BUDGET_ACTIONS = ("degrade", "throttle")
+BUDGET_MODES = ("normal", "no_answer_llm", "cache_only", "throttle")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT NOT NULL, user TEXT NOT NULL, database TEXT NOT NULL, stage TEXT NOT NULL, model TEXT NOT NULL,
+    calls INTEGER NOT NULL, prompt_tokens INTEGER NOT NULL, completion_tokens INTEGER NOT NULL,
+    estimated_calls INTEGER NOT NULL, latency_s REAL NOT NULL,
+    PRIMARY KEY (day, user, database, stage, model));
+"""
+
+
+def _connect(store_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(store_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def current_user() -> str:
+    """Utilisateur à qui la consommation est imputée : VIX_USER, sinon le compte système."""
+    user = os.getenv("VIX_USER")
+    if user:
+        return user
+    try:
+        return getpass.getuser()
+    except Exception:
+        return "unknown"
+
+
+def database_label(db_uri: str) -> str:
+    """Nom lisible de la base (comme pour VIX_REPLICAS et VIX_QUERY_LIMITS) : nom de base ou de fichier."""
+    url = make_url(db_uri)
+    return os.path.splitext(os.path.basename(url.database or ""))[0] or url.host or url.get_backend_name()
+
+
+def record_usage(user: str, database: str, calls: List[Dict[str, Any]], store_path: str = DEFAULT_USAGE_PATH) -> None:
+    """Ajoute les appels LLM d'une question (voir model_registry.invoke_stage) aux totaux du jour."""
+    if not calls:
+        return
+    day = time.strftime("%Y-%m-%d")
+    conn = _connect(store_path)
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT INTO usage (day, user, database, stage, model, calls, prompt_tokens, completion_tokens, "
+                "estimated_calls, latency_s) VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, ?) "
+                "ON CONFLICT (day, user, database, stage, model) DO UPDATE SET calls = calls + 1, "
+                "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                "completion_tokens = completion_tokens + excluded.completion_tokens, "
+                "estimated_calls = estimated_calls + excluded.estimated_calls, latency_s = latency_s + excluded.latency_s",
+                [(day, user, database, call["stage"], call["model"], call["prompt_tokens"], call["completion_tokens"],
+                  int(call["estimated"]), call["latency_s"]) for call in calls if not call.get("coalesced")])
+    finally:
+        conn.close()
+
+
+def usage_today(user: str, database: str, store_path: str = DEFAULT_USAGE_PATH) -> Dict[str, int]:
+    """Tokens consommés aujourd'hui par l'utilisateur (toutes bases) et sur la base (tous utilisateurs)."""
+    if not os.path.exists(store_path):
+        return {"user": 0, "database": 0}
+    day = time.strftime("%Y-%m-%d")
+    conn = _connect(store_path)
+    try:
+        by_user, by_database = conn.execute(
+            "SELECT COALESCE(SUM(CASE WHEN user = ? THEN prompt_tokens + completion_tokens END), 0), "
+            "COALESCE(SUM(CASE WHEN database = ? THEN prompt_tokens + completion_tokens END), 0) "
+            "FROM usage WHERE day = ?", (user, database, day)).fetchone()
+    finally:
+        conn.close()
+    return {"user": by_user, "database": by_database}
+
+
+def get_budgets(user: str, database: str) -> Dict[str, int]:
+    """Budgets quotidiens en tokens (0 = illimité).
+
+    VIX_USER_DAILY_TOKENS et VIX_DB_DAILY_TOKENS fixent les valeurs par défaut ; VIX_USAGE_BUDGETS
+    les remplace par utilisateur ou par base, ex. {"users": {"alice": 200000}, "databases": {"ventes": 1000000}}.
+    """
+    budgets = {"user": int(os.getenv("VIX_USER_DAILY_TOKENS", "0") or 0),
+               "database": int(os.getenv("VIX_DB_DAILY_TOKENS", "0") or 0)}
+    raw_overrides = os.getenv("VIX_USAGE_BUDGETS", "").strip()
+    if raw_overrides:
+        try:
+            overrides = json.loads(raw_overrides)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"VIX_USAGE_BUDGETS is not valid JSON: {e}")
+        if user in overrides.get("users", {}):
+            budgets["user"] = int(overrides["users"][user])
+        if database in overrides.get("databases", {}):
+            budgets["database"] = int(overrides["databases"][database])
+    return budgets
+
+
+def check_budget(user: str, database: str, store_path: str = DEFAULT_USAGE_PATH) -> Dict[str, Any]:
+    """Mode de traitement autorisé par les budgets : "normal", "no_answer_llm", "cache_only" ou "throttle"."""
+    action = os.getenv("VIX_BUDGET_ACTION", "degrade").lower()
+    if action not in BUDGET_ACTIONS:
+        raise ValueError(f"Invalid VIX_BUDGET_ACTION: {action} (expected one of {', '.join(BUDGET_ACTIONS)})")
+    budgets = get_budgets(user, database)
+    used = usage_today(user, database, store_path) if any(budgets.values()) else {"user": 0, "database": 0}
+    budget = {"mode": "normal", "user": user, "database": database, "used": used, "limits": budgets, "reason": None}
+    ratios = {scope: used[scope] / limit for scope, limit in budgets.items() if limit > 0}
+    if not ratios:
+        return budget
+    scope = max(ratios, key=ratios.get)
+    ratio = ratios[scope]
+    owner = f"user {user}" if scope == "user" else f"database {database}"
+    reason = f"{owner} used {used[scope]} of {budgets[scope]} daily LLM tokens"
+    if ratio >= 1.0:
+        budget.update(mode="cache_only" if action == "degrade" else "throttle", reason=reason)
+    elif action == "degrade" and ratio >= float(os.getenv("VIX_BUDGET_SOFT_RATIO", DEFAULT_SOFT_RATIO)):
+        budget.update(mode="no_answer_llm", reason=reason)
+    return budget
+
+
+_next_call_at: Dict[tuple, float] = {}
+_throttle_lock = threading.Lock()
+
+
+def throttle_llm_call(budget: Dict[str, Any], cancel_token: Optional[CancellationToken] = None,
+                      status_cb: Optional[Callable[[str], None]] = None) -> float:
+    """En mode "throttle", attend le créneau suivant de l'utilisateur sur la base ; retourne l'attente (s)."""
+    if budget["mode"] != "throttle":
+        return 0.0
+    interval = float(os.getenv("VIX_BUDGET_THROTTLE_S", DEFAULT_THROTTLE_S))
+    key = (budget["user"], budget["database"])
+    with _throttle_lock:
+        now = time.monotonic()
+        slot = max(now, _next_call_at.get(key, now))
+        _next_call_at[key] = slot + interval
+    delay = slot - now
+    if delay > 0:
+        if status_cb: status_cb(f"LLM budget exceeded ({budget['reason']}); call delayed {delay:.0f}s.")
+        if cancel_token is None:
+            time.sleep(delay)
+        elif cancel_token.wait(delay):
+            raise QuestionCancelled("Question cancelled while waiting for the LLM budget throttle.")
+    return delay
+
+
+def answer_without_llm(budget: Dict[str, Any], formatted_result: str) -> str:
+    """Réponse rédigée sans appel LLM quand le budget est presque épuisé."""
+    return f"Résultat brut (réponse rédigée sans LLM : {budget['reason']}) :\n\n{formatted_result}"
+
+
+def summarize_usage(calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totaux d'une question : appels, tokens de prompt et de complétion, latence."""
+    billed = [call for call in calls if not call.get("coalesced")]
+    return {"calls": len(billed), "prompt_tokens": sum(c["prompt_tokens"] for c in billed),
+            "completion_tokens": sum(c["completion_tokens"] for c in billed),
+            "latency_s": sum(c["latency_s"] for c in billed), "estimated": any(c["estimated"] for c in billed)}
+
+
+def usage_report(store_path: str = DEFAULT_USAGE_PATH, days: int = 7) -> List[Dict[str, Any]]:
+    """Totaux par jour, utilisateur, base et modèle sur les derniers jours."""
+    since = time.strftime("%Y-%m-%d", time.localtime(time.time() - (days - 1) * 86400))
+    conn = _connect(store_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(r) for r in conn.execute(
+            "SELECT day, user, database, model, SUM(calls) AS calls, SUM(prompt_tokens) AS prompt_tokens, "
+            "SUM(completion_tokens) AS completion_tokens, SUM(estimated_calls) AS estimated_calls, "
+            "SUM(latency_s) / SUM(calls) AS avg_latency_s FROM usage WHERE day >= ? "
+            "GROUP BY day, user, database, model ORDER BY day DESC, prompt_tokens + completion_tokens DESC", (since,))]
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    # python usage_meter.py report [jours]
+    import sys
+    from dotenv import load_dotenv
+    load_dotenv()
+    if len(sys.argv) < 2 or sys.argv[1] != "report":
+        print("Usage: python usage_meter.py report [jours=7]")
+        sys.exit(1)
+    report_days = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+    rows = usage_report(os.getenv("VIX_USAGE_PATH", DEFAULT_USAGE_PATH), report_days)
+    print(f"{'jour':<10}  {'utilisateur':<14} {'base':<14} {'modèle':<28} {'appels':>6} {'prompt':>9} {'complétion':>10} {'lat. moy.':>9}")
+    for row in rows:
+        estimated = "*" if row["estimated_calls"] else " "
+        print(f"{row['day']:<10}  {row['user'][:14]:<14} {row['database'][:14]:<14} {row['model'][:28]:<28} "
+              f"{row['calls']:>6} {row['prompt_tokens']:>9}{estimated}{row['completion_tokens']:>10} {row['avg_latency_s']:>8.2f}s")
+    if any(row["estimated_calls"] for row in rows):
+        print("* tokens estimés pour une partie des appels (fournisseur sans métadonnées d'usage)")
@@ -0,0 +1,217 @@
+"""Index local des valeurs distinctes des colonnes texte, pour ancrer les littéraux des questions.
+
+Le profilage (hors ligne) relève les valeurs distinctes des colonnes texte de cardinalité
+faible ou moyenne ; à la question, les termes mentionnés sont rapprochés (trigrammes puis
+similarité) des valeurs exactes stockées et de leur table.colonne.
+"""
+import difflib
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import inspect, text, types as sqltypes
+from sqlalchemy.engine import Engine
+
+DEFAULT_INDEX_PATH = "vix_value_index.db"
+DEFAULT_MAX_DISTINCT = 500
+DEFAULT_MAX_AGE_S = 24 * 3600
+MIN_MATCH_SCORE = 0.8
+
+# Mots trop courants pour désigner une valeur stockée
+_STOPWORDS = {
+    "le", "la", "les", "un", "une", "des", "du", "de", "d", "l", "a", "au", "aux", "en", "et", "ou", "par",
+    "pour", "sur", "dans", "avec", "sans", "qui", "que", "quoi", "quel", "quels", "quelle", "quelles",
+    "combien", "est", "sont", "ont", "mon", "ma", "mes", "ce", "ces", "cette", "tous", "toutes", "tout",
+    "montre", "moi", "liste", "donne", "affiche", "nombre", "total", "the", "of", "in", "and", "or", "for",
+    "show", "list", "how", "many", "what", "which", "with", "by", "from", "all",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS indexed_columns (
+    db_key TEXT NOT NULL, table_name TEXT NOT NULL, column_name TEXT NOT NULL,
+    row_count INTEGER, distinct_count INTEGER, indexed INTEGER NOT NULL, profiled_at REAL NOT NULL,
+    PRIMARY KEY (db_key, table_name, column_name));
+CREATE TABLE IF NOT EXISTS column_values (
+    id INTEGER PRIMARY KEY, db_key TEXT NOT NULL, table_name TEXT NOT NULL, column_name TEXT NOT NULL,
+    value TEXT NOT NULL, norm TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_column_values_col ON column_values (db_key, table_name, column_name);
+CREATE TABLE IF NOT EXISTS value_trigrams (db_key TEXT NOT NULL, trigram TEXT NOT NULL, value_id INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_value_trigrams ON value_trigrams (db_key, trigram);
+"""
+
+
+def database_fingerprint(engine: Engine) -> str:
+    """Identifiant stable de la base (URL sans mot de passe), utilisé comme clé des caches locaux."""
+    url = engine.url.render_as_string(hide_password=True)
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_text(value: str) -> str:
+    """Minuscules, sans accents ni ponctuation, espaces réduits."""
+    decomposed = unicodedata.normalize("NFKD", value.lower())
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w]+", " ", without_accents).split())
+
+
+def trigrams(norm: str) -> set:
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _connect_index(index_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(index_path)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _is_text_column(column_type: Any) -> bool:
+    return isinstance(column_type, (sqltypes.String, sqltypes.Enum))
+
+
+def build_value_index(engine: Engine, status_cb: Optional[Callable[[str], None]] = None,
+                      index_path: str = DEFAULT_INDEX_PATH, max_distinct: int = DEFAULT_MAX_DISTINCT,
+                      max_age_s: float = DEFAULT_MAX_AGE_S, force: bool = False) -> Dict[str, int]:
+    """Profile les colonnes texte et met à jour l'index de façon incrémentale.
+
+    Une colonne n'est re-profilée que si le nombre de lignes de sa table a changé ou si son
+    profil a plus de max_age_s secondes (ou avec force=True). Les colonnes dépassant
+    max_distinct valeurs distinctes sont notées mais non indexées.
+    """
+    log = status_cb or (lambda msg: None)
+    db_key = database_fingerprint(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    stats = {"profiled": 0, "skipped_fresh": 0, "skipped_high_cardinality": 0, "values": 0}
+    inspector = inspect(engine)
+    index_conn = _connect_index(index_path)
+    try:
+        known = {(row[0], row[1]): (row[2], row[3]) for row in index_conn.execute(
+            "SELECT table_name, column_name, row_count, profiled_at FROM indexed_columns WHERE db_key = ?", (db_key,))}
+        with engine.connect() as conn:
+            for table_name in inspector.get_table_names():
+                text_columns = [c["name"] for c in inspector.get_columns(table_name) if _is_text_column(c["type"])]
+                if not text_columns:
+                    continue
+                row_count = conn.execute(text(f"SELECT COUNT(*) FROM {quote(table_name)}")).scalar()
+                for column_name in text_columns:
+                    previous = known.get((table_name, column_name))
+                    if not force and previous and previous[0] == row_count and time.time() - previous[1] < max_age_s:
+                        stats["skipped_fresh"] += 1
+                        continue
+                    qcol, qtable = quote(column_name), quote(table_name)
+                    distinct_count = conn.execute(text(f"SELECT COUNT(DISTINCT {qcol}) FROM {qtable}")).scalar()
+                    values = []
+                    if distinct_count <= max_distinct:
+                        values = [r[0] for r in conn.execute(text(
+                            f"SELECT DISTINCT {qcol} FROM {qtable} WHERE {qcol} IS NOT NULL")) if isinstance(r[0], str)]
+                    else:
+                        stats["skipped_high_cardinality"] += 1
+                    _store_column(index_conn, db_key, table_name, column_name, row_count, distinct_count, values,
+                                  indexed=distinct_count <= max_distinct)
+                    stats["profiled"] += 1
+                    stats["values"] += len(values)
+                log(f"Value index: {table_name} profiled ({len(text_columns)} text columns).")
+        index_conn.commit()
+    finally:
+        index_conn.close()
+    log(f"Value index updated: {stats}")
+    return stats
+
+
+def _store_column(index_conn: sqlite3.Connection, db_key: str, table_name: str, column_name: str,
+                  row_count: int, distinct_count: int, values: List[str], indexed: bool) -> None:
+    index_conn.execute("DELETE FROM value_trigrams WHERE value_id IN (SELECT id FROM column_values "
+                       "WHERE db_key = ? AND table_name = ? AND column_name = ?)", (db_key, table_name, column_name))
+    index_conn.execute("DELETE FROM column_values WHERE db_key = ? AND table_name = ? AND column_name = ?",
+                       (db_key, table_name, column_name))
+    for value in values:
+        norm = normalize_text(value)
+        if not norm:
+            continue
+        value_id = index_conn.execute(
+            "INSERT INTO column_values (db_key, table_name, column_name, value, norm) VALUES (?, ?, ?, ?, ?)",
+            (db_key, table_name, column_name, value, norm)).lastrowid
+        index_conn.executemany("INSERT INTO value_trigrams (db_key, trigram, value_id) VALUES (?, ?, ?)",
+                               [(db_key, tri, value_id) for tri in trigrams(norm)])
+    index_conn.execute("INSERT OR REPLACE INTO indexed_columns VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (db_key, table_name, column_name, row_count, distinct_count, int(indexed), time.time()))
+
+
+def _candidate_phrases(question: str, max_words: int = 4) -> List[str]:
+    words = normalize_text(question).split()
+    phrases = []
+    for size in range(max_words, 0, -1):
+        for start in range(len(words) - size + 1):
+            chunk = words[start:start + size]
+            if chunk[0] in _STOPWORDS or chunk[-1] in _STOPWORDS:
+                continue
+            phrase = " ".join(chunk)
+            if len(phrase) >= 3:
+                phrases.append(phrase)
+    return phrases
+
+
+def resolve_question_values(question: str, engine: Engine, index_path: str = DEFAULT_INDEX_PATH,
+                            top_n: int = 8, min_score: float = MIN_MATCH_SCORE) -> List[Dict[str, Any]]:
+    """Rapproche les termes de la question des valeurs stockées ; retourne les meilleures correspondances."""
+    if not os.path.exists(index_path):
+        return []
+    db_key = database_fingerprint(engine)
+    matches: Dict[tuple, Dict[str, Any]] = {}
+    index_conn = sqlite3.connect(index_path)
+    try:
+        for phrase in _candidate_phrases(question):
+            phrase_trigrams = list(trigrams(phrase))
+            placeholders = ",".join("?" * len(phrase_trigrams))
+            candidates = index_conn.execute(
+                f"SELECT v.table_name, v.column_name, v.value, v.norm FROM column_values v JOIN ("
+                f" SELECT value_id, COUNT(*) AS hits FROM value_trigrams WHERE db_key = ? AND trigram IN ({placeholders})"
+                f" GROUP BY value_id ORDER BY hits DESC LIMIT 25) t ON t.value_id = v.id",
+                [db_key] + phrase_trigrams).fetchall()
+            for table_name, column_name, value, norm in candidates:
+                score = 1.0 if norm == phrase else difflib.SequenceMatcher(None, phrase, norm).ratio()
+                if score < min_score:
+                    continue
+                key = (table_name, column_name, value)
+                if key not in matches or matches[key]["score"] < score:
+                    matches[key] = {"table": table_name, "column": column_name, "value": value,
+                                    "phrase": phrase, "score": round(score, 3)}
+    finally:
+        index_conn.close()
+
+    # Un terme de la question n'est rattaché qu'à ses meilleures correspondances
+    best_by_phrase: Dict[str, float] = {}
+    for match in matches.values():
+        best_by_phrase[match["phrase"]] = max(best_by_phrase.get(match["phrase"], 0), match["score"])
+    kept = [m for m in matches.values() if m["score"] >= best_by_phrase[m["phrase"]] - 0.05]
+    return sorted(kept, key=lambda m: (-m["score"], -len(m["phrase"])))[:top_n]
+
+
+def format_value_hints(matches: List[Dict[str, Any]]) -> str:
+    """Bloc de texte injecté dans le prompt de génération SQL."""
+    if not matches:
+        return ""
+    lines = ["Valeurs exactes présentes dans la base (utilise ces littéraux tels quels) :"]
+    for match in matches:
+        lines.append(f"- « {match['phrase']} » -> {match['table']}.{match['column']} = '{match['value']}'")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Profilage hors ligne de la base configurée dans .env : python value_index.py [--force]
+    import sys
+    from app_refactored import resolve_database_uri, create_query_engine
+
+    def _cli_callback(message): print(f"[VALUE_INDEX] {message}")
+
+    db_uri, db_type = resolve_database_uri(_cli_callback)
+    engine = create_query_engine(db_uri, db_type, _cli_callback, statement_timeout_ms=0)
+    try:
+        build_value_index(engine, _cli_callback, index_path=os.getenv("VIX_VALUE_INDEX_PATH", DEFAULT_INDEX_PATH),
+                          max_distinct=int(os.getenv("VIX_VALUE_INDEX_MAX_DISTINCT", DEFAULT_MAX_DISTINCT)),
+                          force="--force" in sys.argv)
+    finally:
+        engine.dispose()